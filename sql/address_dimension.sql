@@ -0,0 +1,80 @@
+/*
+    Address dimension (see src/address_dimension.py & seattle_loading.insert_addresses)
+
+    Creates tblAddress & points tblCrime at it through an integer [address_id] in place of the [_100_block_address]
+    string. Safe to run more than once: each step is skipped if already applied. Existing records' addresses are
+    moved into tblAddress & their address_id filled in, parsing the block number & street as
+    address_dimension.parse_addresses does.
+
+    Run with sqlcmd -S <server> -i sql/address_dimension.sql, or from SSMS.
+*/
+
+USE [SeattleCrimeDataDB]
+GO
+
+
+-- The address dimension; the database allocates the address_id, & each address is held once. The unique constraint
+-- also backs up the HOLDLOCK of the loader's MERGE when several load workers insert the same new address
+IF OBJECT_ID(N'[dbo].[tblAddress]', N'U') IS NULL
+    CREATE TABLE [dbo].[tblAddress]
+    (
+        [address_id]            INT IDENTITY(1, 1)  NOT NULL,
+        [_100_block_address]    NVARCHAR(200)       NOT NULL,
+        [block_number]          INT                 NULL,
+        [street]                NVARCHAR(200)       NULL,
+
+        CONSTRAINT [PK_tblAddress] PRIMARY KEY CLUSTERED ([address_id]),
+        CONSTRAINT [UQ_tblAddress_100_block_address] UNIQUE ([_100_block_address])
+    )
+GO
+
+
+IF COL_LENGTH(N'[dbo].[tblCrime]', N'address_id') IS NULL
+    ALTER TABLE [dbo].[tblCrime] ADD [address_id] INT NULL
+GO
+
+
+-- Moves the addresses of records loaded before the address dimension into tblAddress
+IF COL_LENGTH(N'[dbo].[tblCrime]', N'_100_block_address') IS NOT NULL
+BEGIN
+    EXEC(N'
+        INSERT INTO [dbo].[tblAddress] ([_100_block_address], [block_number], [street])
+        SELECT
+            [addresses].[_100_block_address],
+            CASE
+                WHEN [addresses].[_100_block_address] LIKE N''[0-9]% BLOCK OF %''
+                THEN TRY_CAST(LEFT([addresses].[_100_block_address], CHARINDEX(N'' BLOCK OF '', [addresses].[_100_block_address]) - 1) AS INT)
+            END,
+            CASE
+                WHEN [addresses].[_100_block_address] LIKE N''[0-9]% BLOCK OF %''
+                THEN SUBSTRING([addresses].[_100_block_address], CHARINDEX(N'' BLOCK OF '', [addresses].[_100_block_address]) + 10, 200)
+                ELSE [addresses].[_100_block_address]
+            END
+        FROM (
+                SELECT DISTINCT [_100_block_address]
+                FROM [dbo].[tblCrime]
+                WHERE [_100_block_address] IS NOT NULL
+                ) AS [addresses]
+        WHERE NOT EXISTS (
+                            SELECT 1
+                            FROM [dbo].[tblAddress]
+                            WHERE [tblAddress].[_100_block_address] = [addresses].[_100_block_address]
+                            )
+
+        UPDATE [tblCrime]
+        SET [address_id] = [tblAddress].[address_id]
+        FROM [dbo].[tblCrime]
+        INNER JOIN [dbo].[tblAddress]
+            ON [tblAddress].[_100_block_address] = [tblCrime].[_100_block_address]
+        WHERE [tblCrime].[address_id] IS NULL
+
+        ALTER TABLE [dbo].[tblCrime] DROP COLUMN [_100_block_address]
+    ')
+END
+GO
+
+
+IF OBJECT_ID(N'[dbo].[FK_tblCrime_tblAddress]', N'F') IS NULL
+    ALTER TABLE [dbo].[tblCrime]
+    ADD CONSTRAINT [FK_tblCrime_tblAddress] FOREIGN KEY ([address_id]) REFERENCES [dbo].[tblAddress] ([address_id])
+GO
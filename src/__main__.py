@@ -0,0 +1,6 @@
+from .cli import main
+
+
+# Guarded, as the worker processes of python -m src backfill --async may re-import this module
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+from os import getenv, replace
+from os.path import exists
+
+from pandas import DataFrame, Index, Series, concat, read_parquet
+from dotenv import load_dotenv
+
+from .quality_rules import (
+                            Rule,
+                            agrees_with,
+                            inferred,
+                            run_rules,
+                            address_coordinates_reason,
+                            washington_longitudes,
+                            washington_latitudes
+                            )
+
+load_dotenv()
+
+
+observation_columns = ['offense_id', '_100_block_address', 'longitude', 'latitude']
+
+
+def load_address_observations(observations_path=None):
+    """
+    Summary: Loads the address coordinate observations: the valid coordinates each cleaned record was reported at,
+             along with its block address, one row per offense_id:
+
+    +------------+--------------------------+-------------+-----------+
+    | offense_id |    _100_block_address    |  longitude  | latitude  |
+    +------------+--------------------------+-------------+-----------+
+    |  12345678  | 3200 BLOCK OF 23RD AVE W | -122.389218 | 47.650391 |
+    +------------+--------------------------+-------------+-----------+
+
+    Returns: Pandas DataFrame
+
+    Params:
+        observations_path   :   path of the observations parquet file; defaults to the ADDRESS_COORDINATES env variable
+    """
+
+    if observations_path is None:
+        observations_path = getenv('ADDRESS_COORDINATES')
+
+    if observations_path is None:
+        raise ValueError('No observations path given & the ADDRESS_COORDINATES env variable is not set')
+
+    if not exists(observations_path):
+        return DataFrame(
+                        {
+                        'offense_id':           Series(dtype='O'),
+                        '_100_block_address':   Series(dtype='O'),
+                        'longitude':            Series(dtype='float64'),
+                        'latitude':             Series(dtype='float64')
+                        }
+                        )
+
+    return read_parquet(observations_path)
+
+
+def valid_coordinates(longitude, latitude):
+    """
+    Summary: Flags the longitude/latitude pairs that are both present & within Washington State's range (the values
+             correct_deci_degrees keeps).
+
+    Returns: Pandas boolean Series
+    """
+
+    return longitude.between(*washington_longitudes) & latitude.between(*washington_latitudes)
+
+
+def address_coordinates(observations, addresses):
+    """
+    Summary: Gets the median longitude & latitude each block address was observed at, for the given addresses only
+             (the observations of other addresses are never grouped). Medians are robust to the odd record geocoded
+             to the wrong side of the city.
+
+    Returns: Pandas DataFrame of the longitude, latitude & offense_count, indexed by address
+
+    Params:
+        observations    :   the address coordinate observations (see load_address_observations)
+        addresses       :   array-like of the addresses looked up
+    """
+
+    observed = observations[observations['_100_block_address'].isin(addresses)]
+
+    coordinates = observed.groupby('_100_block_address')[['longitude', 'latitude']].median()
+    coordinates['offense_count'] = observed.groupby('_100_block_address').size()
+
+    return coordinates
+
+
+def infer_coordinates(seattle_data, observations):
+    """
+    Summary: For records missing their longitude or latitude (i.e. 0's nulled by cleanup_na_values, or values out of
+             Washington's range nulled by correct_deci_degrees) but holding a block address already observed with
+             valid coordinates, infers both from the address' median coordinates (see address_coordinates). The pair
+             is replaced as a whole, so a record's longitude & latitude always come from the same source.
+
+    Returns: Pandas DataFrame of the inferred longitude/latitude, indexed like the records they were inferred for
+
+    Params:
+        seattle_data    :   Pandas DataFrame of cleaned addresses & numeric longitude/latitude values
+        observations    :   the address coordinate observations (see load_address_observations)
+    """
+
+    candidates = seattle_data.loc[
+                                    ~valid_coordinates(seattle_data['longitude'], seattle_data['latitude'])
+                                    & seattle_data['_100_block_address'].notna(),
+
+                                    '_100_block_address'
+                                ]
+
+    coordinates = address_coordinates(observations, candidates.unique())
+
+    # Vectorized join: each candidate's position within the looked up addresses, -1 for unobserved addresses
+    positions = Index(coordinates.index).get_indexer(candidates)
+    found = positions >= 0
+
+    return DataFrame(
+                    data    =   {
+                                'longitude':    coordinates['longitude'].to_numpy()[positions[found]],
+                                'latitude':     coordinates['latitude'].to_numpy()[positions[found]]
+                                },
+                    index   =   candidates.index[found]
+                    )
+
+
+def record_observations(seattle_data, observations):
+    """
+    Summary: Adds the batch's records holding both an address & valid coordinates to the observations. Records
+             already observed are replaced by their version in the batch (i.e. records revised by SPD, or reprocessed),
+             so re-cleaning a batch never counts its records twice.
+
+    Returns: the updated observations, as a Pandas DataFrame
+    """
+
+    observed = seattle_data.loc[
+                                valid_coordinates(seattle_data['longitude'], seattle_data['latitude'])
+                                & seattle_data['_100_block_address'].notna(),
+
+                                observation_columns
+                                ]
+
+    if observed.empty:
+        return observations
+
+    observed = observed.astype({'offense_id': 'O', '_100_block_address': 'O', 'longitude': 'float64', 'latitude': 'float64'})
+
+    return concat(
+                [observations[~observations['offense_id'].isin(observed['offense_id'])], observed],
+                ignore_index=True
+                )
+
+
+def record_address_observations(seattle_data, observations_path=None):
+    """
+    Summary: Adds the batch's valid coordinates to the locally persisted address coordinate observations (see
+             record_observations), so the index grows with each batch. Meant to run after correct_deci_degrees (so only
+             validated coordinates are observed) & before fill_coordinates_from_addresses (so filled in coordinates are
+             never observed).
+
+    Returns: Pandas DataFrame
+
+    Params:
+        seattle_data        :   the cleaned batch
+        observations_path   :   path of the observations parquet file; defaults to the ADDRESS_COORDINATES env variable
+    """
+
+    if observations_path is None:
+        observations_path = getenv('ADDRESS_COORDINATES')
+
+    observations = load_address_observations(observations_path)
+
+    updated = record_observations(seattle_data, observations)
+
+    if updated is not observations:
+        updated.to_parquet(
+                        path    =   observations_path + '.tmp',
+                        index   =   False
+                        )
+
+        replace(observations_path + '.tmp', observations_path)
+
+    return seattle_data
+
+
+def observed_coordinates(shared):
+    """
+    Summary: Infers the coordinates of the batch's records missing them from their block address (see
+             infer_coordinates), against the address coordinate observations.
+
+    Returns: Pandas DataFrame of the inferred longitude/latitude, indexed like the records they were inferred for
+
+    Params:
+        shared  :   the batch's shared columns (see quality_rules.SharedColumns)
+    """
+
+    return infer_coordinates(shared.seattle_data, load_address_observations())
+
+
+# Missing coordinates are filled in from the record's block address, the pair being replaced as a whole
+address_coordinate_rules = [
+                            Rule(
+                                columns     =   [column],
+                                predicate   =   agrees_with(column, observed_coordinates),
+                                action      =   'correct',
+                                reason      =   address_coordinates_reason,
+                                correction  =   inferred(observed_coordinates)
+                                )
+                            for column in ('longitude', 'latitude')
+                            ]
+
+
+def fill_coordinates_from_addresses(seattle_data):
+    """
+    Summary: Fills in missing coordinates from the record's block address (see address_coordinate_rules), using the
+             addresses' coordinates as observed in the cleaned batches, without any geocoding service. Meant to run
+             after record_address_observations & correct_loc_codes_from_coordinates, so the location codes are never
+             inferred from filled coordinates.
+
+    Returns: Pandas DataFrame
+    """
+
+    seattle_data, _ = run_rules(seattle_data, address_coordinate_rules)
+
+    return seattle_data
@@ -0,0 +1,161 @@
+from os import getenv, replace
+from os.path import exists
+
+import numpy as np
+from pandas import DataFrame, Index, Series, concat, read_parquet, to_numeric
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+address_columns = ['address_id', '_100_block_address', 'block_number', 'street']
+
+
+def load_address_dimension(dimension_path=None):
+    """
+    Summary: Loads the address dimension; one row per distinct (cleaned) address, keyed by an integer address_id:
+
+    +------------+----------------------------+--------------+-------------+
+    | address_id |     _100_block_address     | block_number |   street    |
+    +------------+----------------------------+--------------+-------------+
+    |     1      |  3200 BLOCK OF 23RD AVE W  |     3200     | 23RD AVE W  |
+    |     2      |        26TH AVE NE         |     <NA>     | 26TH AVE NE |
+    +------------+----------------------------+--------------+-------------+
+
+    Returns: Pandas DataFrame
+
+    Params:
+        dimension_path  :   path of the address dimension parquet file; defaults to the ADDRESS_DIM env variable
+    """
+
+    if dimension_path is None:
+        dimension_path = getenv('ADDRESS_DIM')
+
+    if not exists(dimension_path):
+        return DataFrame(
+                        {
+                        'address_id':           Series(dtype='int64'),
+                        '_100_block_address':   Series(dtype='O'),
+                        'block_number':         Series(dtype='Int64'),
+                        'street':               Series(dtype='O')
+                        }
+                        )
+
+    dimension = read_parquet(dimension_path)
+
+    # Dimensions saved before street_2 was dropped hold the street as street_1; street_2 was always empty, as
+    # config_addresses splits intersections before the addresses are interned
+    if 'street_1' in dimension.columns:
+        dimension = dimension.rename(columns={'street_1': 'street'}).drop(columns='street_2')
+
+    return dimension
+
+
+def parse_addresses(addresses):
+    """
+    Summary: Parses addresses into their components:
+                > 3200 BLOCK OF 23RD AVE W      -> block_number: 3200, street: 23RD AVE W
+                > 26TH AVE NE                   -> street: 26TH AVE NE
+
+             Intersections (26TH AVE NE/NE BLAKELEY ST) are already split into a row per street by config_addresses,
+             which runs before intern_addresses, so an address only ever holds one street.
+
+    Returns: Pandas DataFrame of the address, block_number & street
+
+    Params:
+        addresses   :   Pandas Series of distinct, cleaned addresses
+    """
+
+    block = addresses.str.extract(r'^(\d+) BLOCK OF (.+)$')
+
+    return DataFrame(
+                    {
+                    '_100_block_address':   addresses,
+                    'block_number':         to_numeric(block[0]).astype('Int64'),
+                    'street':               block[1].fillna(addresses)
+                    }
+                    )
+
+
+def intern_addresses(seattle_data, dimension_path=None):
+    """
+    Summary: Replaces the _100_block_address column with an integer address_id key into the address dimension. The
+             batch's addresses missing from the dimension are parsed and added to it, with new ids, before the
+             dimension is saved. As only the key is carried from then on, the batch (and the rows inserted into the
+             database) no longer hold the same few thousand address strings over and over. Meant to run right after
+             config_addresses.
+
+    Returns: Pandas DataFrame, with address_id in place of _100_block_address
+
+    Params:
+        seattle_data    :   the cleaned batch
+        dimension_path  :   path of the address dimension parquet file; defaults to the ADDRESS_DIM env variable
+    """
+
+    if dimension_path is None:
+        dimension_path = getenv('ADDRESS_DIM')
+
+    dimension = load_address_dimension(dimension_path)
+
+    addresses = seattle_data['_100_block_address']
+
+    new_addresses = (
+                    Index(addresses.dropna().unique())
+                    .difference(dimension['_100_block_address'])
+                    )
+
+    # Add the new addresses to the dimension
+    if len(new_addresses):
+        first_id = int(dimension['address_id'].max()) + 1 if len(dimension) else 1
+
+        new_rows = parse_addresses(Series(new_addresses, dtype='O'))
+        new_rows.insert(
+                        loc=0,
+                        column='address_id',
+                        value=np.arange(first_id, first_id + len(new_rows), dtype='int64')
+                        )
+
+        dimension = concat([dimension, new_rows], ignore_index=True)
+
+        dimension.to_parquet(
+                            path    =   dimension_path + '.tmp',
+                            index   =   False
+                            )
+
+        replace(dimension_path + '.tmp', dimension_path)
+
+    # Look up each address' position in the dimension; missing addresses have no position (-1)
+    positions = Index(dimension['_100_block_address']).get_indexer(addresses)
+
+    address_ids = Series(
+                        data    =   dimension['address_id'].to_numpy()[positions],
+                        index   =   seattle_data.index,
+                        dtype   =   'Int64'
+                        )
+
+    address_ids[positions < 0] = None
+
+    seattle_data = seattle_data.drop(columns='_100_block_address')
+    seattle_data['address_id'] = address_ids.array
+
+    return seattle_data
+
+
+def batch_address_dimension(seattle_data, dimension_path=None):
+    """
+    Summary: Gets the address dimension rows referenced by the batch, i.e. to insert into the database's address table
+             alongside the batch.
+
+    Returns: Pandas DataFrame
+
+    Params:
+        seattle_data    :   the batch, as returned by intern_addresses
+        dimension_path  :   path of the address dimension parquet file; defaults to the ADDRESS_DIM env variable
+    """
+
+    dimension = load_address_dimension(dimension_path)
+
+    return dimension.loc[
+                        dimension['address_id'].isin(seattle_data['address_id'].dropna()),
+                        address_columns
+                        ]
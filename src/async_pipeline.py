@@ -0,0 +1,242 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Manager
+from time import perf_counter
+
+from .checkpoint import batch_id, clean_stage, completed_stages, fetch_stage, load_stage, save_checkpoint
+from .retrieve_seattle_data import socrata_api_async
+from .offense_index import drop_loaded
+from .raw_archive import archive_raw
+
+
+def timed(function, *arguments):
+    """
+    Summary: Runs a function, timing it within the executor running it (so time spent queued for a worker isn't
+             counted).
+
+    Returns: tuple -> (the function's result, runtime in seconds)
+    """
+
+    started = perf_counter()
+    result = function(*arguments)
+
+    return result, perf_counter() - started
+
+
+def client_session(fetch_concurrency):
+    """
+    Summary: Opens an aiohttp session for retrieving data asynchronously, if aiohttp is installed (it's optional).
+
+    Returns: aiohttp.ClientSession, or None if aiohttp isn't installed, in which case data is retrieved by the
+             blocking retrieval functions, run in threads
+    """
+
+    try:
+        import aiohttp
+    except ImportError:
+        return None
+
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=fetch_concurrency))
+
+
+async def fetch_async(session, date, how='=', checkpoint_dir=None):
+    """
+    Summary: Retrieves a batch & checkpoints its raw data, like checkpoint.fetch_stage, over the aiohttp session when
+             there is one. Requests timing out (408 status code) are retried up to 5 times; if the asynchronous
+             retrieval still fails, the blocking retrieval functions are used (in a thread), in order of preference.
+
+    Returns: the batch id, or None if no data could be retrieved (or every record retrieved has already been loaded)
+    """
+
+    batch = batch_id(date, how)
+
+    if completed_stages(batch, checkpoint_dir):
+        return batch
+
+    raw_data = None
+
+    if session is not None:
+        for retry in range(5):
+            try:
+                raw_data = await socrata_api_async(session, date, how)
+                break
+
+            except Exception as error:
+                if getattr(error, 'status', None) == 408:
+                    continue
+
+                break
+
+    if raw_data is None:
+        return await asyncio.to_thread(fetch_stage, date, how, checkpoint_dir)
+
+    await asyncio.to_thread(archive_raw, raw_data)
+
+    raw_data = await asyncio.to_thread(drop_loaded, raw_data)
+
+    if raw_data.empty:
+        return None
+
+    await asyncio.to_thread(save_checkpoint, raw_data, batch, 'raw', checkpoint_dir)
+
+    return batch
+
+
+async def run_async_batches(dates, how='=', fetch_concurrency=8, clean_workers=1, load_workers=1, checkpoint_dir=None):
+    """
+    Summary: Retrieves, cleans & loads a batch per date within one event loop: up to fetch_concurrency retrievals
+             are in flight at once (over aiohttp if installed, otherwise in threads), each fetched batch is cleaned
+             in a process pool (keeping the CPU-bound cleaning off the event loop & the GIL) & each cleaned batch is
+             inserted by a pool of database writer threads, each holding its own connection. Batches are checkpointed
+             as by checkpoint.run_checkpointed_batch, so only batch ids are passed between the pools & a failed run
+             is resumed by running it again. The first failure stops batches from starting their next stage.
+
+             With clean_workers > 1, the cleaning functions updating shared local files
+             (pipeline.local_output_functions) run one batch at a time, under a lock shared across the processes.
+
+    +-------+---------+---------+--------------+----------------+-------------+
+    | stage | workers | batches | busy_seconds | queued_seconds | utilization |
+    +-------+---------+---------+--------------+----------------+-------------+
+    | clean |    1    |    7    |    21.402    |     35.115     |    0.941    |
+    +-------+---------+---------+--------------+----------------+-------------+
+
+    Returns: dictionary of the wall time, the utilization report (list of rows, as above, for the fetch, clean & load
+             stages), the ids of the loaded batches, the dates no data could be retrieved for & the failures (list
+             of (date or batch id, stage, exception))
+
+    Params:
+        dates               :   report dates to retrieve, yyyy-mm-dd
+        how                 :   how each batch is retrieved with respect to its date (see retrieve_data)
+        fetch_concurrency   :   number of retrievals in flight at once
+        clean_workers       :   number of cleaning processes
+        load_workers        :   number of database writer threads
+        checkpoint_dir      :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+    """
+
+    loop = asyncio.get_running_loop()
+
+    worker_counts = {'fetch': fetch_concurrency, 'clean': clean_workers, 'load': load_workers}
+    stats = {name: {'batches': 0, 'busy_seconds': 0.0, 'queued_seconds': 0.0} for name in worker_counts}
+
+    loaded, empty_dates, failures = [], [], []
+    stopping = asyncio.Event()
+    fetch_slots = asyncio.Semaphore(fetch_concurrency)
+
+    manager = Manager() if clean_workers > 1 else None
+    output_lock = manager.Lock() if manager is not None else None
+
+    clean_pool = ProcessPoolExecutor(max_workers=clean_workers)
+    writer_pool = ThreadPoolExecutor(max_workers=load_workers, thread_name_prefix='writer')
+
+    session = client_session(fetch_concurrency)
+
+    async def run_stage(name, item, stage):
+        """
+        Summary: Runs one stage of a batch, recording its time & any failure.
+
+        Returns: the stage's result, or None if it failed or the run is stopping
+        """
+
+        if stopping.is_set():
+            return None
+
+        started = perf_counter()
+
+        try:
+            result, busy_seconds = await stage()
+
+        # insert_data exits on failure, which the writer pool hands back as the future's exception
+        except BaseException as exception:
+            failures.append((item, name, exception))
+            stopping.set()
+            return None
+
+        stats[name]['batches'] += 1
+        stats[name]['busy_seconds'] += busy_seconds
+        stats[name]['queued_seconds'] += perf_counter() - started - busy_seconds
+
+        return result
+
+    async def fetch(date):
+        async with fetch_slots:
+            started = perf_counter()
+            batch = await fetch_async(session, date, how, checkpoint_dir)
+
+        return batch, perf_counter() - started
+
+    async def process(date):
+        batch = await run_stage('fetch', date, lambda: fetch(date))
+
+        if batch is None:
+            if not stopping.is_set():
+                empty_dates.append(date)
+
+            return
+
+        batch = await run_stage('clean', batch, lambda: loop.run_in_executor(
+                                                                            clean_pool, timed, clean_stage, batch,
+                                                                            checkpoint_dir, output_lock
+                                                                            ))
+
+        if batch is None:
+            return
+
+        batch = await run_stage('load', batch, lambda: loop.run_in_executor(
+                                                                            writer_pool, timed, load_stage, batch,
+                                                                            checkpoint_dir
+                                                                            ))
+
+        if batch is not None:
+            loaded.append(batch)
+
+    started = perf_counter()
+
+    try:
+        await asyncio.gather(*(process(date) for date in dates))
+
+    finally:
+        if session is not None:
+            await session.close()
+
+        clean_pool.shutdown()
+        writer_pool.shutdown()
+
+        if manager is not None:
+            manager.shutdown()
+
+    wall_seconds = perf_counter() - started
+
+    utilization = [
+                    {
+                    'stage':            name,
+                    'workers':          workers,
+                    'batches':          stats[name]['batches'],
+                    'busy_seconds':     round(stats[name]['busy_seconds'], 3),
+                    'queued_seconds':   round(stats[name]['queued_seconds'], 3),
+                    'utilization':      round(stats[name]['busy_seconds'] / (wall_seconds * workers or 1), 3)
+                    }
+                    for name, workers in worker_counts.items()
+                    ]
+
+    return {
+            'wall_seconds':     wall_seconds,
+            'utilization':      utilization,
+            'loaded':           loaded,
+            'empty_dates':      empty_dates,
+            'failures':         failures
+            }
+
+
+def run_async(dates, how='=', fetch_concurrency=8, clean_workers=1, load_workers=1, checkpoint_dir=None):
+    """
+    Summary: Runs run_async_batches in a new event loop, for callers outside of one (i.e. the backfill subcommand).
+    """
+
+    return asyncio.run(run_async_batches(
+                                        dates               =   dates,
+                                        how                 =   how,
+                                        fetch_concurrency   =   fetch_concurrency,
+                                        clean_workers       =   clean_workers,
+                                        load_workers        =   load_workers,
+                                        checkpoint_dir      =   checkpoint_dir
+                                        ))
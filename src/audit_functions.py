@@ -1,8 +1,18 @@
-from functools import wraps
 from time import time 
-from pandas import DataFrame, to_datetime, to_numeric, read_csv
+from pandas import DataFrame
 from datetime import datetime
-from os import getenv
+
+from .quality_rules import (
+                            audit_rules,
+                            datetime_rules,
+                            coordinate_rules,
+                            offense_datetime_rule,
+                            report_number_rule,
+                            mcpp_rule,
+                            loc_code_rules,
+                            longitude_rule,
+                            latitude_rule
+                            )
 
 
 class TimeError(Exception):
@@ -137,252 +147,35 @@ def audit_functions_insert(audit_table, func_name, runtime):
 
 def audit_dtypes(seattle_data, audit_table): 
 
-    # For each datetime column ...
-    for column in ['offense_start_datetime', 'offense_end_datetime', 'report_datetime']:
-
-        # Retrieve and store records that do not conform to datetime format
-        audited_values = (
-                        seattle_data
-                        [column]
-                        .notnull() 
-                        & 
-                        to_datetime(
-                                arg=seattle_data[column],
-                                errors='coerce'
-                                )
-                                .isna()
-                        )
-        
-        # For those records, retrieve the unique identifier (offense_id) and the value
-        # in question. Insert these values into audit table to track what values are being made null
-        audited_values = (
-                        seattle_data
-                        [audited_values]
-                        [['offense_id', column]]
-                        )
-        
- 
-        audit_table = audit_values_insert(
-                                            audit_table=audit_table, 
-                                            audited_val=audited_values, 
-                                            audit_reason=1
-                                            )
-        
-
-    # Do the same with the numeric columns as done with the datetime columns
-    for column in ('latitude', 'longitude'):
-
-        audited_values = (
-                        seattle_data
-                        [column]
-                        .notnull() 
-                        & 
-                        to_numeric(
-                                arg=seattle_data[column],
-                                errors='coerce'
-                                )
-                                .isna()
-                        )
-        
-        audited_values = (
-                        seattle_data
-                        [audited_values]
-                        [['offense_id', column]]
-                        )
-        
-        audit_table = audit_values_insert(
-                                        audit_table=audit_table,
-                                        audited_val=audited_values,
-                                        audit_reason=2 
-                                        )
-        
-    return audit_table
+    # Audit the datetime & numeric values that can't be converted to their data type (nulled by cleanup_dtypes)
+    return audit_rules(seattle_data, audit_table, datetime_rules + coordinate_rules)
         
 
 def audit_offense_datetime(seattle_data, audit_table):
 
-    # Retrieve and store records where the offense start datetime is after
-    # the offense end datetime. From these, retrieve the offense_id and values in question
-    audited_values = (
-                    seattle_data[
-                                to_datetime(seattle_data['offense_start_datetime'], errors='coerce') > 
-                                to_datetime(seattle_data['offense_end_datetime'], errors='coerce')
-                                ]
-                                [['offense_id', 'offense_start_datetime', 'offense_end_datetime']]
-                    )
-
-    # Insert these values into audit table to track the values being made null
-    audit_table = audit_values_insert(
-                                    audit_table=audit_table,
-                                    audited_val=audited_values,
-                                    audit_reason='3'
-                                    )
-
-    return audit_table   
+    # Audit the offense start/end datetimes where the offense starts after it ends
+    return audit_rules(seattle_data, audit_table, [offense_datetime_rule])
 
 
 def audit_report_number(seattle_data, audit_table):
 
-    valid_re        =   r'^\d{4}-\d{6}$'
-
-    # Retrieve & store the offense_id and value in question
-    audited_values = (
-                    seattle_data[
-                                ~seattle_data
-                                ['report_number']
-                                .str.contains(
-                                            pat=valid_re,
-                                            regex=True,
-                                            na=False
-                                            )
-                                ]
-                                [['offense_id', 'report_number']]
-                    )
-    
-    # Insert these values into audit table to track what values are made nan
-    audit_table = audit_values_insert(
-                                    audit_table=audit_table,
-                                    audited_val=audited_values, 
-                                    audit_reason=4
-                                    )
-    
-    return audit_table
+    # Audit the report numbers that do not follow the valid format (1234-567890)
+    return audit_rules(seattle_data, audit_table, [report_number_rule])
 
 
 def audit_mispelled_mcpp(seattle_data, audit_table):
 
-    mcpp = read_csv(
-                    filepath_or_buffer='/Users/IsaacSchnitler/Desktop/p_projects/SeattleCrimeData/utils/mcpp.csv', 
-                    dtype='O'
-                    )
-    
-    audited_values = (
-                        seattle_data[
-                                            (
-                                                ~seattle_data
-                                                ['mcpp']
-                                                .isin(mcpp['mcpp'])
-                                                            
-                                            )
-
-                                            &
-
-                                            (
-                                                ~seattle_data
-                                                ['mcpp']
-                                                .isna()
-                                            )
-                                        ]
-                                        [['offense_id', 'mcpp']]           
-                        )
-    
-    audit_table = audit_values_insert(
-                                    audit_table=audit_table, 
-                                    audited_val=audited_values, 
-                                    audit_reason=5
-                                    )
-    
-    return audit_table
+    # Audit the mcpp's that are not null & not a valid mcpp
+    return audit_rules(seattle_data, audit_table, [mcpp_rule])
 
 
 def audit_correct_na_loc_code(seattle_data, audit_table):
 
-    # Load dataframe containing valid, corresponding precinct/sector/beat location code matchings, used to verify raw data against
-    valid_loc_codes = read_csv(
-                        filepath_or_buffer='/Users/IsaacSchnitler/Desktop/p_projects/SeattleCrimeData/utils/location_codes.csv', 
-                        dtype='O'
-                        )
-    
-    loc_code_list = ['beat', 'sector', 'precinct']
-        
-    
-    for loc_code in loc_code_list:
-
-         # Audit & null any high-level location codes that do not have a valid/present low-level location code (& thus cannot correctly be determined)
-        audited_values = (
-                        seattle_data.loc[
-                                            (
-                                                # if the high-level loc code IS NOT a valid high-level loc code
-                                                (
-                                                ~seattle_data
-                                                [loc_code]
-                                                .isin(valid_loc_codes[loc_code])
-                                                ) 
-                                            
-                                            & 
-
-                                                # AND the high-level loc code IS NOT null, audit it
-                                                (
-                                                ~seattle_data[loc_code]
-                                                .isna()
-                                                )
-                                            )
-                                        ]
-                                    
-                                        [['offense_id', loc_code]]
-                            ) 
-    
-        
-        audit_table = audit_values_insert(
-                                            audit_table=audit_table,
-                                            audited_val = audited_values,
-                                            audit_reason = 8
-                                            )
-        
-    
-    return audit_table
+    # Audit the beat, sector & precinct values that are not null & not a valid location code
+    return audit_rules(seattle_data, audit_table, loc_code_rules)
 
 
 def audit_correct_deci_degrees(seattle_data, audit_table):
 
-    seattle_data['longitude_audit'] = to_numeric(seattle_data['longitude'], errors='coerce')
-    seattle_data['latitude_audit'] = to_numeric(seattle_data['latitude'], errors='coerce')
-
-    # Audit the longitude if it's not at least within Washington's longitude range
-    audited_values = (
-                        seattle_data[
-                                        ~(
-                                            seattle_data
-                                            ['longitude_audit']
-                                            .between(-125.0, -116.5)
-                                            )
-                                    ]
-                                    [['offense_id', 'longitude']]
-                        )
-    
-    audit_table = audit_values_insert(
-                                        audit_table=audit_table,
-                                        audited_val=audited_values,
-                                        audit_reason=10
-                                        ) 
-
-
-    audited_values = (
-                        seattle_data[
-                                        ~(
-                                            seattle_data
-                                            ['latitude_audit']
-                                            .between(45.5, 49.0)
-                                            )     
-                                    ]
-                                    
-                                    [['offense_id', 'latitude']]
-                                    ) 
-    
-    seattle_data.drop(
-                        labels  = ['longitude_audit', 'latitude_audit'],
-                        inplace = True,
-                        axis    = 1
-                    )
-    
-
-    audit_table = audit_values_insert(
-                                        audit_table=audit_table,
-                                        audited_val=audited_values,
-                                        audit_reason=11
-                                        )
-    
-    return audit_table
-
-    
-    
\ No newline at end of file
+    # Audit the longitudes/latitudes that are not at least within Washington's longitude/latitude range
+    return audit_rules(seattle_data, audit_table, [longitude_rule, latitude_rule])
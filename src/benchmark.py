@@ -0,0 +1,493 @@
+import argparse
+import os
+import sys
+import tracemalloc
+from os import getenv
+from os.path import exists, join
+from resource import RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from numpy import nan
+from pandas import DataFrame, merge, read_csv, to_datetime, to_numeric
+from dotenv import load_dotenv
+
+from .audit_functions import AuditTimer, TimeError, create_audit
+from .clean_seattle_data import cleanup_column_order
+from .cache_seattle_data import update_cache
+from .resolve_loc_codes import update_beat_grid
+from .pipeline import data_auditing_functions, data_cleaning_functions
+from .seattle_loading import convert_into_record_sets
+from .synthetic_data import daily_volume, generate_batch
+
+load_dotenv()
+
+
+# Env variables of the files & directories the pipeline's stages write to; pointed at a scratch directory while
+# benchmarking, so a benchmark never touches the real dataset, cache, rollups, etc.
+output_env_variables = {
+                        'PARQUET_DIR':      'parquet',
+                        'ARROW_CACHE':      'cache.arrow',
+                        'ROLLUP_DIR':       '',
+                        'SPATIAL_INDEX':    'spatial_index.npz',
+                        'BEAT_GRID':        'beat_grid.csv',
+                        'BEAT_OBSERVATIONS':    'beat_observations.parquet',
+                        'ADDRESS_DIM':      'address_dimension.parquet',
+                        'ADDRESS_COORDINATES':  'address_coordinates.parquet',
+                        'RAW_ARCHIVE':      'raw_archive'
+                        }
+
+result_keys = ['scale', 'kind', 'step', 'function']
+
+fit_keys = ['kind', 'step', 'function']
+
+
+def scratch_environment(scratch_dir, seed=0):
+    """
+    Summary: Points the pipeline's output env variables at a scratch directory & seeds it with a month of clean,
+             synthetic history (cached, & with its beats observed into a beat grid), as a running pipeline would have.
+
+    Returns: dictionary of the env variables' previous values, to restore them afterwards
+    """
+
+    previous = {env_variable: getenv(env_variable) for env_variable in output_env_variables}
+
+    for env_variable, path in output_env_variables.items():
+        os.environ[env_variable] = join(scratch_dir, path)
+
+    os.makedirs(os.environ['PARQUET_DIR'], exist_ok=True)
+
+    history = generate_batch(
+                            rows        =   daily_volume * 30,
+                            dirty_rate  =   0,
+                            seed        =   seed + 1
+                            )
+
+    for column in ['offense_start_datetime', 'offense_end_datetime', 'report_datetime']:
+        history[column] = to_datetime(history[column], format='%Y-%m-%dT%H:%M:%S.%f')
+
+    for column in ['longitude', 'latitude']:
+        history[column] = to_numeric(history[column])
+
+    history = cleanup_column_order(history)
+
+    update_cache(history)
+    update_beat_grid(history)
+
+    return previous
+
+
+def restore_environment(previous):
+    """
+    Summary: Restores the env variables changed by scratch_environment.
+    """
+
+    for env_variable, value in previous.items():
+
+        if value is None:
+            os.environ.pop(env_variable, None)
+
+        else:
+            os.environ[env_variable] = value
+
+
+class MemoryTracker():
+    """
+    Summary: Measures the memory a stage takes, used alongside the AuditTimer: the peak of the allocations traced
+             (by tracemalloc) while the stage runs, above what was allocated when it started, & the process' peak RSS
+             once it's done. The RSS peak is process-wide (it only ever grows), so a stage pushing it up is the
+             stage that sets the batch's memory high-water mark.
+    """
+
+    def __init__(self):
+        self.start_allocated = None
+
+
+    def start(self):
+
+        if self.start_allocated is not None:
+            raise TimeError('Tracker is running. Use .stop() to stop it')
+
+        tracemalloc.reset_peak()
+        self.start_allocated = tracemalloc.get_traced_memory()[0]
+
+
+    def stop(self):
+
+        if self.start_allocated is None:
+            raise TimeError('Tracker is not running. Use .start() to start it')
+
+        traced_peak = tracemalloc.get_traced_memory()[1] - self.start_allocated
+        self.start_allocated = None
+
+        return traced_peak, peak_rss()
+
+
+def peak_rss():
+    """
+    Summary: Gets the process' peak resident set size (RSS), in bytes.
+    """
+
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    return getrusage(RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def profile_auditing_functions(seattle_data, memory=False):
+    """
+    Summary: Times (& with memory, measures the memory of) each auditing function over the (raw) batch, as run.py
+             runs them.
+
+    Returns: tuple -> (audit table, list of (step, function name, seconds, traced peak, peak RSS) tuples)
+    """
+
+    timer = AuditTimer()
+    tracker = MemoryTracker()
+    audit_table = create_audit(audit_type='values')
+    profiles = []
+
+    for step, audit_function in enumerate(data_auditing_functions):
+        timer.start()
+
+        if memory:
+            tracker.start()
+
+        audit_table = audit_function(
+                                    seattle_data=seattle_data,
+                                    audit_table=audit_table
+                                    )
+
+        seconds = timer.stop()
+        profiles.append((step, audit_function.__name__, seconds) + (tracker.stop() if memory else (nan, nan)))
+
+    return audit_table, profiles
+
+
+def profile_cleaning_functions(seattle_data, memory=False):
+    """
+    Summary: Times (& with memory, measures the memory of) each cleaning function, run in order over the batch, as
+             run.py runs them.
+
+    Returns: tuple -> (cleaned batch, list of (step, function name, seconds, traced peak, peak RSS) tuples)
+    """
+
+    timer = AuditTimer()
+    tracker = MemoryTracker()
+    profiles = []
+
+    for step, cleaning_function in enumerate(data_cleaning_functions):
+        timer.start()
+
+        if memory:
+            tracker.start()
+
+        seattle_data = cleaning_function(seattle_data)
+
+        seconds = timer.stop()
+        profiles.append((step, cleaning_function.__name__, seconds) + (tracker.stop() if memory else (nan, nan)))
+
+    return seattle_data, profiles
+
+
+def profile_loading_functions(seattle_data, audit_table, memory=False):
+    """
+    Summary: Times (& with memory, measures the memory of) the conversion of the cleaned batch & audit table into
+             the record sets inserted into the database.
+
+    Returns: list of (step, function name, seconds, traced peak, peak RSS) tuples
+    """
+
+    timer = AuditTimer()
+    tracker = MemoryTracker()
+
+    timer.start()
+
+    if memory:
+        tracker.start()
+
+    convert_into_record_sets(seattle_data, audit_table)
+
+    seconds = timer.stop()
+
+    return [(0, convert_into_record_sets.__name__, seconds) + (tracker.stop() if memory else (nan, nan))]
+
+
+def run_benchmark(scales=(1, 10, 100), dirty_rate=0.05, seed=0, repeat=1, memory=False):
+    """
+    Summary: Times every auditing, cleaning & loading (record set conversion) function over synthetic batches (see
+             synthetic_data.generate_batch) of the given sizes, along with the end-to-end throughput of the whole
+             pipeline. Each scale runs against its own scratch outputs (see scratch_environment). With repeat > 1,
+             each scale is run that many times & each function's fastest runtime (& smallest memory) is kept, the
+             least noisy estimate of its cost.
+
+             With memory, each function's memory is measured as well (see MemoryTracker): traced_peak, the most
+             memory it allocated at once, & peak_rss, the process' peak RSS once it's done. Tracing allocations
+             slows everything down, so the runtimes of a memory run aren't comparable with those of a plain run.
+
+    +-------+--------+----------+------+--------------------+---------+-------------+----------+-----------------+
+    | scale |  rows  |   kind   | step |      function      | seconds | traced_peak | peak_rss | rows_per_second |
+    +-------+--------+----------+------+--------------------+---------+-------------+----------+-----------------+
+    |   1   |  250   | cleaning |  0   | cleanup_whitespace |  0.012  |   104857    | 1.51e+08 |     20833.3     |
+    |   1   |  250   | pipeline |  -1  |     end_to_end     |  1.254  |   2097152   | 1.52e+08 |      199.4      |
+    +-------+--------+----------+------+--------------------+---------+-------------+----------+-----------------+
+
+    Returns: Pandas DataFrame
+
+    Params:
+        scales      :   batch sizes to benchmark, as multiples of a day's volume (synthetic_data.daily_volume)
+        dirty_rate  :   share of each column's values to make dirty
+        seed        :   seed of the synthetic data
+        repeat      :   number of times to run each scale
+        memory      :   whether to measure each function's memory, too
+    """
+
+    results = []
+
+    if memory:
+        tracemalloc.start()
+
+    try:
+        for scale in scales:
+
+            rows = int(scale * daily_volume)
+
+            seattle_data = generate_batch(
+                                        rows        =   rows,
+                                        dirty_rate  =   dirty_rate,
+                                        seed        =   seed
+                                        )
+
+            for _ in range(repeat):
+
+                with TemporaryDirectory() as scratch_dir:
+                    previous = scratch_environment(scratch_dir, seed)
+
+                    try:
+                        audit_table, auditing_profiles = profile_auditing_functions(seattle_data.copy(), memory)
+                        clean_data, cleaning_profiles = profile_cleaning_functions(seattle_data.copy(), memory)
+
+                        profiles = {
+                                    'auditing':     auditing_profiles,
+                                    'cleaning':     cleaning_profiles,
+                                    'loading':      profile_loading_functions(clean_data, audit_table, memory)
+                                    }
+
+                    finally:
+                        restore_environment(previous)
+
+                for kind, kind_profiles in profiles.items():
+                    results.extend(
+                                    (scale, rows, kind) + profile
+                                    for profile in kind_profiles
+                                    )
+
+                all_profiles = [profile for kind_profiles in profiles.values() for profile in kind_profiles]
+
+                results.append(
+                                (scale, rows, 'pipeline', -1, 'end_to_end',
+                                 sum(profile[2] for profile in all_profiles),
+                                 max(profile[3] for profile in all_profiles),
+                                 max(profile[4] for profile in all_profiles))
+                                )
+
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    results = (
+                DataFrame(results, columns=['scale', 'rows', 'kind', 'step', 'function', 'seconds', 'traced_peak', 'peak_rss'])
+                .groupby(
+                        by      =   ['scale', 'rows', 'kind', 'step', 'function'],
+                        sort    =   False
+                        )
+                [['seconds', 'traced_peak', 'peak_rss']]
+                .min()
+                .reset_index()
+                )
+
+    results['rows_per_second'] = results['rows'] / results['seconds']
+
+    return results
+
+
+def fit_bytes_per_row(results):
+    """
+    Summary: Fits each function's traced peak memory against the batch size (a least-squares line across the
+             benchmarked scales), giving the memory it takes per row of the batch & the fixed memory it takes
+             regardless of the batch size. The bytes per row are what a backfill's memory grows with; with a single
+             scale, they're simply the traced peak over the rows.
+
+    +----------+------+-------------------+---------------+-------------+
+    |   kind   | step |     function      | bytes_per_row | fixed_bytes |
+    +----------+------+-------------------+---------------+-------------+
+    | cleaning |  18  | config_addresses  |     2811.4    |   120433.0  |
+    +----------+------+-------------------+---------------+-------------+
+
+    Returns: Pandas DataFrame
+
+    Params:
+        results :   benchmark results of a memory run, as returned by run_benchmark(..., memory=True)
+    """
+
+    fits = []
+
+    for (kind, step, function), function_results in results.groupby(['kind', 'step', 'function'], sort=False):
+
+        rows = function_results['rows'].to_numpy(dtype='float64')
+        traced_peak = function_results['traced_peak'].to_numpy(dtype='float64')
+
+        if len(function_results) > 1:
+            bytes_per_row, fixed_bytes = np.polyfit(rows, traced_peak, deg=1)
+
+        else:
+            bytes_per_row, fixed_bytes = traced_peak[0] / rows[0], 0.0
+
+        fits.append((kind, step, function, bytes_per_row, fixed_bytes))
+
+    return DataFrame(fits, columns=['kind', 'step', 'function', 'bytes_per_row', 'fixed_bytes'])
+
+
+def save_baseline(results, baseline_path=None):
+    """
+    Summary: Stores benchmark results (or memory fits) as the baseline later runs are compared against.
+
+    Params:
+        results         :   benchmark results, as returned by run_benchmark, or memory fits, as returned by
+                            fit_bytes_per_row
+        baseline_path   :   path of the baseline CSV file; defaults to the BENCH_BASELINE env variable
+    """
+
+    if baseline_path is None:
+        baseline_path = getenv('BENCH_BASELINE')
+
+    results.to_csv(baseline_path, index=False)
+
+
+def compare_to_baseline(results, baseline_path=None, tolerance=0.25, min_seconds=0.005):
+    """
+    Summary: Compares benchmark results with the stored baseline, function by function. A function has regressed
+             if it's more than tolerance (a share) slower than in the baseline & at least min_seconds slower, so
+             near-instant functions don't flag on timer noise. Functions or scales missing from the baseline are
+             left uncompared (a null baseline).
+
+    Returns: Pandas DataFrame of the results with their baseline_seconds, ratio (seconds / baseline_seconds) &
+             whether they've regressed
+
+    Params:
+        results         :   benchmark results, as returned by run_benchmark
+        baseline_path   :   path of the baseline CSV file; defaults to the BENCH_BASELINE env variable
+        tolerance       :   share by which a function may be slower than its baseline, i.e. 0.25 -> 25% slower
+        min_seconds     :   least slowdown, in seconds, counted as a regression
+    """
+
+    if baseline_path is None:
+        baseline_path = getenv('BENCH_BASELINE')
+
+    baseline = read_csv(baseline_path)[result_keys + ['seconds']]
+
+    compared = merge(
+                    left        =   results,
+                    right       =   baseline.rename(columns={'seconds': 'baseline_seconds'}),
+                    how         =   'left',
+                    on          =   result_keys
+                    )
+
+    compared['ratio'] = compared['seconds'] / compared['baseline_seconds']
+
+    compared['regressed'] = (
+                            (compared['ratio'] > 1 + tolerance)
+                            &
+                            (compared['seconds'] - compared['baseline_seconds'] >= min_seconds)
+                            )
+
+    return compared
+
+
+def compare_memory_to_baseline(fits, baseline_path=None, tolerance=0.25, min_bytes_per_row=64):
+    """
+    Summary: Compares memory fits with the stored memory baseline, function by function. A function has regressed
+             if it takes more than tolerance (a share) more bytes per row than in the baseline & at least
+             min_bytes_per_row more, so functions taking next to no memory per row don't flag on allocator noise.
+
+    Returns: Pandas DataFrame of the fits with their baseline_bytes_per_row, ratio (bytes_per_row /
+             baseline_bytes_per_row) & whether they've regressed
+
+    Params:
+        fits                :   memory fits, as returned by fit_bytes_per_row
+        baseline_path       :   path of the memory baseline CSV file; defaults to the BENCH_MEMORY_BASELINE env
+                                variable
+        tolerance           :   share by which a function may take more memory per row than its baseline
+        min_bytes_per_row   :   least growth, in bytes per row, counted as a regression
+    """
+
+    if baseline_path is None:
+        baseline_path = getenv('BENCH_MEMORY_BASELINE')
+
+    baseline = read_csv(baseline_path)[fit_keys + ['bytes_per_row']]
+
+    compared = merge(
+                    left        =   fits,
+                    right       =   baseline.rename(columns={'bytes_per_row': 'baseline_bytes_per_row'}),
+                    how         =   'left',
+                    on          =   fit_keys
+                    )
+
+    compared['ratio'] = compared['bytes_per_row'] / compared['baseline_bytes_per_row']
+
+    compared['regressed'] = (
+                            (compared['ratio'] > 1 + tolerance)
+                            &
+                            (compared['bytes_per_row'] - compared['baseline_bytes_per_row'] >= min_bytes_per_row)
+                            )
+
+    return compared
+
+
+def main(argv=None):
+    """
+    Summary: Runs the benchmark from the command line (see --help); exits non-zero if any function regressed.
+
+    Params:
+        argv    :   the command line arguments; defaults to sys.argv
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmarks the auditing, cleaning & loading functions over synthetic SPD data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100], help="batch sizes, as multiples of a day's volume, i.e. 1 10 100")
+    parser.add_argument('--dirty-rate', type=float, default=0.05, help="share of each column's values to make dirty")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=1, help='number of runs per scale; the fastest runtimes are kept')
+    parser.add_argument('--memory', action='store_true', help="measure each function's memory & fit its bytes per row")
+    parser.add_argument('--baseline', default=None, help='path of the baseline CSV file; defaults to BENCH_BASELINE (BENCH_MEMORY_BASELINE with --memory)')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='share by which a function may be slower (or take more memory per row) than its baseline')
+    arguments = parser.parse_args(argv)
+
+    results = run_benchmark(arguments.scales, arguments.dirty_rate, arguments.seed, arguments.repeat, arguments.memory)
+
+    if arguments.memory:
+        print(results.to_string(index=False))
+
+        results = fit_bytes_per_row(results)
+        baseline_path = arguments.baseline or getenv('BENCH_MEMORY_BASELINE')
+        compare = compare_memory_to_baseline
+
+    else:
+        baseline_path = arguments.baseline or getenv('BENCH_BASELINE')
+        compare = compare_to_baseline
+
+    if arguments.save_baseline:
+        save_baseline(results, baseline_path)
+        print(results.to_string(index=False))
+
+    elif baseline_path is not None and exists(baseline_path):
+        compared = compare(results, baseline_path, arguments.tolerance)
+        print(compared.to_string(index=False))
+
+        if compared['regressed'].any():
+            raise SystemExit(f"Regressed: {', '.join(compared.loc[compared['regressed'], 'function'].unique())}")
+
+    else:
+        print(results.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
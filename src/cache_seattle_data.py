@@ -0,0 +1,131 @@
+from os import getenv, replace
+from os.path import exists
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import ipc
+from dotenv import load_dotenv
+
+from .retention import retention_date_limit
+
+load_dotenv()
+
+
+# Schema of the cached data, matching the column order given by cleanup_column_order
+cache_schema = pa.schema(
+                        [
+                        ('report_number',           pa.string()),
+                        ('offense_id',              pa.string()),
+                        ('offense_start_datetime',  pa.timestamp('ns')),
+                        ('offense_end_datetime',    pa.timestamp('ns')),
+                        ('report_datetime',         pa.timestamp('ns')),
+                        ('group_a_b',               pa.string()),
+                        ('crime_against_category',  pa.string()),
+                        ('offense_parent_group',    pa.string()),
+                        ('offense',                 pa.string()),
+                        ('offense_code',            pa.string()),
+                        ('precinct',                pa.string()),
+                        ('sector',                  pa.string()),
+                        ('beat',                    pa.string()),
+                        ('mcpp',                    pa.string()),
+                        ('_100_block_address',      pa.string()),
+                        ('longitude',               pa.float64()),
+                        ('latitude',                pa.float64())
+                        ]
+                        )
+
+
+def load_cache(cache_path=None, as_frame=False):
+    """
+    Summary: Opens the cached rolling year of cleaned data. The Arrow IPC file is memory-mapped & left
+             uncompressed, so the returned table references the file's pages directly rather than copying them
+             into memory; only the pages actually used by an analysis are read from disk.
+
+    Returns: pyarrow Table (or Pandas DataFrame if as_frame is True); empty if the cache doesn't exist yet
+
+    Params:
+        cache_path  :   path of the Arrow IPC file; defaults to the ARROW_CACHE env variable
+        as_frame    :   convert the table into a DataFrame (this copies the data)
+    """
+
+    if cache_path is None:
+        cache_path = getenv('ARROW_CACHE')
+
+    if cache_path is None:
+        raise ValueError('No cache path given & the ARROW_CACHE env variable is not set')
+
+    if exists(cache_path):
+        table = ipc.open_file(pa.memory_map(cache_path, 'r')).read_all()
+
+    else:
+        table = cache_schema.empty_table()
+
+    if as_frame:
+        return table.to_pandas()
+
+    return table
+
+
+def update_cache(seattle_data, cache_path=None):
+    """
+    Summary: Appends the batch to the cached rolling year and drops the days that have expired, following the same
+             retention rule as the database (see seattle_loading.remove_data). Records already in the cache are
+             replaced by their version in the batch. Meant to run right after cleanup_column_order.
+
+    Returns: the seattle_data, unchanged
+
+    Params:
+        seattle_data    :   the cleaned batch, in the column order given by cleanup_column_order
+        cache_path      :   path of the Arrow IPC file; defaults to the ARROW_CACHE env variable
+    """
+
+    if cache_path is None:
+        cache_path = getenv('ARROW_CACHE')
+
+    batch = pa.Table.from_pandas(
+                                df              =   seattle_data[cache_schema.names],
+                                schema          =   cache_schema,
+                                preserve_index  =   False
+                                )
+
+    cache = load_cache(cache_path=cache_path)
+
+    # Drop the cached versions of any records present in the batch, as well as any expired records
+    cache = cache.filter(
+                        pc.and_(
+                                pc.invert(pc.is_in(cache['offense_id'], value_set=batch['offense_id'])),
+                                not_expired(cache)
+                                )
+                        )
+
+    batch = batch.filter(not_expired(batch))
+
+    cache = pa.concat_tables([cache, batch])
+
+    # Write to a temporary file & swap it in, as the current file is memory-mapped by the read above
+    with pa.OSFile(cache_path + '.tmp', 'wb') as sink:
+        with ipc.new_file(sink, cache_schema) as writer:
+            writer.write_table(cache)
+
+    replace(cache_path + '.tmp', cache_path)
+
+    return seattle_data
+
+
+def not_expired(table):
+    """
+    Summary: Flags the records that fall within the retention window; like the database purge, records without
+             a report date/time are kept.
+
+    Returns: pyarrow boolean array
+    """
+
+    date_limit = pa.scalar(
+                            datetime.strptime(retention_date_limit(), '%Y-%m-%d'),
+                            type=pa.timestamp('ns')
+                            )
+
+    return pc.invert(
+                    pc.fill_null(pc.less(table['report_datetime'], date_limit), False)
+                    )
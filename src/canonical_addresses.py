@@ -0,0 +1,183 @@
+import pyarrow.compute as pc
+from pandas import DataFrame, Series
+from dotenv import load_dotenv
+
+from .cache_seattle_data import load_cache
+from .quality_rules import Rule, agrees_with, inferred, run_rules, street_correction_reason
+
+load_dotenv()
+
+
+# Streets recorded at least this many times within the cached rolling year are canonical; the rest are matched
+# against them
+min_street_count = 3
+
+# Street tokens a misspelled street must share with its canonical street, along with its numbers (i.e. 45TH): its
+# directions & street type. Only a street's name is ever corrected, so NE 45TH ST is never turned into NW 46TH ST
+street_fixed_tokens = frozenset([
+                                'N', 'S', 'E', 'W', 'NE', 'NW', 'SE', 'SW',
+                                'AVE', 'ST', 'WAY', 'PL', 'DR', 'CT', 'LN', 'RD', 'BLVD', 'TER', 'CIR', 'PKWY',
+                                'HWY', 'FWY', 'BR', 'ALY', 'LOOP', 'SQ', 'WALK', 'TRL', 'CRES', 'RAMP'
+                                ])
+
+# The block part of a block address, i.e. 3200 BLOCK OF 23RD AVE W
+block_re = r'^\d+ BLOCK OF '
+
+
+def split_streets(addresses):
+    """
+    Summary: Splits addresses into their block part & their street(s):
+                > 3200 BLOCK OF 23RD AVE W      -> 3200 BLOCK OF , [23RD AVE W]
+                > 26TH AVE NE/NE BLAKELEY ST    -> '', [26TH AVE NE, NE BLAKELEY ST]
+
+    Returns: tuple of Pandas Series -> (block parts, lists of streets)
+    """
+
+    blocks = addresses.str.extract(f'({block_re})', expand=False).fillna('')
+    streets = addresses.str.replace(block_re, '', regex=True).str.split('/')
+
+    return blocks, streets
+
+
+def street_signature(street):
+    """
+    Summary: Gets the tokens of a street that a correction must keep (see street_fixed_tokens), in order, i.e.
+             NE 45TH ST -> NE 45TH ST, PIKE ST -> ST.
+
+    Returns: string
+    """
+
+    return ' '.join(token for token in street.split() if token in street_fixed_tokens or any(map(str.isdigit, token)))
+
+
+def canonical_streets(cache_path=None, min_count=min_street_count):
+    """
+    Summary: Gets the canonical streets: those recorded at least min_count times within the cached rolling year (see
+             cache_seattle_data), counting each record once per street of its address.
+
+    Returns: Pandas Series of each canonical street's record count, most recorded first
+    """
+
+    address_counts = pc.value_counts(load_cache(cache_path=cache_path)['_100_block_address']).flatten()
+
+    addresses = DataFrame(
+                        {
+                        'address':  address_counts[0].to_numpy(zero_copy_only=False),
+                        'count':    address_counts[1].to_numpy()
+                        }
+                        ).dropna()
+
+    addresses['street'] = split_streets(addresses['address'].astype('O'))[1]
+
+    street_counts = addresses.explode('street').groupby('street')['count'].sum().sort_values(ascending=False, kind='stable')
+
+    return street_counts[street_counts >= min_count]
+
+
+def street_corrections(streets, canonical):
+    """
+    Summary: Matches streets that aren't canonical against the canonical streets sharing their signature (see
+             street_signature), each signature's canonical streets being held in their own fuzzy index (see
+             fuzzy_index.FuzzyIndex). Ties are broken in favour of the most recorded street.
+
+    Returns: dictionary of street -> canonical street, for the streets matched with a score >= match_threshold
+    """
+
+    # Imported here, so importing the module doesn't pull in the fuzzy matching library
+    from .fuzzy_index import FuzzyIndex, match_threshold
+
+    unknown = Series(sorted(set(streets).difference(canonical.index)), dtype='O')
+
+    if unknown.empty or canonical.empty:
+        return {}
+
+    signatures = unknown.map(street_signature)
+    canonical_signatures = canonical.index.to_series().map(street_signature)
+
+    corrections = {}
+
+    for signature, queries in unknown.groupby(signatures, sort=False):
+        choices = canonical_signatures.index[canonical_signatures == signature]
+
+        if not len(choices):
+            continue
+
+        matches = FuzzyIndex(choices).extract(queries)
+        matched = matches['score'] >= match_threshold
+
+        corrections.update(zip(queries[matched], matches.loc[matched, 'match']))
+
+    return corrections
+
+
+def address_corrections(addresses, cache_path=None):
+    """
+    Summary: Corrects misspelled street names within distinct block addresses, i.e. 100 BLOCK OF PIKKE ST -> 100 BLOCK
+             OF PIKE ST, by fuzzy matching each street that isn't canonical against the canonical streets (see
+             canonical_streets & street_corrections). Only the street names are corrected; the block, the numbered
+             streets, directions & street types are left as they are.
+
+    Returns: dictionary of address -> corrected address, for the addresses with a corrected street
+
+    Params:
+        addresses   :   Pandas Series of distinct block addresses
+        cache_path  :   path of the Arrow IPC file; defaults to the ARROW_CACHE env variable
+    """
+
+    if addresses.empty:
+        return {}
+
+    blocks, streets = split_streets(addresses)
+
+    corrections = street_corrections(streets.explode().dropna(), canonical_streets(cache_path))
+
+    if not corrections:
+        return {}
+
+    corrected = blocks + streets.map(lambda address_streets: '/'.join(corrections.get(street, street) for street in address_streets))
+    changed = corrected != addresses
+
+    return dict(zip(addresses[changed], corrected[changed]))
+
+
+def canonical_block_addresses(shared):
+    """
+    Summary: Gets the corrected block address of each record whose address has a misspelled street (see
+             address_corrections); each distinct address is corrected once.
+
+    Returns: Pandas DataFrame of the _100_block_address, indexed like the records whose address is corrected
+
+    Params:
+        shared  :   the batch's shared columns (see quality_rules.SharedColumns)
+    """
+
+    addresses = shared.seattle_data['_100_block_address']
+
+    corrected = addresses.map(address_corrections(Series(addresses.dropna().unique(), dtype='O')))
+
+    return DataFrame({'_100_block_address': corrected[corrected.notna()].astype('O')})
+
+
+# Misspelled streets are replaced by their canonical street, the address as it was being audited
+street_correction_rules = [
+                            Rule(
+                                columns     =   ['_100_block_address'],
+                                predicate   =   agrees_with('_100_block_address', canonical_block_addresses),
+                                action      =   'correct',
+                                reason      =   street_correction_reason,
+                                correction  =   inferred(canonical_block_addresses)
+                                )
+                            ]
+
+
+def canonicalize_addresses(seattle_data):
+    """
+    Summary: Corrects misspelled street names within the block addresses (see street_correction_rules &
+             address_corrections). Meant to run right after cleanup_addresses.
+
+    Returns: Pandas DataFrame
+    """
+
+    seattle_data, _ = run_rules(seattle_data, street_correction_rules)
+
+    return seattle_data
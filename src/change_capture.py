@@ -0,0 +1,188 @@
+import json
+from os import getenv, replace
+from os.path import exists
+
+from dotenv import load_dotenv
+
+from .retention import retention_date_limit
+
+load_dotenv()
+
+
+# Socrata system field holding when each record was last added or revised
+updated_at_column = ':updated_at'
+
+# Arrays of the row hash store (see load_row_hashes), along with their dtypes
+row_hash_arrays = {
+                    'offense_id':   'int64',
+                    'row_hash':     'uint64',
+                    'report_date':  'int64'
+                    }
+
+
+def row_hashes(raw_data):
+    """
+    Summary: Hashes each raw record's content (every retrieved column but :updated_at, in name order), giving a
+             64-bit hash that's stable across runs, so a record's hash only changes when SPD revises one of its
+             values. Raw records are hashed, rather than cleaned ones, so unchanged records can skip the cleaning.
+
+    Returns: numpy uint64 array
+    """
+
+    # pandas (& the offense index) are imported within the functions, so the cli's dry run stays near instant
+    from pandas.util import hash_pandas_object
+
+    columns = sorted(column for column in raw_data.columns if column != updated_at_column)
+
+    return hash_pandas_object(raw_data[columns], index=False).to_numpy()
+
+
+def load_row_hashes(hashes_path=None):
+    """
+    Summary: Loads the row hash store: an offense index (see offense_index.load_index) of the content hash (see
+             row_hashes) & report date of each loaded record within the retention window.
+
+    Returns: dictionary of numpy arrays (see row_hash_arrays); empty arrays if the store doesn't exist yet
+
+    Params:
+        hashes_path :   path of the store's .npz file; defaults to the ROW_HASHES env variable
+    """
+
+    from .offense_index import load_index
+
+    return load_index(hashes_path or getenv('ROW_HASHES'), row_hash_arrays)
+
+
+def changed_rows(raw_data, hashes_path=None):
+    """
+    Summary: Keeps the raw records that are new or whose content has changed since they were loaded, looking each
+             offense_id up in the (sorted) row hash store by binary search.
+
+    Returns: Pandas DataFrame
+    """
+
+    from .offense_index import lookup, offense_ids
+
+    store = load_row_hashes(hashes_path)
+
+    found, positions = lookup(store, offense_ids(raw_data))
+
+    unchanged = found & (store['row_hash'][positions] == row_hashes(raw_data)) if found.any() else found
+
+    return raw_data[~unchanged].reset_index(drop=True)
+
+
+def update_row_hashes(raw_data, hashes_path=None):
+    """
+    Summary: Records the hashes of a loaded batch's raw records in the row hash store, replacing the previous hashes
+             of revised records, & drops the records that have expired.
+
+    Returns: the raw_data, unchanged
+    """
+
+    from .offense_index import index_lock, merge_index, offense_ids, report_days
+
+    if hashes_path is None:
+        hashes_path = getenv('ROW_HASHES')
+
+    batch = {
+            'offense_id':   offense_ids(raw_data),
+            'row_hash':     row_hashes(raw_data),
+            'report_date':  report_days(raw_data)
+            }
+
+    with index_lock:
+        merge_index(load_row_hashes(hashes_path), batch, hashes_path)
+
+    return raw_data
+
+
+def load_watermark(watermark_path=None):
+    """
+    Summary: Loads the change data capture watermark: the latest :updated_at value that's been loaded. Defaults to
+             the retention date limit, so the first run captures every record within the retention window.
+
+    Returns: the watermark, as a yyyy-mm-ddThh:mm:ss.fff (or yyyy-mm-dd) string value
+
+    Params:
+        watermark_path  :   path of the watermark's JSON file; defaults to the CDC_WATERMARK env variable
+    """
+
+    if watermark_path is None:
+        watermark_path = getenv('CDC_WATERMARK')
+
+    if not exists(watermark_path):
+        return retention_date_limit()
+
+    with open(watermark_path) as file:
+        return json.load(file)['updated_at']
+
+
+def save_watermark(updated_at, watermark_path=None):
+    """
+    Summary: Saves the change data capture watermark, replacing the file only once fully written.
+    """
+
+    if watermark_path is None:
+        watermark_path = getenv('CDC_WATERMARK')
+
+    with open(watermark_path + '.tmp', 'w') as file:
+        json.dump({'updated_at': updated_at}, file)
+
+    replace(watermark_path + '.tmp', watermark_path)
+
+
+def run_cdc_batch(watermark_path=None, hashes_path=None):
+    """
+    Summary: Runs a change data capture batch, which keeps the database in line with SPD's revisions of historical
+             records across the whole retention window while only doing work proportional to what changed:
+                > Retrieves the records added or revised since the watermark (see socrata_changes)
+                > Drops the records whose content is unchanged since they were loaded (see changed_rows)
+                > Audits & cleans the rest
+                > Upserts them into the database, replacing the previous versions of revised records
+                > Records their hashes & moves the watermark to the latest :updated_at retrieved
+
+             The watermark & hashes only move once the batch has been loaded, so a failed batch is simply retried by
+             the next run.
+
+    Returns: number of records upserted, or None if no data could be retrieved
+
+    Params:
+        watermark_path  :   path of the watermark's JSON file; defaults to the CDC_WATERMARK env variable
+        hashes_path     :   path of the row hash store; defaults to the ROW_HASHES env variable
+    """
+
+    from .retrieve_seattle_data import retrieve_data, socrata_changes
+    from .pipeline import audit_batch, clean_batch, convert_batch, insert_batch
+    from .raw_archive import archive_raw
+
+    raw_data = retrieve_data(
+                            date                =   load_watermark(watermark_path),
+                            how                 =   '>',
+                            retrieval_functions =   [socrata_changes]
+                            )
+
+    if raw_data is None:
+        return None
+
+    if raw_data.empty:
+        return 0
+
+    latest_updated_at = raw_data[updated_at_column].max()
+
+    raw_data = changed_rows(archive_raw(raw_data.drop(columns=updated_at_column)), hashes_path)
+
+    if not raw_data.empty:
+        # Cleaned as a copy, as the cleaning modifies some columns in place & the raw content is hashed once loaded
+        clean_data, _, audit_table = clean_batch(raw_data.copy(), audit_table=audit_batch(raw_data))
+
+        insert_batch(
+                    record_sets             =   convert_batch(clean_data, audit_table),
+                    replaced_offense_ids    =   raw_data['offense_id'].dropna().unique().tolist()
+                    )
+
+        update_row_hashes(raw_data, hashes_path)
+
+    save_watermark(latest_updated_at, watermark_path)
+
+    return len(raw_data)
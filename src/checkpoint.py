@@ -0,0 +1,249 @@
+import gzip
+import pickle
+from os import getenv, listdir, makedirs, remove, replace, rmdir
+from os.path import dirname, exists, join
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# The stages of a batch whose output is checkpointed, in order: the retrieved data, the audit table, the cleaned batch
+# & the record sets inserted into the database
+checkpoint_stages = ['raw', 'audited', 'cleaned', 'record_sets']
+
+# How each retrieval comparison is spelled within batch ids
+how_names = {
+            '>':    'gt',
+            '>=':   'ge',
+            '=':    'eq',
+            '<=':   'le',
+            '<':    'lt'
+            }
+
+
+def batch_id(date, how='>='):
+    """
+    Summary: Gets the id a batch's checkpoints are kept under, given the date & comparison it's retrieved by, i.e.
+             date: 2023-03-08, how: '=' -> 2023-03-08_eq
+    """
+
+    return f'{date}_{how_names[how]}'
+
+
+def checkpoint_path(batch, stage, checkpoint_dir=None):
+    """
+    Summary: Gets the path of a batch's checkpoint of a stage.
+
+    Params:
+        batch           :   the batch id (see batch_id)
+        stage           :   one of checkpoint_stages
+        checkpoint_dir  :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+    """
+
+    if checkpoint_dir is None:
+        checkpoint_dir = getenv('CHECKPOINT_DIR')
+
+    return join(checkpoint_dir, batch, f'{stage}.pkl.gz')
+
+
+def save_checkpoint(stage_output, batch, stage, checkpoint_dir=None):
+    """
+    Summary: Saves a stage's output as a (gzip-compressed) pickle, replacing any previous checkpoint only once fully
+             written, so an interrupted save never leaves a partial checkpoint behind.
+
+    Returns: the stage_output, unchanged
+    """
+
+    path = checkpoint_path(batch, stage, checkpoint_dir)
+
+    makedirs(dirname(path), exist_ok=True)
+
+    # Fastest compression level; checkpoints are short-lived, so speed matters more than the last few percent of size
+    with gzip.open(path + '.tmp', 'wb', compresslevel=1) as file:
+        pickle.dump(stage_output, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    replace(path + '.tmp', path)
+
+    return stage_output
+
+
+def load_checkpoint(batch, stage, checkpoint_dir=None):
+    """
+    Summary: Loads a stage's checkpointed output.
+    """
+
+    with gzip.open(checkpoint_path(batch, stage, checkpoint_dir), 'rb') as file:
+        return pickle.load(file)
+
+
+def completed_stages(batch, checkpoint_dir=None):
+    """
+    Summary: Gets the stages of a batch that have been checkpointed.
+
+    Returns: list of stages, in checkpoint_stages order
+    """
+
+    return [
+            stage
+            for stage in checkpoint_stages
+            if exists(checkpoint_path(batch, stage, checkpoint_dir))
+            ]
+
+
+def clear_checkpoints(batch, checkpoint_dir=None):
+    """
+    Summary: Deletes every checkpoint of a batch, i.e. once it's been loaded.
+    """
+
+    batch_dir = join(checkpoint_dir or getenv('CHECKPOINT_DIR'), batch)
+
+    if not exists(batch_dir):
+        return
+
+    for file_name in listdir(batch_dir):
+        remove(join(batch_dir, file_name))
+
+    rmdir(batch_dir)
+
+
+def fetch_stage(date, how='>=', checkpoint_dir=None):
+    """
+    Summary: Retrieves a batch & checkpoints the raw data, less the records that have already been loaded (see
+             offense_index.drop_loaded), unless the batch already has a checkpoint (in which case it's resumed from
+             there by the later stages).
+
+    Returns: the batch id, or None if no data could be retrieved (or every record retrieved has already been loaded)
+    """
+
+    from .retrieve_seattle_data import retrieve_data
+    from .offense_index import drop_loaded
+    from .raw_archive import archive_raw
+
+    batch = batch_id(date, how)
+
+    if completed_stages(batch, checkpoint_dir):
+        return batch
+
+    raw_data = retrieve_data(date=date, how=how)
+
+    if raw_data is None:
+        return None
+
+    archive_raw(raw_data)
+
+    raw_data = drop_loaded(raw_data)
+
+    if raw_data.empty:
+        return None
+
+    save_checkpoint(raw_data, batch, 'raw', checkpoint_dir)
+
+    return batch
+
+
+def clean_stage(batch, checkpoint_dir=None, output_lock=None, stage_cache_dir=None):
+    """
+    Summary: Audits & cleans a fetched batch & converts it into record sets, checkpointing the audit table, cleaned
+             batch & record sets. Stages already checkpointed aren't redone.
+
+    Returns: the batch id
+
+    Params:
+        batch           :   the batch id, as returned by fetch_stage
+        checkpoint_dir  :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+        output_lock     :   see pipeline.clean_batch
+        stage_cache_dir :   see pipeline.clean_batch
+    """
+
+    from .pipeline import audit_batch, clean_batch, convert_batch
+
+    completed = completed_stages(batch, checkpoint_dir)
+
+    if 'record_sets' in completed:
+        return batch
+
+    if 'cleaned' in completed:
+        clean_data = load_checkpoint(batch, 'cleaned', checkpoint_dir)
+
+    else:
+        raw_data = load_checkpoint(batch, 'raw', checkpoint_dir)
+
+        if 'audited' in completed:
+            audit_table = load_checkpoint(batch, 'audited', checkpoint_dir)
+
+        else:
+            audit_table = save_checkpoint(audit_batch(raw_data), batch, 'audited', checkpoint_dir)
+
+        # The audit table gains the values the cleaning corrects (see pipeline.rule_stages), so it's checkpointed again
+        # before the cleaned batch
+        clean_data, _, audit_table = clean_batch(
+                                                raw_data,
+                                                output_lock,
+                                                stage_cache_dir =   stage_cache_dir,
+                                                audit_table     =   audit_table
+                                                )
+
+        save_checkpoint(audit_table, batch, 'audited', checkpoint_dir)
+        save_checkpoint(clean_data, batch, 'cleaned', checkpoint_dir)
+
+    save_checkpoint(
+                    convert_batch(clean_data, load_checkpoint(batch, 'audited', checkpoint_dir)),
+                    batch,
+                    'record_sets',
+                    checkpoint_dir
+                    )
+
+    return batch
+
+
+def load_stage(batch, checkpoint_dir=None):
+    """
+    Summary: Inserts a cleaned batch's record sets into the database, recording the hashes of its checkpointed raw
+             data (see pipeline.record_loaded_batch), then deletes the batch's checkpoints. The insert exits the
+             process if it fails, leaving the checkpoints for the next run to resume from.
+
+    Returns: the batch id
+    """
+
+    from .pipeline import insert_batch
+
+    insert_batch(
+                record_sets =   load_checkpoint(batch, 'record_sets', checkpoint_dir),
+                raw_data    =   load_checkpoint(batch, 'raw', checkpoint_dir)
+                )
+
+    clear_checkpoints(batch, checkpoint_dir)
+
+    return batch
+
+
+def run_checkpointed_batch(date=None, how='>=', checkpoint_dir=None):
+    """
+    Summary: Retrieves, audits, cleans & loads a batch like pipeline.run_batch, but checkpoints each stage's output
+             (see checkpoint_stages) under the batch's id. Running the same batch again resumes from the last
+             completed stage, so a failure (i.e. in the database insert) only costs the failed stage rather than
+             the whole retrieval & cleaning. The batch's checkpoints are deleted once it's been loaded.
+
+    Returns: the batch id, or None if no data could be retrieved (or every record retrieved has already been loaded)
+
+    Params:
+        date            :   represents date from which to retrieve data by; must be in yyyy-mm-dd format. Defaults
+                            to yesterday
+        how             :   allows you to specify how data sould be retrieved with respect to date: >, <, >=, <=, or =
+        checkpoint_dir  :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+    """
+
+    from datetime import datetime, timedelta
+
+    if date is None:
+        date = datetime.strftime(datetime.today().date() - timedelta(days=1), '%Y-%m-%d')
+
+    batch = fetch_stage(date, how, checkpoint_dir)
+
+    if batch is None:
+        return None
+
+    clean_stage(batch, checkpoint_dir)
+
+    return load_stage(batch, checkpoint_dir)
@@ -1,14 +1,40 @@
 from os import getenv
+import numpy as np
 from numpy import nan
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from pandas import read_csv, to_datetime, to_numeric, notnull, merge
 
-from fuzzywuzzy.process import extractOne
 from dotenv import load_dotenv
 
+from .seattle_schema import map_unique
+from .datetime_parsing import datetime_columns, parse_datetimes
+from .quality_rules import run_rules, offense_datetime_rule, longitude_rule, latitude_rule
+
 load_dotenv()
 
 
+# Designated, common missing value representations, nulled in every column (see cleanup_na_values)
+missing_values = frozenset(['UNKNOWN', '99', 99, 'OOJ', '<NULL>', '<Null>', 'NULL',
+                            'null', 'nil', 'empty', '-', 'NA', 'n/a', 'na'])
+
+# The missing_values as read_csv na_values, so raw data can be read with them already missing. Only the values still
+# missing once uppercased by cleanup_column_casing are included (i.e. not 'nil', which becomes 'NIL'), so reading
+# them as missing nulls exactly what cleanup_na_values would have
+na_values = sorted(value for value in missing_values if isinstance(value, str) and value.upper() in missing_values)
+
+# Column specific missing value indicators, as regex patterns:
+#   > The _100_block_address column uses distinct address values containing the OFTH, OFND and OFRD non-existant
+#     street names as a sort of missing value indicator/placeholder/etc.
+#   > Longitude/latitude use 0's as missing longitude/latitude values
+column_missing_patterns = {
+                            '_100_block_address':   r'OFTH|OFND|OFRD',
+                            'latitude':             r'^0',
+                            'longitude':            r'^0'
+                            }
+
+
 
 def cleanup_whitespace(seattle_data):
     """
@@ -112,7 +138,8 @@ def cleanup_whitespace(seattle_data):
 
 def cleanup_column_casing(seattle_data):
     """
-    Summary: Make text column casing consistent; uppercase any columns containing letters
+    Summary: Make text column casing consistent; uppercase any columns containing letters. Only each
+            column's distinct values are uppercased (see seattle_schema.map_unique).
     """
 
     # For columns with letters
@@ -120,66 +147,49 @@ def cleanup_column_casing(seattle_data):
                     'offense_code', 'precinct', 'sector', 'beat', 'mcpp', '_100_block_address']:
 
         # Uppercase those letters
-        seattle_data[column] = (
-                                seattle_data
-                                [column]
-                                .str.upper()
-                                )
+        seattle_data[column] = map_unique(
+                                        column=seattle_data[column],
+                                        function=lambda values: values.str.upper()
+                                        )
         
     return seattle_data
 
 
-def cleanup_na_values(seattle_data):
+def pattern_matches(column, pattern):
     """
-    Summary: Replaces any common, designated missing values (given in the missing_values
-                class attribute) or column specific missing value indicators with a np.nan value
+    Summary: Flags a column's values matching a regex pattern, using pyarrow's (RE2) regex engine, which matches a
+                column several times faster than the row by row .str.contains. Missing values never match; columns
+                holding values other than strings fall back to .str.contains, under which those values don't match.
+
+    Returns: numpy boolean array
     """
 
-    # List of designated, common missing values representations
-    missing_values = ['UNKNOWN', '99', 99, 'OOJ', '<NULL>', '<Null>', 'NULL',
-                    'null', 'nil', 'empty', '-', 'NA', 'n/a', 'na']
+    try:
+        values = pa.array(column.to_numpy(dtype='O'), type=pa.string(), from_pandas=True)
 
-    # For each column
-    for column in list(seattle_data):
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return column.str.contains(pat=pattern, na=False, regex=True).to_numpy(dtype=bool)
 
-        # Replace specific missing values with a nan value (for consistency)
-        seattle_data.loc[
-                        seattle_data
-                        [column]
-                        .isin(values=missing_values),
+    return pc.fill_null(pc.match_substring_regex(values, pattern=pattern), False).to_numpy(zero_copy_only=False)
 
-                        [column]
-                        ] = nan
 
+def cleanup_na_values(seattle_data):
+    """
+    Summary: Replaces any common, designated missing values (given by missing_values) or column specific missing
+                value indicators (given by column_missing_patterns) with a np.nan value. Each column is scanned
+                once for both (a hash lookup per value & one regex pass) & only assigned to if it holds any.
+    """
 
-    # The _100_block_address column uses a distinct address value as a sort of missing value indicator/placeholder/etc.
-    # These distinct address values contain the OFTH, OFND and OFRD non-existant street names
-    seattle_data.loc[
-                    seattle_data
-                    ['_100_block_address']
-                    .str.contains(
-                                pat=r"OFTH|OFND|OFRD",
-                                na=False,
-                                regex=True
-                                ),
+    for column in list(seattle_data):
 
-                        ['_100_block_address']
-                        ] = nan
+        missing = seattle_data[column].isin(values=missing_values).to_numpy()
 
+        if column in column_missing_patterns:
+            missing |= pattern_matches(seattle_data[column], column_missing_patterns[column])
 
-    # Longitude/latitude use 0's as missing longitude/latitude values
-    for column in ['latitude', 'longitude']:
-        seattle_data.loc[
-                        seattle_data
-                        [column]
-                        .str.contains(
-                                    pat=r'^0',
-                                    regex=True
-                                    ), 
+        if missing.any():
+            seattle_data.loc[missing, column] = nan
 
-                            [column]
-                            ] = nan
-        
 
     return seattle_data
 
@@ -272,14 +282,8 @@ def cleanup_dtypes(seattle_data):
                 through the audit table.
     """
 
-    # For each datetime column ...
-    for column in ['offense_start_datetime', 'offense_end_datetime', 'report_datetime']:
-
-        # Convert data type to datetime
-        seattle_data[column] = to_datetime(
-                                        arg=seattle_data[column], 
-                                        errors='coerce'
-                                        )
+    # Convert the datetime columns' data type to datetime, parsing each distinct timestamp once
+    seattle_data[datetime_columns] = parse_datetimes(seattle_data)
 
 
     # Do the same with the numeric columns as done with the datetime columns
@@ -300,15 +304,7 @@ def correct_offense_datetime(seattle_data):
             datetime is greater than, or after, the offense end datetime
     """
 
-      
-    # Null offense start/end datetime values where the offense end datetime is 
-    # before the offense start datetime
-    seattle_data.loc[
-                    seattle_data['offense_start_datetime'] > 
-                    seattle_data['offense_end_datetime'],
-                    ['offense_start_datetime', 'offense_end_datetime']
-                    ] = nan
-    
+    seattle_data, _ = run_rules(seattle_data, [offense_datetime_rule])
 
     return seattle_data
 
@@ -527,14 +523,17 @@ def cleanup_report_number(seattle_data):
 def cleanup_misspelled_mcpp(seattle_data):
     """
     Summary: Attempts to correct invalid (potentially misspelled) mcpp (micro-community) values with
-                a valid mcpp value using fuzzy string matching and a list of all the valid mcpp's (the mcpp
-                class attribute).
+                a valid mcpp value using fuzzy string matching against a fuzzy index of all the valid mcpp's
+                (see fuzzy_index.FuzzyIndex), each distinct misspelling being matched once.
 
                 Creates two additional columns, match & match_certainty, which hold the best match & the percentage
                 score for said match. If the match score is >= 85%, it assigns the actual mcpp value the match. If
                 the match score is < 85%, mcpp values are audited & made null. 
     """
 
+    # Imported here, so importing the module (i.e. for the other stages) doesn't pull in the fuzzy matching library
+    from .fuzzy_index import FuzzyIndex, match_threshold
+
     # Load dataframe containing valid, corresponding precinct/mcpp location code pairings used to verify raw data against
     mcpp = read_csv(
                     filepath_or_buffer=getenv('MCPP'), 
@@ -542,56 +541,43 @@ def cleanup_misspelled_mcpp(seattle_data):
                     )
 
     # Checks for records where mcpp is invalid and not null; these record's mcpp value could be misspelled
-    if (
-        seattle_data[
-                        (
-                            ~seattle_data                   # Checks that the mcpp is NOT in list of valid mcpp's
-                            ['mcpp']
-                            .isin(mcpp['mcpp'])
-                        ) 
-                        
-                        &    
-
-                        (
-                            ~seattle_data                   # And, that the mcpp is NOT nan
-                            ['mcpp']
-                            .isna()
-                        )                                   
-                    ]
-        ).any: 
-
-
-        # Create 'match' column which, for each row, compares mcpp value to list of valid mcpp values & returns best match;
-        # fyi, extractOne returns tuple containing the match & its score -> (match, score)
-        seattle_data['match'] = (
-                                    seattle_data
-                                    .apply(
-                                            lambda row: extractOne(
-                                                                    query=row['mcpp'],      # the row's mcpp value
-                                                                    choices=mcpp['mcpp']    # the list of valid mcpp's 
-                                                                    )[0],                   # the match
-                                                        axis=1                          
-                                            )
-                                )
-
-        # Create 'match_certainty' column which, for each row, compares mcpp value to list of valid mcpp values & returns the match score
-        seattle_data['match_certainty'] = (
-                                            seattle_data
-                                            .apply(
-                                                    lambda row: extractOne(
-                                                                            query=row['mcpp'],         # the row's mcpp value
-                                                                            choices=mcpp['mcpp']       # the list of valid mcpp's 
-                                                                            )[1],                      # the match
-                                                                                                        
-                                                                axis=1  
-                                                    ) 
-                                            )  
+    misspelled = (
+                    (
+                        ~seattle_data                   # Checks that the mcpp is NOT in list of valid mcpp's
+                        ['mcpp']
+                        .isin(mcpp['mcpp'])
+                    ) 
+                    
+                    &    
+
+                    (
+                        ~seattle_data                   # And, that the mcpp is NOT nan
+                        ['mcpp']
+                        .isna()
+                    )
+                )
+
+    if misspelled.any(): 
+
+        # For each possibly misspelled mcpp, get the best match among the valid mcpp values & its score
+        matches = FuzzyIndex(mcpp['mcpp']).extract(
+                                                    seattle_data
+                                                    .loc[misspelled, 'mcpp']
+                                                    .astype(dtype='O')
+                                                    )
+
+        # Create 'match' & 'match_certainty' columns, holding the best match & its score; valid mcpp's are their own match
+        seattle_data['match'] = seattle_data['mcpp']
+        seattle_data['match_certainty'] = 100
+
+        seattle_data.loc[misspelled, 'match'] = matches['match']
+        seattle_data.loc[misspelled, 'match_certainty'] = matches['score']
 
         # Assign the actual mcpp value the match if the score is >= 85%
         seattle_data.loc[
                             seattle_data
                             ['match_certainty'] 
-                            >= 85, 
+                            >= match_threshold, 
 
                             ['mcpp'] 
                             ] = (
@@ -603,7 +589,7 @@ def cleanup_misspelled_mcpp(seattle_data):
         seattle_data.loc[
                             seattle_data
                             ['match_certainty'] 
-                            < 85, 
+                            < match_threshold, 
 
                             ['mcpp'] 
                         ] = nan
@@ -744,52 +730,7 @@ def correct_deci_degrees(seattle_data):
             latitude; if not, audit and nullify these values.
     """
 
-    # Confirm the longitude is at least within Washington's longitude range; otherwise audit and null the value
-    if (
-        seattle_data[
-                        ~(
-                        seattle_data
-                        ['longitude']
-                        .between(-125.0, -116.5)
-                        )
-                    ]
-        ).any:
-
-     
-
-        seattle_data.loc[
-                            ~(
-                            seattle_data
-                            ['longitude']
-                            .between(-125.0, -116.5)
-                            ),
-
-                        ['longitude']
-                        ] = nan
-
-
-    # Confirm the latitude is at least within Washington's latitude range
-    # Otherwise null the value
-    if (
-        seattle_data[
-                        ~(
-                        seattle_data
-                        ['latitude']
-                        .between(45.5, 49.0)
-                        )
-                    ]
-        ).any:
-
-        seattle_data.loc[
-                            ~(
-                            seattle_data
-                            ['latitude']
-                            .between(45.5, 49.0)
-                            ),
-                            
-                            ['latitude']
-                        ] = nan
-            
+    seattle_data, _ = run_rules(seattle_data, [longitude_rule, latitude_rule])
 
     return seattle_data
 
@@ -817,69 +758,55 @@ def config_addresses(seattle_data):
     Summary: Breaks apart/separates multivalued address values into two, separate rows:
                 ... 26TH AVE NE / NE BLAKELEY ST -> ... 26TH AVE NE
                                                     ... NE BLAKELEY ST
+
+            Only the address column is split; the rest of the record is repeated by position for each
+            address part, so the other columns are never hashed or turned into an index. The address column
+            is moved to the end & each row's index is the position of its part within the original address.
     """
 
-    def split_address(address_col: pd.Series):
-    
-        return (
-                address_col.str
-                .split(
-                    pat='/', 
-                    expand=True
+    # Split the addresses into lists of address parts
+    address_parts = (
+                    seattle_data
+                    ['_100_block_address']
+                    .str.split(pat='/')
                     )
-                )
 
-    # make list of columns excluding the '_100_block_address' column 
-    columns = [
-                col for col 
-                in list(seattle_data) 
-                if col != '_100_block_address'
-            ]
-
-    # Create a df with the address data split into two columns
-    split_address_df = (
-                        split_address(
-                                        address_col=seattle_data['_100_block_address']
-                                        )
-                        )
+    # The number of rows each record is broken into; a missing address still makes one row
+    part_counts = (
+                    address_parts
+                    .str.len()
+                    .fillna(1)
+                    .to_numpy(dtype='int64')
+                    )
 
-    # Assign the split address df a multi-index consisting of every column except the '_100_block_address' column
-    split_address_df.index = (
-                                seattle_data
-                                .set_index(columns)
-                                .index
-                                )
-
-    # Replace null values (np.nan) with a non-null value ('na') so the row is not lost
-    # in the following command
-    split_address_df[0].fillna(
-                            value='na', 
-                            inplace=True
-                            )
-    
+    # Repeat each record's position once per address part, i.e. part counts [2, 1] -> positions [0, 0, 1]
+    positions = np.repeat(
+                        np.arange(len(seattle_data)),
+                        part_counts
+                        )
 
-    seattle_data = (
-                    split_address_df
-                    .stack()
-                    .reset_index(columns)
+    # Position of each row's part within its address, i.e. part counts [2, 1] -> part numbers [0, 1, 0]
+    part_numbers = (
+                    np.arange(len(positions))
+                    - np.repeat(np.cumsum(part_counts) - part_counts, part_counts)
                     )
 
-    # Rename the column
-    seattle_data.rename(
-                    columns={0: '_100_block_address'},
-                    inplace=True
-                    )
+    split_data = (
+                seattle_data
+                .drop(columns='_100_block_address')
+                .iloc[positions]
+                )
 
+    split_data.index = part_numbers
 
-    # Revert the non-null value back to a null value
-    seattle_data['_100_block_address'].replace(
-                                            to_replace='na', 
-                                            value=nan, 
-                                            inplace=True
-                                            )
-    
+    split_data['_100_block_address'] = (
+                                        address_parts
+                                        .explode()
+                                        .to_numpy()
+                                        )
 
-    return seattle_data
+
+    return split_data
 
 
 def config_na_values(seattle_data):
@@ -0,0 +1,413 @@
+import argparse
+import logging
+import sys
+from os import getenv
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Heavy modules (pandas, the pipeline's stages, the database driver, ...) are only imported within the subcommands
+# needing them, so health checks & no-op runs (--help, --dry-run) start quickly
+
+
+# Env variables of the paths each part of a batch needs (see require_env): the retrieval archives the raw batch; the
+# cleaning reads the reference files (& the raw archive the offense codes are validated against) & updates the local
+# outputs (see pipeline.local_output_functions); the load reads the batch's addresses & records its offense_ids (& the
+# hashes of its raw records, when it has them)
+retrieval_env_variables = ['RAW_ARCHIVE']
+
+cleaning_env_variables = [
+                        'MCPP',
+                        'LOC_CODES',
+                        'OFFENSE_CODES',
+                        'RAW_ARCHIVE',
+                        'ARROW_CACHE',
+                        'ADDRESS_COORDINATES',
+                        'ADDRESS_DIM',
+                        'BEAT_GRID',
+                        'BEAT_OBSERVATIONS',
+                        'PARQUET_DIR',
+                        'ROLLUP_DIR',
+                        'SPATIAL_INDEX'
+                        ]
+
+loading_env_variables = ['ADDRESS_DIM', 'LOADED_INDEX']
+
+# Every path the default pipeline (run.py, pipeline.run_batch) needs
+batch_env_variables = retrieval_env_variables + cleaning_env_variables + loading_env_variables + ['ROW_HASHES']
+
+
+def yesterday():
+    """
+    Summary: Gets the day before today's date, the default batch date, as a yyyy-mm-dd string value.
+    """
+
+    return datetime.strftime(datetime.today().date() - timedelta(days=1), '%Y-%m-%d')
+
+
+def require_env(*variables):
+    """
+    Summary: Exits with a message naming the environment variables (among the given ones) that aren't set, so a
+             subcommand fails upfront rather than on its first use of a missing path.
+    """
+
+    missing = [variable for variable in dict.fromkeys(variables) if not getenv(variable)]
+
+    if missing:
+        sys.exit(f"Environment variable(s) not set: {', '.join(missing)} (see the readme's Usage)")
+
+
+def date_range(start_date, end_date):
+    """
+    Summary: Gets every date from start_date to end_date (inclusive), as yyyy-mm-dd string values.
+    """
+
+    start_date, end_date = date.fromisoformat(start_date), date.fromisoformat(end_date)
+
+    return [
+            (start_date + timedelta(days=day)).isoformat()
+            for day in range((end_date - start_date).days + 1)
+            ]
+
+
+def read_raw_data(path, na_at_read=False):
+    """
+    Summary: Reads raw data saved by the fetch subcommand, keeping every value a string as retrieved; only empty
+             values are missing, so missing value indicators (NA, null, ...) are left for cleanup_na_values.
+
+    Params:
+        path        :   path of the raw data CSV file
+        na_at_read  :   also read the designated missing values (clean_seattle_data.na_values) as missing, so
+                        the parser drops them rather than cleanup_na_values; they're then no longer audited as
+                        invalid values either
+    """
+
+    from pandas import read_csv
+
+    na_values = ['']
+
+    if na_at_read:
+        from .clean_seattle_data import na_values as missing_values
+
+        na_values += missing_values
+
+    return read_csv(
+                    filepath_or_buffer  =   path,
+                    dtype               =   'O',
+                    keep_default_na     =   False,
+                    na_values           =   na_values
+                    )
+
+
+def fetch(arguments):
+    """
+    Summary: Retrieves a batch of raw data & saves it as a CSV file.
+    """
+
+    require_env(*retrieval_env_variables)
+
+    from .retrieve_seattle_data import retrieve_data
+    from .raw_archive import archive_raw
+
+    raw_data = retrieve_data(date=arguments.date, how=arguments.how)
+
+    if raw_data is None:
+        sys.exit('No data could be retrieved')
+
+    archive_raw(raw_data).to_csv(arguments.output, index=False)
+
+
+def clean(arguments):
+    """
+    Summary: Audits & cleans a batch of raw data saved by fetch, saving the cleaned batch & its audit table.
+    """
+
+    require_env(*cleaning_env_variables, *(['STAGE_CACHE'] if arguments.stage_cache else []))
+
+    from .pipeline import audit_batch, clean_batch
+
+    raw_data = read_raw_data(arguments.input, arguments.na_at_read)
+
+    clean_data, _, audit_table = clean_batch(
+                                            raw_data        =   raw_data,
+                                            stage_cache_dir =   getenv('STAGE_CACHE') if arguments.stage_cache else None,
+                                            audit_table     =   audit_batch(raw_data)
+                                            )
+
+    clean_data.to_pickle(arguments.output)
+    audit_table.to_pickle(arguments.audit_output)
+
+
+def load(arguments):
+    """
+    Summary: Loads a cleaned batch & its audit table saved by clean into the database.
+    """
+
+    require_env(*loading_env_variables)
+
+    from pandas import read_pickle
+    from .pipeline import load_batch
+
+    load_batch(
+                clean_data  =   read_pickle(arguments.input),
+                audit_table =   read_pickle(arguments.audit_input)
+                )
+
+
+def run(arguments):
+    """
+    Summary: Retrieves, audits, cleans & loads a batch (see pipeline.run_batch), as run.py does for yesterday's.
+    """
+
+    require_env(*batch_env_variables)
+
+    from .pipeline import run_batch
+
+    if run_batch(date=arguments.date, how=arguments.how) is None:
+        print('No new data could be retrieved')
+
+
+def backfill(arguments):
+    """
+    Summary: Retrieves, cleans & loads the data of each report date in a range, one day (batch) per date, overlapping
+             the fetch, clean & load stages across days (see scheduler.run_pipelined) & printing each stage's
+             utilization. Each batch is checkpointed, so re-running a failed backfill resumes each day from its last
+             completed stage. With --async, the days are instead run within one event loop (see
+             async_pipeline.run_async_batches), --fetch-workers being the number of retrievals in flight at once.
+    """
+
+    require_env('CHECKPOINT_DIR', *batch_env_variables)
+
+    from .checkpoint import batch_id, completed_stages
+
+    dates = date_range(arguments.start, arguments.end)
+
+    if arguments.dry_run:
+        for batch_date in dates:
+            completed = completed_stages(batch_id(batch_date, '='))
+            print(batch_date, f"(resumes after: {completed[-1]})" if completed else '')
+
+        return
+
+    from .scheduler import format_utilization, run_pipelined
+
+    if arguments.async_mode:
+        from .async_pipeline import run_async
+
+        results = run_async(
+                            dates               =   dates,
+                            how                 =   '=',
+                            fetch_concurrency   =   arguments.fetch_workers,
+                            clean_workers       =   arguments.clean_workers,
+                            load_workers        =   arguments.load_workers
+                            )
+
+    else:
+        results = run_pipelined(
+                                dates           =   dates,
+                                how             =   '=',
+                                fetch_workers   =   arguments.fetch_workers,
+                                clean_workers   =   arguments.clean_workers,
+                                load_workers    =   arguments.load_workers,
+                                queue_size      =   arguments.queue_size
+                                )
+
+    print(format_utilization(results['utilization']))
+    print(f"{len(results['loaded'])} of {len(dates)} days loaded in {results['wall_seconds']:.1f}s")
+
+    for batch_date in sorted(results['empty_dates']):
+        print(f'No new data could be retrieved for {batch_date}')
+
+    if results['failures']:
+        item, stage, exception = results['failures'][0]
+        sys.exit(f'{stage} failed for {item}: {exception!r}')
+
+
+def reprocess(arguments):
+    """
+    Summary: Re-cleans the archived days within a range (by default every archived day) & replaces their data within
+             the database (see reprocess.run_reprocess), printing each stage's utilization.
+    """
+
+    require_env('CHECKPOINT_DIR', *batch_env_variables, *(['STAGE_CACHE'] if arguments.stage_cache else []))
+
+    from .raw_archive import archived_days
+
+    days = archived_days(start=arguments.start, end=arguments.end)
+
+    if arguments.dry_run:
+        print('\n'.join(days) if days else 'No archived days to reprocess')
+        return
+
+    from .scheduler import format_utilization
+    from .reprocess import run_reprocess
+
+    results = run_reprocess(
+                            days            =   days,
+                            clean_workers   =   arguments.clean_workers,
+                            load_workers    =   arguments.load_workers,
+                            queue_size      =   arguments.queue_size,
+                            stage_cache_dir =   getenv('STAGE_CACHE') if arguments.stage_cache else None
+                            )
+
+    print(format_utilization(results['utilization']))
+    print(f"{len(results['loaded'])} of {len(days)} days reprocessed in {results['wall_seconds']:.1f}s")
+
+    if results['failures']:
+        item, stage, exception = results['failures'][0]
+        sys.exit(f'{stage} failed for {item}: {exception!r}')
+
+
+def cdc(arguments):
+    """
+    Summary: Upserts the records added or revised since the last run (see change_capture.run_cdc_batch).
+    """
+
+    require_env('CDC_WATERMARK', *batch_env_variables)
+
+    if arguments.dry_run:
+        from .change_capture import load_watermark
+
+        print(f'Records updated after {load_watermark()} would be retrieved')
+        return
+
+    from .change_capture import run_cdc_batch
+
+    upserted = run_cdc_batch()
+
+    if upserted is None:
+        sys.exit('No data could be retrieved')
+
+    print(f'{upserted} new or revised records upserted')
+
+
+def purge(arguments):
+    """
+    Summary: Removes expired data from the database & the rollup cubes.
+    """
+
+    from .retention import retention_date_limit
+
+    if arguments.dry_run:
+        print(f'Data reported before {retention_date_limit()} would be removed')
+        return
+
+    from . import seattle_loading
+    from .rollup_seattle_data import purge_rollups
+
+    seattle_loading.remove_data(seattle_loading.establish_connection())
+    purge_rollups()
+
+
+def bench(arguments):
+    """
+    Summary: Runs the benchmark (see python -m src bench --help).
+    """
+
+    from .benchmark import main as benchmark
+
+    benchmark(arguments.benchmark_arguments)
+
+
+def main(argv=None):
+    """
+    Summary: The command line entry point, i.e.:
+
+                python -m src fetch --date 2023-03-08 --how =
+                python -m src clean
+                python -m src load
+                python -m src run --date 2023-03-08 --how =
+                python -m src backfill --start 2023-03-01 --end 2023-03-07
+                python -m src reprocess --start 2023-03-01 --stage-cache
+                python -m src cdc
+                python -m src purge
+                python -m src bench --scales 1 10
+
+    Params:
+        argv    :   the command line arguments; defaults to sys.argv
+    """
+
+    parser = argparse.ArgumentParser(prog='python -m src', description='Retrieves, cleans & loads SPD crime data.')
+    subcommands = parser.add_subparsers(dest='subcommand')
+
+    fetch_parser = subcommands.add_parser('fetch', help='retrieve a batch of raw data')
+    fetch_parser.add_argument('--date', default=None, help='date to retrieve data by, yyyy-mm-dd; defaults to yesterday')
+    fetch_parser.add_argument('--how', default='>=', choices=['>', '<', '>=', '<=', '='], help='how to retrieve data with respect to the date')
+    fetch_parser.add_argument('--output', default='seattle_data.csv', help='path of the raw data CSV file')
+    fetch_parser.set_defaults(handler=fetch)
+
+    clean_parser = subcommands.add_parser('clean', help='audit & clean a batch of raw data')
+    clean_parser.add_argument('--input', default='seattle_data.csv', help='path of the raw data CSV file')
+    clean_parser.add_argument('--output', default='seattle_data_clean.pkl', help='path of the cleaned batch')
+    clean_parser.add_argument('--audit-output', default='seattle_data_audit.pkl', help='path of the audit table')
+    clean_parser.add_argument('--na-at-read', action='store_true', help='read the designated missing values as missing (they then go unaudited)')
+    clean_parser.add_argument('--stage-cache', action='store_true', help='reuse the cached output of the stages whose input, code & reference data are unchanged (STAGE_CACHE)')
+    clean_parser.set_defaults(handler=clean)
+
+    load_parser = subcommands.add_parser('load', help='load a cleaned batch into the database')
+    load_parser.add_argument('--input', default='seattle_data_clean.pkl', help='path of the cleaned batch')
+    load_parser.add_argument('--audit-input', default='seattle_data_audit.pkl', help='path of the audit table')
+    load_parser.set_defaults(handler=load)
+
+    run_parser = subcommands.add_parser('run', help='retrieve, audit, clean & load a batch')
+    run_parser.add_argument('--date', default=None, help='date to retrieve data by, yyyy-mm-dd; defaults to yesterday')
+    run_parser.add_argument('--how', default='>=', choices=['>', '<', '>=', '<=', '='], help='how to retrieve data with respect to the date')
+    run_parser.set_defaults(handler=run)
+
+    backfill_parser = subcommands.add_parser('backfill', help='retrieve, clean & load a range of report dates')
+    backfill_parser.add_argument('--start', required=True, help='first report date, yyyy-mm-dd')
+    backfill_parser.add_argument('--end', default=yesterday(), help='last report date, yyyy-mm-dd; defaults to yesterday')
+    backfill_parser.add_argument('--fetch-workers', type=int, default=2, help='number of concurrent retrievals')
+    backfill_parser.add_argument('--clean-workers', type=int, default=1, help='number of days cleaned at once')
+    backfill_parser.add_argument('--load-workers', type=int, default=1, help='number of concurrent database inserts')
+    backfill_parser.add_argument('--queue-size', type=int, default=2, help='number of days queued between two stages')
+    backfill_parser.add_argument('--async', dest='async_mode', action='store_true', help='run the days within one event loop, cleaning in worker processes')
+    backfill_parser.add_argument('--dry-run', action='store_true', help='only list the dates & the stage each would resume after')
+    backfill_parser.set_defaults(handler=backfill)
+
+    reprocess_parser = subcommands.add_parser('reprocess', help='re-clean archived days & replace their data')
+    reprocess_parser.add_argument('--start', default=None, help='first report date, yyyy-mm-dd; defaults to the earliest archived day')
+    reprocess_parser.add_argument('--end', default=None, help='last report date, yyyy-mm-dd; defaults to the latest archived day')
+    reprocess_parser.add_argument('--clean-workers', type=int, default=1, help='number of days cleaned at once, in worker processes when > 1')
+    reprocess_parser.add_argument('--load-workers', type=int, default=1, help='number of concurrent database replacements')
+    reprocess_parser.add_argument('--queue-size', type=int, default=2, help='number of days queued between two stages')
+    reprocess_parser.add_argument('--stage-cache', action='store_true', help='reuse the cached output of the stages whose input, code & reference data are unchanged (STAGE_CACHE)')
+    reprocess_parser.add_argument('--dry-run', action='store_true', help='only list the days that would be reprocessed')
+    reprocess_parser.set_defaults(handler=reprocess)
+
+    cdc_parser = subcommands.add_parser('cdc', help='upsert the records added or revised since the last run')
+    cdc_parser.add_argument('--dry-run', action='store_true', help='only show the watermark the records would be retrieved after')
+    cdc_parser.set_defaults(handler=cdc)
+
+    purge_parser = subcommands.add_parser('purge', help='remove expired data from the database & rollups')
+    purge_parser.add_argument('--dry-run', action='store_true', help='only show the retention date limit')
+    purge_parser.set_defaults(handler=purge)
+
+    # The benchmark's own arguments are passed through to it
+    bench_parser = subcommands.add_parser('bench', help='benchmark the pipeline (see bench --help)', add_help=False)
+    bench_parser.set_defaults(handler=bench)
+
+    arguments, benchmark_arguments = parser.parse_known_args(argv)
+
+    # The stages log what they correct (i.e. the location codes filled in per batch) at the INFO level; the benchmark
+    # runs them too many times for it to be useful
+    if arguments.subcommand != 'bench':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s')
+
+    if arguments.subcommand is None:
+        parser.print_help()
+        return
+
+    if arguments.subcommand != 'bench' and benchmark_arguments:
+        parser.error(f"unrecognized arguments: {' '.join(benchmark_arguments)}")
+
+    arguments.benchmark_arguments = benchmark_arguments
+
+    arguments.handler(arguments)
+
+
+if __name__ == '__main__':
+    main()
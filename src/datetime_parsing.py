@@ -0,0 +1,85 @@
+import numpy as np
+from pandas import DataFrame, Series, to_datetime
+
+
+# Format of the datetime values retrieved from SPD's Socrata dataset, i.e. 2023-03-08T12:34:00.000
+socrata_datetime_format = '%Y-%m-%dT%H:%M:%S.%f'
+
+# The datetime columns of the crime data
+datetime_columns = ['offense_start_datetime', 'offense_end_datetime', 'report_datetime']
+
+# SPD's datetimes are Seattle local time; values carrying a UTC offset are converted into it
+local_timezone = 'America/Los_Angeles'
+
+# A UTC offset (or Z) right after a value's time, i.e. 2023-03-08T12:34:00+05:00
+utc_offset_pattern = r'\d(?:Z|[+-]\d{2}:?\d{2})$'
+
+
+def parse_datetime_column(column):
+    """
+    Summary: Converts a column into datetime64[ns] values. Only the non-missing values are parsed (missing values
+             push the parser onto a slower path), first all at once against the known Socrata format, then the
+             values not conforming to it all at once again, inferring each value's format separately
+             (format='mixed'). Values carrying a UTC offset are converted into Seattle local time (local_timezone)
+             & their offset dropped, so they're held as the same naive local time as the rest. Values that can't be
+             parsed either way are given NaT.
+
+    Returns: numpy datetime64[ns] array
+    """
+
+    values = column.to_numpy(dtype='O')
+    present = column.notna().to_numpy()
+
+    parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    parsed[present] = to_datetime(
+                                arg     =   values[present],
+                                format  =   socrata_datetime_format,
+                                errors  =   'coerce'
+                                )
+
+    nonconforming = present & np.isnat(parsed)
+
+    if nonconforming.any():
+
+        # Parsed as UTC, as naive values & values carrying (differing) UTC offsets can't otherwise be held together;
+        # naive values are then taken back as they were & the others converted into local time
+        parsed_utc = to_datetime(
+                                arg     =   values[nonconforming],
+                                format  =   'mixed',
+                                errors  =   'coerce',
+                                utc     =   True
+                                )
+
+        has_offset = (
+                    Series(values[nonconforming], dtype='O')
+                    .str.contains(utc_offset_pattern, regex=True)
+                    .to_numpy(dtype=bool)
+                    )
+
+        parsed[nonconforming] = np.where(
+                                        has_offset,
+                                        parsed_utc.tz_convert(local_timezone).tz_localize(None),
+                                        parsed_utc.tz_localize(None)
+                                        )
+
+    return parsed
+
+
+def parse_datetimes(seattle_data, columns=datetime_columns):
+    """
+    Summary: Converts datetime columns into datetime64[ns] values (see parse_datetime_column). Used by both
+             cleanup_dtypes & the auditing functions, so a value is audited as an invalid datetime exactly when the
+             cleaning nulls it.
+
+    Returns: Pandas DataFrame of the parsed columns, on the seattle_data's index
+
+    Params:
+        seattle_data    :   Pandas DataFrame
+        columns         :   the datetime columns to parse
+    """
+
+    return DataFrame(
+                    data    =   {column: parse_datetime_column(seattle_data[column]) for column in columns},
+                    index   =   seattle_data.index
+                    )
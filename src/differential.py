@@ -0,0 +1,303 @@
+import argparse
+import subprocess
+import sys
+from importlib.util import module_from_spec, spec_from_loader
+from os.path import dirname
+
+import numpy as np
+from pandas import DataFrame, isna
+from dotenv import load_dotenv
+
+from . import audit_functions, clean_seattle_data
+from .audit_functions import AuditTimer, create_audit
+from .pipeline import data_cleaning_functions
+from .synthetic_data import daily_volume, generate_batch
+
+load_dotenv()
+
+
+# The stages checked by default, along with the auditing function auditing each one's nulled values
+checked_stages = {
+                'cleanup_report_number':        'audit_report_number',
+                'cleanup_misspelled_mcpp':      'audit_mispelled_mcpp',
+                'correct_na_loc_codes':         'audit_correct_na_loc_code'
+                }
+
+repo_dir = dirname(dirname(__file__))
+
+
+def load_reference_module(module_name, revision='HEAD'):
+    """
+    Summary: Loads a src module as it was at the given git revision, i.e. the current implementation an optimized
+             one is checked against. The module is loaded within the src package, so its relative imports resolve
+             to the working tree's modules; only the module itself comes from the revision.
+
+    Returns: the module
+
+    Params:
+        module_name :   name of the module within src, i.e. clean_seattle_data
+        revision    :   any git revision, i.e. HEAD, main, a commit hash
+    """
+
+    source = subprocess.run(
+                            args            =   ['git', 'show', f'{revision}:src/{module_name}.py'],
+                            cwd             =   repo_dir,
+                            capture_output  =   True,
+                            text            =   True,
+                            check           =   True
+                            ).stdout
+
+    spec = spec_from_loader(f'{__package__}._reference_{module_name}', loader=None)
+
+    module = module_from_spec(spec)
+    module.__package__ = __package__
+    module.__file__ = f'{revision}:src/{module_name}.py'
+
+    exec(compile(source, module.__file__, 'exec'), module.__dict__)
+
+    return module
+
+
+def stage_input(stage_name, seattle_data):
+    """
+    Summary: Runs the (working tree's) cleaning functions preceding a stage over a raw batch, giving the batch as the
+             stage receives it within the pipeline.
+
+    Returns: Pandas DataFrame
+    """
+
+    for cleaning_function in data_cleaning_functions:
+
+        if cleaning_function.__name__ == stage_name:
+            return seattle_data
+
+        seattle_data = cleaning_function(seattle_data)
+
+    raise ValueError(f'{stage_name} is not one of the pipeline\'s cleaning functions')
+
+
+def diff_frames(reference, candidate, max_mismatches=10):
+    """
+    Summary: Diffs two frames cell by cell, along with their shapes, columns, dtypes & index. Missing values (nan,
+             None, NaT) are considered equal to one another; categorical & object columns holding the same values
+             are considered equal too, but their dtype difference is still reported.
+
+    Returns: tuple -> (list of structural differences, Pandas DataFrame of the first max_mismatches mismatching
+             cells, total number of mismatching cells)
+
+             +-----+---------------+-------------+-------------+
+             | row |    column     |  reference  |  candidate  |
+             +-----+---------------+-------------+-------------+
+             | 417 | report_number | 2023-012345 |     None    |
+             +-----+---------------+-------------+-------------+
+
+    Params:
+        reference       :   frame given by the reference implementation
+        candidate       :   frame given by the candidate implementation
+        max_mismatches  :   number of mismatching cells to report
+    """
+
+    differences = []
+
+    if len(reference) != len(candidate):
+        differences.append(f'row count: {len(reference)} (reference) vs {len(candidate)} (candidate)')
+
+    if list(reference.columns) != list(candidate.columns):
+        differences.append(f'columns: {list(reference.columns)} (reference) vs {list(candidate.columns)} (candidate)')
+
+    rows = min(len(reference), len(candidate))
+
+    if not reference.index[:rows].equals(candidate.index[:rows]):
+        differences.append('index: the rows are labelled (or ordered) differently')
+
+    mismatches = []
+    mismatch_count = 0
+
+    for column in [column for column in reference.columns if column in candidate.columns]:
+
+        if reference[column].dtype != candidate[column].dtype:
+            differences.append(f'{column} dtype: {reference[column].dtype} (reference) vs {candidate[column].dtype} (candidate)')
+
+        reference_values = reference[column].to_numpy(dtype='O')[:rows]
+        candidate_values = candidate[column].to_numpy(dtype='O')[:rows]
+
+        both_missing = isna(reference_values) & isna(candidate_values)
+        mismatching = np.flatnonzero(~both_missing & (reference_values != candidate_values))
+
+        mismatch_count += len(mismatching)
+
+        mismatches.extend(
+                        (row, column, reference_values[row], candidate_values[row])
+                        for row in mismatching[:max_mismatches]
+                        )
+
+    mismatches = (
+                DataFrame(mismatches, columns=['row', 'column', 'reference', 'candidate'])
+                .sort_values(['row', 'column'])
+                .head(max_mismatches)
+                .reset_index(drop=True)
+                )
+
+    return differences, mismatches, mismatch_count
+
+
+def compare_implementations(reference_function, candidate_function, max_mismatches=10, **arguments):
+    """
+    Summary: Runs a reference & a candidate implementation of a function over (copies of) the same arguments, timing
+             both, & diffs their results (see diff_frames).
+
+    Returns: dictionary of the timings, structural differences, first mismatches & mismatch count
+
+    Params:
+        reference_function  :   the reference (i.e. current) implementation
+        candidate_function  :   the candidate (i.e. optimized) implementation
+        max_mismatches      :   number of mismatching cells to report
+        arguments           :   the arguments of the function, i.e. seattle_data=..., audit_table=...
+    """
+
+    timer = AuditTimer()
+    results = {}
+
+    for implementation, function in [('reference', reference_function), ('candidate', candidate_function)]:
+        implementation_arguments = {name: argument.copy() for name, argument in arguments.items()}
+
+        timer.start()
+        results[implementation] = function(**implementation_arguments)
+        results[f'{implementation}_seconds'] = timer.stop()
+
+    differences, mismatches, mismatch_count = diff_frames(
+                                                        reference=results['reference'],
+                                                        candidate=results['candidate'],
+                                                        max_mismatches=max_mismatches
+                                                        )
+
+    return {
+            'reference_seconds':    results['reference_seconds'],
+            'candidate_seconds':    results['candidate_seconds'],
+            'differences':          differences,
+            'mismatches':           mismatches,
+            'mismatch_count':       mismatch_count
+            }
+
+
+def run_differential(stages=tuple(checked_stages), scales=(10, 100), revision='HEAD', dirty_rate=0.05, seed=0,
+                     max_mismatches=10):
+    """
+    Summary: Checks the working tree's implementation of each stage (& of its auditing function) against the one at a
+             git revision, over generated batches (see synthetic_data.generate_batch) of the given sizes. Each stage
+             is given the batch as it receives it within the pipeline, while each auditing function is given the raw
+             batch, as run.py does. Both the cleaned frames & the audit tables are diffed cell by cell.
+
+    +-------------------------+----------+------+-------------------+-------------------+---------+-----------+
+    |          stage          |   kind   | rows | reference_seconds | candidate_seconds | speedup | identical |
+    +-------------------------+----------+------+-------------------+-------------------+---------+-----------+
+    | cleanup_misspelled_mcpp | cleaning | 2500 |       5.304       |       0.212       |  25.02  |    True   |
+    +-------------------------+----------+------+-------------------+-------------------+---------+-----------+
+
+    Returns: tuple -> (Pandas DataFrame report, as above, dictionary of (stage, kind, rows) -> comparison, as
+             returned by compare_implementations)
+
+    Params:
+        stages          :   names of the cleaning functions to check; defaults to those in checked_stages
+        scales          :   batch sizes, as multiples of a day's volume (synthetic_data.daily_volume)
+        revision        :   git revision of the reference implementations
+        dirty_rate      :   share of each column's values to make dirty
+        seed            :   seed of the synthetic data
+        max_mismatches  :   number of mismatching cells to report per comparison
+    """
+
+    reference_modules = {
+                        'cleaning':     load_reference_module('clean_seattle_data', revision),
+                        'auditing':     load_reference_module('audit_functions', revision)
+                        }
+
+    candidate_modules = {
+                        'cleaning':     clean_seattle_data,
+                        'auditing':     audit_functions
+                        }
+
+    report = []
+    comparisons = {}
+
+    for scale in scales:
+
+        rows = int(scale * daily_volume)
+
+        raw_data = generate_batch(
+                                rows        =   rows,
+                                dirty_rate  =   dirty_rate,
+                                seed        =   seed
+                                )
+
+        for stage in stages:
+
+            checks = [('cleaning', stage, {'seattle_data': stage_input(stage, raw_data.copy())})]
+
+            if checked_stages.get(stage) is not None:
+                checks.append(
+                            ('auditing', checked_stages[stage], {
+                                                                'seattle_data': raw_data,
+                                                                'audit_table':  create_audit(audit_type='values')
+                                                                })
+                            )
+
+            for kind, function_name, arguments in checks:
+
+                comparison = compare_implementations(
+                                                    reference_function  =   getattr(reference_modules[kind], function_name),
+                                                    candidate_function  =   getattr(candidate_modules[kind], function_name),
+                                                    max_mismatches      =   max_mismatches,
+                                                    **arguments
+                                                    )
+
+                comparisons[(function_name, kind, rows)] = comparison
+
+                report.append(
+                            (function_name, kind, rows, comparison['reference_seconds'], comparison['candidate_seconds'],
+                             not comparison['differences'] and comparison['mismatch_count'] == 0)
+                            )
+
+    report = DataFrame(report, columns=['stage', 'kind', 'rows', 'reference_seconds', 'candidate_seconds', 'identical'])
+    report.insert(
+                loc=5,
+                column='speedup',
+                value=report['reference_seconds'] / report['candidate_seconds']
+                )
+
+    return report, comparisons
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Checks the working tree's stage implementations against a git revision's.")
+    parser.add_argument('--revision', default='HEAD', help='git revision of the reference implementations')
+    parser.add_argument('--stages', nargs='+', default=list(checked_stages), help='cleaning functions to check')
+    parser.add_argument('--scales', type=float, nargs='+', default=[10, 100], help="batch sizes, as multiples of a day's volume")
+    parser.add_argument('--dirty-rate', type=float, default=0.05, help="share of each column's values to make dirty")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--max-mismatches', type=int, default=10, help='number of mismatching cells to report')
+    arguments = parser.parse_args()
+
+    report, comparisons = run_differential(
+                                            stages          =   arguments.stages,
+                                            scales          =   arguments.scales,
+                                            revision        =   arguments.revision,
+                                            dirty_rate      =   arguments.dirty_rate,
+                                            seed            =   arguments.seed,
+                                            max_mismatches  =   arguments.max_mismatches
+                                            )
+
+    print(report.to_string(index=False))
+
+    for (function_name, kind, rows), comparison in comparisons.items():
+
+        if comparison['differences'] or comparison['mismatch_count']:
+            print(f"\n{function_name} ({kind}, {rows} rows): {comparison['mismatch_count']} mismatching cells")
+
+            for difference in comparison['differences']:
+                print(f'  {difference}')
+
+            print(comparison['mismatches'].to_string(index=False))
+
+    if not report['identical'].all():
+        sys.exit(1)
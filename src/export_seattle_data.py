@@ -0,0 +1,298 @@
+import threading
+from os import getenv, listdir, remove, replace
+from os.path import basename, dirname, isdir, join, sep
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pandas import concat
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Hive partition columns, in directory order (year=2023/month=4/precinct=N/...)
+partition_columns = ['year', 'month', 'precinct']
+
+# Low-cardinality location & offense columns; stored dictionary-encoded in the parquet files
+dictionary_columns = ['group_a_b', 'crime_against_category', 'offense_parent_group', 'offense',
+                      'offense_code', 'sector', 'beat', 'mcpp', '_100_block_address']
+
+# Held while files are written into (or rewritten within) the dataset, as batches may be cleaned by several threads
+# & reprocessed days rewrite existing files
+export_lock = threading.Lock()
+
+
+def parquet_write_options():
+    """
+    Summary: Builds the parquet file options shared by the export & compaction: dictionary encoding for the
+             location/offense columns and row-group min/max statistics for report_datetime (so readers can skip
+             row groups outside of a queried date range).
+
+    Returns: pyarrow ParquetFileWriteOptions
+    """
+
+    return ds.ParquetFileFormat().make_write_options(
+                                                    use_dictionary      =   dictionary_columns,
+                                                    write_statistics    =   ['report_datetime', 'offense_id'],
+                                                    compression         =   'zstd'
+                                                    )
+
+
+def export_parquet(seattle_data, dataset_dir=None):
+    """
+    Summary: Appends the batch to a Hive-partitioned parquet dataset (year=/month=/precinct=), partitioned by the
+             report date and precinct so analytical queries can prune partitions rather than scan every row. Each
+             batch is written as new file(s) named after the batch, leaving existing files untouched; use
+             compact_parquet() to merge the small per-batch files. Meant to run right after cleanup_column_order.
+
+    Returns: the seattle_data, unchanged
+
+    Params:
+        seattle_data    :   the cleaned batch, in the column order given by cleanup_column_order
+        dataset_dir     :   root directory of the parquet dataset; defaults to the PARQUET_DIR env variable
+    """
+
+    if dataset_dir is None:
+        dataset_dir = getenv('PARQUET_DIR')
+
+    if seattle_data.empty:
+        return seattle_data
+
+    export_data = seattle_data.assign(
+                                    year    =   seattle_data['report_datetime'].dt.year.astype('Int16'),
+                                    month   =   seattle_data['report_datetime'].dt.month.astype('Int8')
+                                    )
+
+    table = pa.Table.from_pandas(
+                                df              =   export_data,
+                                preserve_index  =   False
+                                )
+
+    # Down to the microsecond, so batches exported within the same second (i.e. reprocessed days) don't overwrite
+    # one another's files
+    batch = datetime.today().strftime('%Y%m%d%H%M%S%f')
+
+    with export_lock:
+        ds.write_dataset(
+                        data                    =   table,
+                        base_dir                =   dataset_dir,
+                        format                  =   'parquet',
+                        partitioning            =   partition_columns,
+                        partitioning_flavor     =   'hive',
+                        basename_template       =   f'batch-{batch}-{{i}}.parquet',
+                        file_options            =   parquet_write_options(),
+                        existing_data_behavior  =   'overwrite_or_ignore'
+                        )
+
+    return seattle_data
+
+
+def remove_exported_days(days, dataset_dir=None):
+    """
+    Summary: Removes the records reported on the given days from the parquet dataset, so a reprocessed day's export
+             replaces the day's records rather than adding a second version of them (along with the records the
+             reprocessing no longer keeps). Only the files of the days' year=/month= partitions are read; those
+             holding records of the days are rewritten without them, or removed if they hold nothing else.
+
+    Returns: number of files rewritten or removed
+
+    Params:
+        days            :   report dates, yyyy-mm-dd
+        dataset_dir     :   root directory of the parquet dataset; defaults to the PARQUET_DIR env variable
+    """
+
+    if dataset_dir is None:
+        dataset_dir = getenv('PARQUET_DIR')
+
+    days = set(days)
+
+    months = {(f'year={day[:4]}', f'month={int(day[5:7])}') for day in days}
+
+    if not months or not isdir(dataset_dir):
+        return 0
+
+    replaced = 0
+
+    with export_lock:
+
+        for partition_dir in partition_directories(dataset_dir):
+
+            if tuple(partition_dir.split(sep)[-3:-1]) not in months:
+                continue
+
+            for file in sorted(listdir(partition_dir)):
+
+                if not file.endswith('.parquet'):
+                    continue
+
+                path = join(partition_dir, file)
+                table = ds.dataset(path).to_table()
+
+                reported_days = table['report_datetime'].to_pandas().dt.strftime('%Y-%m-%d')
+                removed = reported_days.isin(days).to_numpy()
+
+                if not removed.any():
+                    continue
+
+                if removed.all():
+                    remove(path)
+
+                else:
+                    pq.write_table(
+                                    table               =   table.filter(pa.array(~removed)),
+                                    where               =   path + '.tmp',
+                                    use_dictionary      =   dictionary_columns,
+                                    write_statistics    =   ['report_datetime', 'offense_id'],
+                                    compression         =   'zstd'
+                                    )
+
+                    replace(path + '.tmp', path)
+
+                replaced += 1
+
+    return replaced
+
+
+def compact_parquet(dataset_dir=None, min_files=2):
+    """
+    Summary: Merges the small per-batch files of each partition into a single file. Months are compacted as a unit,
+             once one of their partitions holds at least min_files files; the files of the other months aren't read.
+             Since daily pulls overlap (how='>='), a record can appear in several batch files, possibly in different
+             precinct partitions of its month (i.e. when its precinct was revised); only its most recent version (by
+             batch file name) is kept across the month, so partitions holding a stale version are rewritten too.
+
+    Returns: number of partitions compacted
+
+    Params:
+        dataset_dir     :   root directory of the parquet dataset; defaults to the PARQUET_DIR env variable
+        min_files       :   partitions holding at least this many files are compacted, as are the partitions of
+                            their month holding a stale version of a record
+    """
+
+    if dataset_dir is None:
+        dataset_dir = getenv('PARQUET_DIR')
+
+    # year=/month= directory -> precinct= directory -> its batch files
+    month_partitions = {}
+
+    for partition_dir in partition_directories(dataset_dir):
+        month_partitions.setdefault(dirname(partition_dir), {})[partition_dir] = [
+                                                                                join(partition_dir, file)
+                                                                                for file in listdir(partition_dir)
+                                                                                if file.endswith('.parquet')
+                                                                                ]
+
+    return sum(
+                compact_month(partition_files, min_files)
+                for partition_files in month_partitions.values()
+                if any(len(files) >= min_files for files in partition_files.values())
+                )
+
+
+def compact_month(partition_files, min_files=2):
+    """
+    Summary: Compacts a month's partitions (see compact_parquet): the partitions holding at least min_files files or
+             a stale version of a record are merged into a single file, keeping each record's most recent version
+             across the month. The files are read against their unified schema, so a column written with the null
+             type by a batch where it was all missing (or with narrower dictionary indices) doesn't keep them from
+             being merged.
+
+    Returns: number of partitions compacted
+
+    Params:
+        partition_files :   dictionary of the month's precinct= directories -> their batch files
+        min_files       :   see compact_parquet
+    """
+
+    # Batch file names embed the batch timestamp, so sorting them by name orders the files oldest -> newest
+    files = sorted(
+                    (file for files in partition_files.values() for file in files),
+                    key =   basename
+                    )
+
+    unified_schema = pa.unify_schemas(
+                                    [pq.read_schema(file) for file in files],
+                                    promote_options =   'permissive'
+                                    )
+
+    offense_ids = [
+                    ds.dataset(file, schema=unified_schema).to_table(columns=['offense_id'])['offense_id'].to_pandas()
+                    for file in files
+                    ]
+
+    # A record's most recent version is its last occurrence across the files, in batch order
+    latest = ~concat(offense_ids, ignore_index=True).duplicated(keep='last').to_numpy()
+
+    file_offsets = np.cumsum([0] + [len(file_ids) for file_ids in offense_ids])
+
+    keep = {
+            file: latest[file_offsets[position]:file_offsets[position + 1]]
+            for position, file in enumerate(files)
+            }
+
+    compacted = 0
+
+    for partition_dir, partition_paths in partition_files.items():
+
+        partition_paths = sorted(partition_paths, key=basename)
+
+        if len(partition_paths) < min_files and all(keep[file].all() for file in partition_paths):
+            continue
+
+        table = pa.concat_tables(
+                                [
+                                ds.dataset(file, schema=unified_schema).to_table().filter(pa.array(keep[file]))
+                                for file in partition_paths
+                                ]
+                                )
+
+        # Name the merged file after the newest batch it holds, so it still sorts before any later batches
+        batch = basename(partition_paths[-1]).split('-')[1]
+
+        # Write to a temporary file first, as the merged file's name may match one of the files being replaced
+        if table.num_rows:
+            pq.write_table(
+                            table               =   table,
+                            where               =   join(partition_dir, 'compacting.tmp'),
+                            use_dictionary      =   dictionary_columns,
+                            write_statistics    =   ['report_datetime', 'offense_id'],
+                            compression         =   'zstd'
+                            )
+
+        for file in partition_paths:
+            remove(file)
+
+        if table.num_rows:
+            replace(
+                    join(partition_dir, 'compacting.tmp'),
+                    join(partition_dir, f'batch-{batch}-compacted.parquet')
+                    )
+
+        compacted += 1
+
+    return compacted
+
+
+def partition_directories(dataset_dir):
+    """
+    Summary: Walks the year=/month=/precinct= directory tree & yields the leaf (precinct) directories.
+    """
+
+    depth_dirs = [dataset_dir]
+
+    for _ in partition_columns:
+        depth_dirs = [
+                        join(directory, sub_dir)
+                        for directory in depth_dirs
+                        for sub_dir in sorted(listdir(directory))
+                        if isdir(join(directory, sub_dir))
+                    ]
+
+    yield from depth_dirs
+
+
+if __name__ == '__main__':
+    compact_parquet()
@@ -0,0 +1,139 @@
+import numpy as np
+from pandas import DataFrame
+from fuzzywuzzy import fuzz
+from fuzzywuzzy.utils import full_process
+
+
+# Score a fuzzy match must reach for a value to be replaced by it
+match_threshold = 85
+
+# Number of choices (those sharing the most trigrams with a query) scored per query; when an index holds no more
+# choices than this, every choice sharing a trigram with the query is scored
+candidate_limit = 64
+
+
+def trigrams(processed):
+    """
+    Summary: Gets the trigrams of each token of a processed string, padded so short tokens & token boundaries
+             have trigrams too, i.e. 'pike st' -> '  p', ' pi', 'pik', 'ike', 'ke ', '  s', ' st', 'st '.
+
+    Returns: set of strings
+    """
+
+    return {
+            padded[position:position + 3]
+            for padded in (f'  {token} ' for token in processed.split())
+            for position in range(len(padded) - 2)
+            }
+
+
+class FuzzyIndex:
+    """
+    Summary: Approximate string index over a list of known values (i.e. the valid mcpp's, or the known streets),
+             answering fuzzy matching queries without scanning every value. A trigram inverted index (trigram ->
+             positions of the values holding it) narrows each query down to the values sharing the most trigrams
+             with it, which are then scored as fuzzywuzzy's extractOne scores them (WRatio over fully processed
+             strings), so scores & the >= match_threshold rule are unchanged.
+
+    Params:
+        choices     :   the known values; ties are broken in favour of the earliest one, as extractOne does
+    """
+
+    def __init__(self, choices):
+
+        self.choices = list(choices)
+
+        # Processed as extractOne processes its choices
+        self.processed = [full_process(choice, force_ascii=True) for choice in self.choices]
+
+        postings = {}
+
+        for position, processed in enumerate(self.processed):
+            for trigram in trigrams(processed):
+                postings.setdefault(trigram, []).append(position)
+
+        self.postings = {trigram: np.array(positions, dtype='int64') for trigram, positions in postings.items()}
+
+
+    def candidates(self, processed_query, limit=candidate_limit):
+        """
+        Summary: Gets the positions of the choices sharing the most trigrams with a processed query (at most limit of
+                 them), in ascending order.
+
+        Returns: NumPy int64 array
+        """
+
+        postings = [self.postings[trigram] for trigram in trigrams(processed_query) if trigram in self.postings]
+
+        if not postings:
+            return np.empty(0, dtype='int64')
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.choices))
+        found = np.flatnonzero(shared)
+
+        if len(found) > limit:
+            found = np.sort(found[np.argsort(-shared[found], kind='stable')[:limit]])
+
+        return found
+
+
+    def extract_one(self, query, limit=candidate_limit):
+        """
+        Summary: Gets the best match of a query among the choices & its score.
+
+        Returns: tuple -> (match, score); (None, 0) if no choice scores above 0
+        """
+
+        processed_query = full_process(full_process(query), force_ascii=True)
+
+        # Queries made of 1 or 2 letter tokens hold no trigram of a longer token they may be part of, yet can score
+        # highly against it (i.e. AL within ALKI, through WRatio's partial ratio); every choice is scored for them
+        if any(len(token) >= 3 for token in processed_query.split()):
+            positions = self.candidates(processed_query, limit)
+
+        else:
+            positions = range(len(self.choices))
+
+        match, best_score = None, 0
+
+        for position in positions:
+            score = fuzz.WRatio(processed_query, self.processed[position], full_process=False)
+
+            if score > best_score:
+                match, best_score = self.choices[position], score
+
+        return match, best_score
+
+
+    def extract(self, queries, limit=candidate_limit):
+        """
+        Summary: Batch query: gets the best match & its score for each query, matching each distinct query once.
+
+        Returns: Pandas DataFrame of the match & score, indexed like the queries
+
+                 +-------+------------------+-------+
+                 | index |      match       | score |
+                 +-------+------------------+-------+
+                 |  17   |   CAPITOL HILL   |  96   |
+                 +-------+------------------+-------+
+
+        Params:
+            queries :   Pandas Series of strings
+            limit   :   number of candidate choices scored per query (see candidate_limit)
+        """
+
+        distinct = queries.dropna().unique()
+
+        matches = DataFrame(
+                            data    =   [self.extract_one(query, limit) for query in distinct],
+                            index   =   distinct,
+                            columns =   ['match', 'score']
+                            )
+
+        return DataFrame(
+                        data    =   {
+                                    'match':    queries.map(matches['match']),
+                                    'score':    queries.map(matches['score']).fillna(0).astype('int64')
+                                    },
+                        index   =   queries.index
+                        )
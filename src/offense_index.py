@@ -0,0 +1,168 @@
+import threading
+from os import getenv, makedirs, replace
+from os.path import dirname, exists
+
+import numpy as np
+from pandas import DataFrame, to_datetime, to_numeric
+from dotenv import load_dotenv
+
+from .retention import retention_date_limit
+
+load_dotenv()
+
+
+# Report date of the records without one within an offense index
+missing_report_date = -1
+
+# Arrays of the loaded offense index (see drop_loaded), along with their dtypes
+loaded_index_arrays = {
+                        'offense_id':   'int64',
+                        'report_date':  'int64'
+                        }
+
+# Held while an index file is read, updated & rewritten, as batches may be loaded by several threads at once
+index_lock = threading.Lock()
+
+
+def offense_ids(seattle_data):
+    """
+    Summary: Gets the records' offense_id values as int64; records whose offense_id isn't an integer get -1 (they're
+             never found within an offense index).
+
+    Returns: numpy int64 array
+    """
+
+    return to_numeric(seattle_data['offense_id'], errors='coerce').fillna(-1).to_numpy(dtype='int64')
+
+
+def report_days(seattle_data):
+    """
+    Summary: Gets the records' report dates (from report_datetime, as raw strings or timestamps) as days since the
+             epoch; missing or unparseable ones get missing_report_date.
+
+    Returns: numpy int64 array
+    """
+
+    report_dates = to_datetime(seattle_data['report_datetime'], errors='coerce').dt.normalize()
+
+    return (report_dates - to_datetime(0)).dt.days.fillna(missing_report_date).to_numpy(dtype='int64')
+
+
+def load_index(index_path, arrays):
+    """
+    Summary: Loads an offense index: arrays of equal length, one entry per offense_id, sorted by offense_id, saved
+             as an .npz file.
+
+    Returns: dictionary of numpy arrays; empty arrays if the index doesn't exist yet
+
+    Params:
+        index_path  :   path of the index's .npz file
+        arrays      :   dictionary of the index's array names -> dtypes
+    """
+
+    if not exists(index_path):
+        return {array: np.empty(0, dtype=dtype) for array, dtype in arrays.items()}
+
+    with np.load(index_path) as index:
+        return {array: index[array] for array in arrays}
+
+
+def lookup(index, batch_ids):
+    """
+    Summary: Looks offense_ids up in an offense index by binary search.
+
+    Returns: tuple -> (numpy boolean array flagging the offense_ids found, numpy array of their positions within the
+             index; the positions of the ones not found are meaningless)
+    """
+
+    if not len(index['offense_id']):
+        return np.zeros(len(batch_ids), dtype=bool), np.zeros(len(batch_ids), dtype='int64')
+
+    positions = np.searchsorted(index['offense_id'], batch_ids).clip(max=len(index['offense_id']) - 1)
+
+    return index['offense_id'][positions] == batch_ids, positions
+
+
+def merge_index(index, batch, index_path):
+    """
+    Summary: Merges a batch's entries into an offense index, replacing the entries of the offense_ids it holds,
+             drops the expired entries (entries without a report date are kept, like the database purge) & saves
+             the index, replacing the file only once fully written.
+
+    Params:
+        index       :   the index, as returned by load_index
+        batch       :   dictionary of the batch's arrays, named as the index's; entries with an offense_id of -1 are
+                        left out
+        index_path  :   path of the index's .npz file
+    """
+
+    kept = ~np.isin(index['offense_id'], batch['offense_id'])
+    valid = batch['offense_id'] >= 0
+
+    index = {array: np.concatenate([index[array][kept], batch[array][valid]]) for array in index}
+
+    # Sort by offense_id, keeping the last entry of any offense_id repeated within the batch
+    order = np.argsort(index['offense_id'], kind='stable')
+    sorted_ids = index['offense_id'][order]
+    order = order[np.append(sorted_ids[1:] != sorted_ids[:-1], True)]
+
+    date_limit = (to_datetime(retention_date_limit()) - to_datetime(0)).days
+    report_dates = index['report_date'][order]
+    order = order[(report_dates >= date_limit) | (report_dates == missing_report_date)]
+
+    makedirs(dirname(index_path) or '.', exist_ok=True)
+
+    # np.savez appends .npz to paths without it, so the temporary file is written through a file object
+    with open(index_path + '.tmp', 'wb') as file:
+        np.savez(file, **{array: values[order] for array, values in index.items()})
+
+    replace(index_path + '.tmp', index_path)
+
+
+def drop_loaded(raw_data, index_path=None):
+    """
+    Summary: Drops the retrieved records that have already been loaded into the database, according to the loaded
+             offense index, so they aren't cleaned & inserted again (i.e. with how='>=' pulls & retried batches).
+             Revised records are dropped too; change data capture (see change_capture) picks those up.
+
+    Returns: Pandas DataFrame
+
+    Params:
+        raw_data    :   the raw (retrieved) batch
+        index_path  :   path of the loaded offense index; defaults to the LOADED_INDEX env variable
+    """
+
+    loaded, _ = lookup(
+                        index       =   load_index(index_path or getenv('LOADED_INDEX'), loaded_index_arrays),
+                        batch_ids   =   offense_ids(raw_data)
+                        )
+
+    if not loaded.any():
+        return raw_data
+
+    return raw_data[~loaded].reset_index(drop=True)
+
+
+def record_loaded(offense_id_values, report_datetimes, index_path=None):
+    """
+    Summary: Adds the records of a loaded batch to the loaded offense index (a sorted int64 array of offense_ids,
+             along with their report dates so the index follows the retention window).
+
+    Params:
+        offense_id_values   :   the loaded records' offense_ids
+        report_datetimes    :   the loaded records' report dates/times
+        index_path          :   path of the loaded offense index; defaults to the LOADED_INDEX env variable
+    """
+
+    if index_path is None:
+        index_path = getenv('LOADED_INDEX')
+
+    loaded_data = DataFrame({'offense_id': list(offense_id_values), 'report_datetime': list(report_datetimes)})
+
+    batch = {
+            'offense_id':   offense_ids(loaded_data),
+            'report_date':  report_days(loaded_data)
+            }
+
+    with index_lock:
+        merge_index(load_index(index_path, loaded_index_arrays), batch, index_path)
@@ -0,0 +1,321 @@
+from . import clean_seattle_data as csd
+from . import retrieve_seattle_data as rsd
+from . import audit_functions as audit
+from . import export_seattle_data as esd
+from . import cache_seattle_data as cache
+from . import rollup_seattle_data as rollup
+from . import spatial_index as spatial
+from . import resolve_loc_codes as rlc
+from . import resolve_offenses
+from . import address_dimension
+from . import address_coordinates
+from . import canonical_addresses
+from . import seattle_schema as schema
+from . import seattle_loading
+from . import offense_index
+from . import change_capture
+from . import quality_rules
+from . import stage_cache
+from . import raw_archive
+
+
+# List of data retrieval functions, ordered in terms of retrieval preference
+data_retrieval_functions = rsd.data_retrieval_functions
+
+
+# List of auditing functions, each run over the raw (retrieved) data; the data quality rules (see
+# quality_rules.data_quality_rules) are audited together, in one pass. A value audited by several functions keeps the
+# first one's reason
+data_auditing_functions = [
+                            quality_rules.audit_rules
+                            ]
+
+
+# List of cleaning functions, run in order over the raw data; each takes & returns the batch
+data_cleaning_functions = [
+                            csd.cleanup_whitespace,
+                            csd.cleanup_column_casing,
+                            csd.cleanup_na_values,
+                            schema.apply_schema,
+                            resolve_offenses.resolve_offense_descriptors,
+                            csd.clear_non_crimes,
+                            csd.cleanup_addresses,
+                            canonical_addresses.canonicalize_addresses,
+                            csd.cleanup_dtypes,
+                            csd.correct_offense_datetime,
+                            csd.cleanup_report_number,
+                            csd.cleanup_misspelled_mcpp,
+                            csd.correct_na_loc_codes,
+                            csd.correct_deci_degrees,
+                            address_coordinates.record_address_observations,
+                            rlc.update_beat_grid,
+                            rlc.correct_loc_codes_from_coordinates,
+                            address_coordinates.fill_coordinates_from_addresses,
+                            schema.apply_schema,
+                            csd.cleanup_column_order,
+                            esd.export_parquet,
+                            cache.update_cache,
+                            rollup.update_rollups_from_cache,
+                            spatial.update_spatial_index,
+                            csd.config_addresses,
+                            address_dimension.intern_addresses,
+                            csd.config_na_values
+                        ]
+
+
+# Cleaning functions that read (or read & rewrite) local files updated by every batch (the raw archive the offense codes
+# are validated against, the cache's canonical streets, beat grid, address coordinate observations, Parquet dataset,
+# cache, rollups, spatial index & address dimension)
+local_output_functions = {
+                        resolve_offenses.resolve_offense_descriptors,
+                        canonical_addresses.canonicalize_addresses,
+                        rlc.update_beat_grid,
+                        rlc.correct_loc_codes_from_coordinates,
+                        address_coordinates.record_address_observations,
+                        address_coordinates.fill_coordinates_from_addresses,
+                        esd.export_parquet,
+                        cache.update_cache,
+                        rollup.update_rollups_from_cache,
+                        spatial.update_spatial_index,
+                        address_dimension.intern_addresses
+                        }
+
+
+# Cleaning functions correcting values through data quality rules, mapped to their rules (see quality_rules.Rule).
+# When a batch is cleaned along with its values audit table, clean_batch runs their rules itself, so the values they
+# correct are audited as the stage receives them, in the same pass, after the raw batch's audit (whose reasons come
+# first)
+rule_stages = {
+                resolve_offenses.resolve_offense_descriptors:           resolve_offenses.offense_descriptor_rules,
+                canonical_addresses.canonicalize_addresses:             canonical_addresses.street_correction_rules,
+                rlc.correct_loc_codes_from_coordinates:                 rlc.loc_code_inference_rules,
+                address_coordinates.fill_coordinates_from_addresses:    address_coordinates.address_coordinate_rules
+                }
+
+
+def audit_batch(raw_data):
+    """
+    Summary: Runs each auditing function over the raw batch, collecting the values the cleaning will null.
+
+    Returns: the values audit table (see audit_functions.create_audit)
+    """
+
+    audit_table = audit.create_audit(audit_type='values')
+
+    for audit_function in data_auditing_functions:
+        audit_table = audit_function(
+                                    seattle_data=raw_data,
+                                    audit_table=audit_table
+                                    )
+
+    return audit_table
+
+
+def run_stage(cleaning_function, seattle_data, audit_table=None):
+    """
+    Summary: Runs a cleaning function over the batch; the rules of rule_stages are run directly when an audit_table
+             is given, auditing the values they correct.
+
+    Returns: tuple -> (the batch, the values audit table)
+    """
+
+    if audit_table is not None and cleaning_function in rule_stages:
+        return quality_rules.run_rules(seattle_data, rule_stages[cleaning_function], audit_table)
+
+    return cleaning_function(seattle_data), audit_table
+
+
+def clean_batch(raw_data, output_lock=None, cleaning_functions=None, stage_cache_dir=None, audit_table=None):
+    """
+    Summary: Runs each cleaning function, in order, over the raw batch, timing each one.
+
+    Returns: tuple -> (the cleaned batch, the functions audit table of each function's runtime, the values audit table
+             along with the values corrected by rule_stages, or None if no audit_table was given)
+
+    Params:
+        raw_data            :   the raw batch
+        output_lock         :   lock held while running the functions updating shared local outputs
+                                (local_output_functions), so several batches can be cleaned at once (i.e. by
+                                scheduler.run_pipelined) without interleaving their updates; None when batches are
+                                cleaned one at a time
+        cleaning_functions  :   the cleaning functions to run; defaults to data_cleaning_functions
+        stage_cache_dir     :   directory of the stage cache (see stage_cache.run_memoized); when given, the functions
+                                other than local_output_functions load their output from it if their input, code/rule
+                                version & the reference data haven't changed since it was cached; rule_stages
+                                auditing their corrections are always run
+        audit_table         :   the batch's values audit table (see audit_batch)
+    """
+
+    audit_table_func = audit.create_audit(audit_type='functions')
+    function_timer = audit.AuditTimer()
+
+    seattle_data = raw_data
+
+    # Fingerprint of seattle_data, when known from the stage cache
+    fingerprint = None
+    reference = stage_cache.reference_version() if stage_cache_dir is not None else None
+
+    for cleaning_function in cleaning_functions or data_cleaning_functions:
+        function_timer.start()
+
+        if cleaning_function in local_output_functions:
+            if output_lock is not None:
+                with output_lock:
+                    seattle_data, audit_table = run_stage(cleaning_function, seattle_data, audit_table)
+
+            else:
+                seattle_data, audit_table = run_stage(cleaning_function, seattle_data, audit_table)
+
+            fingerprint = None
+
+        elif audit_table is not None and cleaning_function in rule_stages:
+            seattle_data, audit_table = run_stage(cleaning_function, seattle_data, audit_table)
+
+            fingerprint = None
+
+        elif stage_cache_dir is not None:
+            seattle_data, fingerprint = stage_cache.run_memoized(
+                                                                cleaning_function   =   cleaning_function,
+                                                                seattle_data        =   seattle_data,
+                                                                cache_dir           =   stage_cache_dir,
+                                                                reference           =   reference,
+                                                                input_fingerprint   =   fingerprint
+                                                                )
+
+        else:
+            seattle_data = cleaning_function(seattle_data)
+
+        audit.audit_functions_insert(
+                                    audit_table = audit_table_func,
+                                    func_name   = cleaning_function.__name__,
+                                    runtime     = function_timer.stop()
+                                    )
+
+    return seattle_data, audit_table_func, audit_table
+
+
+def convert_batch(clean_data, audit_table):
+    """
+    Summary: Transforms the cleaned batch, its audit table & the batch's addresses into record sets, the
+             format/structure the data is inserted into the database in.
+
+    Returns: tuple of record sets -> (clean data, audit data, address data)
+    """
+
+    address_data_record_set = seattle_loading.convert_address_dimension_into_record_set(
+                                                                    address_dimension.batch_address_dimension(clean_data)
+                                                                    )
+    clean_data_record_set, audit_data_record_set = seattle_loading.convert_into_record_sets(clean_data, audit_table)
+
+    return clean_data_record_set, audit_data_record_set, address_data_record_set
+
+
+def record_loaded_batch(clean_data_record_set, raw_data=None, index_path=None, hashes_path=None):
+    """
+    Summary: Records a loaded batch's records in the loaded offense index (see offense_index.drop_loaded) & the
+             hashes of its raw records in the row hash store (see change_capture.changed_rows), so change data
+             capture doesn't upsert records loaded by any other path again unless SPD revises them.
+
+    Params:
+        clean_data_record_set   :   the batch's clean data record set (see convert_batch)
+        raw_data                :   the batch's raw records, as retrieved (the cleaning modifies some columns in
+                                    place, so batches are cleaned as a copy); their hashes aren't recorded if None
+        index_path              :   see offense_index.record_loaded
+        hashes_path             :   see change_capture.update_row_hashes
+    """
+
+    offense_index.record_loaded(
+                                offense_id_values   =   (record[1] for record in clean_data_record_set),
+                                report_datetimes    =   (record[4] for record in clean_data_record_set),
+                                index_path          =   index_path
+                                )
+
+    if raw_data is not None:
+        change_capture.update_row_hashes(raw_data, hashes_path)
+
+
+def insert_batch(record_sets, replaced_offense_ids=None, replaced_report_dates=None, raw_data=None):
+    """
+    Summary: Inserts a batch's record sets (see convert_batch) into the database, after removing the expired data
+             from it, & records its records as loaded (see record_loaded_batch). The existing records of any
+             replaced_offense_ids are replaced (see seattle_loading.insert_data), as is every existing record of the
+             replaced_report_dates (see seattle_loading.replace_data).
+    """
+
+    clean_data_record_set, audit_data_record_set, address_data_record_set = record_sets
+
+    # Establish a connection with the database
+    cursor = seattle_loading.establish_connection()
+
+    # Attempt to remove data
+    seattle_loading.remove_data(cursor)
+
+    # Insert the new data into the database, replacing the reprocessed report dates' data if any
+    if replaced_report_dates:
+        seattle_loading.replace_data(
+                                    cursor,
+                                    clean_data_record_set,
+                                    audit_data_record_set,
+                                    address_data_record_set,
+                                    replaced_report_dates,
+                                    replaced_offense_ids
+                                    )
+
+    else:
+        seattle_loading.insert_data(
+                                    cursor,
+                                    clean_data_record_set,
+                                    audit_data_record_set,
+                                    address_data_record_set,
+                                    replaced_offense_ids
+                                    )
+
+    # insert_data exits if the insert fails, so only loaded records are recorded
+    record_loaded_batch(clean_data_record_set, raw_data)
+
+
+def load_batch(clean_data, audit_table, raw_data=None):
+    """
+    Summary: Loads the cleaned batch, its addresses & its audited values into the database, after removing the
+             expired data from it, recording the hashes of the batch's raw_data (see record_loaded_batch).
+    """
+
+    insert_batch(
+                record_sets =   convert_batch(clean_data, audit_table),
+                raw_data    =   raw_data
+                )
+
+
+def run_batch(date=None, how='>='):
+    """
+    Summary: Brings together all components for one batch:
+                > Retrieves the data
+                > Audits & cleans the data
+                > Loads the data into the database
+
+    Returns: the functions audit table of each cleaning function's runtime, or None if no data could be retrieved
+             (or every record retrieved has already been loaded)
+
+    Params:
+        date    :   represents date from which to retrieve data by; must be in yyyy-mm-dd format
+        how     :   allows you to specify how data sould be retrieved with respect to date: >, <, >=, <=, or =
+    """
+
+    raw_data = rsd.retrieve_data(date=date, how=how)
+
+    if raw_data is None:
+        return None
+
+    raw_archive.archive_raw(raw_data)
+
+    raw_data = offense_index.drop_loaded(raw_data)
+
+    if raw_data.empty:
+        return None
+
+    # Cleaned as a copy, as the cleaning modifies some columns in place & the raw content is hashed once loaded
+    clean_data, audit_table_func, audit_table = clean_batch(raw_data.copy(), audit_table=audit_batch(raw_data))
+
+    load_batch(clean_data, audit_table, raw_data)
+
+    return audit_table_func
@@ -0,0 +1,415 @@
+import operator
+from os import getenv
+
+import numpy as np
+from numpy import nan
+from pandas import Series, read_csv, to_numeric
+from pandas.api.types import is_datetime64_any_dtype
+from dotenv import load_dotenv
+
+from .datetime_parsing import datetime_columns, parse_datetime_column
+
+load_dotenv()
+
+
+# Audit reason ids, stored with each audited value (audited_reason_id) to describe why it was nulled
+invalid_datetime_reason         =   1
+invalid_coordinate_reason       =   2
+offense_datetime_order_reason   =   3
+invalid_report_number_reason    =   4
+invalid_mcpp_reason             =   5
+invalid_loc_code_reason         =   8
+longitude_range_reason          =   10
+latitude_range_reason           =   11
+inferred_loc_code_reason        =   12
+address_coordinates_reason      =   13
+offense_descriptor_reason       =   14
+street_correction_reason        =   15
+
+# Valid report number format: four digits & six digits separated by a dash (1234-567890)
+valid_report_number = r'^\d{4}-\d{6}$'
+
+# Washington State's longitude & latitude ranges
+washington_longitudes = (-125.0, -116.5)
+washington_latitudes = (45.5, 49.0)
+
+# The actions a rule can take on the values it flags
+rule_actions = ('null', 'correct', 'drop')
+
+comparison_operators = {
+                        '<':    operator.lt,
+                        '<=':   operator.le,
+                        '>':    operator.gt,
+                        '>=':   operator.ge,
+                        '==':   operator.eq,
+                        '!=':   operator.ne
+                        }
+
+
+# Predicates: each describes the VALID values of a rule's column(s); a rule flags the values failing it. A predicate is
+# a hashable tuple, so rules declaring the same predicate share one mask
+def parses_as(column, dtype):
+    """
+    Summary: Predicate of values that are missing or convert to the dtype ('datetime' or 'numeric'), as cleanup_dtypes
+             converts them.
+    """
+
+    return ('parses_as', column, dtype)
+
+
+def in_range(column, low, high):
+    """
+    Summary: Predicate of numeric values within [low, high]; missing & non-numeric values fail it.
+    """
+
+    return ('in_range', column, low, high)
+
+
+def matches(column, pattern):
+    """
+    Summary: Predicate of values matching a regex pattern; missing values fail it.
+    """
+
+    return ('matches', column, pattern)
+
+
+def in_reference(column, reference, reference_column=None):
+    """
+    Summary: Predicate of values that are missing or found in a reference file's column (i.e. the valid mcpp's).
+
+    Params:
+        column              :   the column checked
+        reference           :   env variable holding the path of the reference CSV file (i.e. MCPP, LOC_CODES)
+        reference_column    :   the reference file's column; defaults to column
+    """
+
+    return ('in_reference', column, reference, reference_column or column)
+
+
+def compares(left, comparison, right, dtype='datetime'):
+    """
+    Summary: Cross-column predicate of records whose left & right values, converted to the dtype, satisfy the
+             comparison (i.e. '<='); records missing either value pass it.
+    """
+
+    return ('compares', left, comparison, right, dtype)
+
+
+def agrees_with(column, inference):
+    """
+    Summary: Predicate of values equal to the value inferred for their record (i.e. the offense descriptor of the
+             record's offense code); records nothing is inferred for pass it, while missing values fail it wherever a
+             value is inferred.
+
+    Params:
+        column      :   the column checked
+        inference   :   function taking the SharedColumns & returning a frame of inferred values for (some of) the
+                        records, indexed like them; computed once per batch, whatever the number of rules using it
+    """
+
+    return ('agrees_with', column, inference)
+
+
+def inferred(inference):
+    """
+    Summary: Correction (see Rule) replacing the flagged values by the values inferred for their records, for rules
+             declaring an agrees_with predicate over the same inference.
+    """
+
+    def correction(flagged_data, shared):
+        return shared.inferred(inference).loc[flagged_data.index, flagged_data.columns]
+
+    return correction
+
+
+class Rule:
+    """
+    Summary: A data quality rule, declared once & used both to audit the values it flags & to act on them:
+                > null      :   the flagged values are nulled
+                > correct   :   the flagged values are replaced by correction(flagged_data, shared_columns), a frame
+                                of the rule's columns on the flagged records (nan where a value can't be corrected)
+                > drop      :   the flagged records are dropped
+
+    Params:
+        columns     :   the columns audited & acted on
+        predicate   :   the valid values (see parses_as, in_range, matches, in_reference, compares, agrees_with)
+        action      :   one of rule_actions
+        reason      :   the audit reason id stored with each flagged value
+        correction  :   the correcting function, for the correct action
+    """
+
+    def __init__(self, columns, predicate, action, reason, correction=None):
+
+        if action not in rule_actions:
+            raise ValueError(f'{action} is not a rule action; expected one of {rule_actions}')
+
+        if action == 'correct' and correction is None:
+            raise ValueError('rules with the correct action require a correction function')
+
+        self.columns = list(columns)
+        self.predicate = predicate
+        self.action = action
+        self.reason = reason
+        self.correction = correction
+
+
+class SharedColumns:
+    """
+    Summary: Holds the intermediate results rules are evaluated from (converted columns, reference files & the
+             predicates' masks), computing each one once per batch however many rules use it.
+    """
+
+    def __init__(self, seattle_data):
+        self.seattle_data = seattle_data
+        self.results = {}
+
+    def shared(self, key, compute):
+        if key not in self.results:
+            self.results[key] = compute()
+
+        return self.results[key]
+
+    def datetime(self, column):
+        """
+        Summary: Gets the column as datetime values, parsed as cleanup_dtypes parses them.
+        """
+
+        def parse():
+            values = self.seattle_data[column]
+
+            if is_datetime64_any_dtype(values):
+                return values
+
+            return Series(parse_datetime_column(values), index=values.index)
+
+        return self.shared(('datetime', column), parse)
+
+    def numeric(self, column):
+        """
+        Summary: Gets the column as numeric values, non-numeric ones being nan.
+        """
+
+        return self.shared(('numeric', column), lambda: to_numeric(self.seattle_data[column], errors='coerce'))
+
+    def reference(self, reference):
+        """
+        Summary: Gets a reference file (i.e. the valid mcpp's), read once per batch.
+        """
+
+        return self.shared(('reference', reference), lambda: read_csv(filepath_or_buffer=getenv(reference), dtype='O'))
+
+    def inferred(self, inference):
+        """
+        Summary: Gets the values an inference infers for the batch (see agrees_with).
+        """
+
+        return self.shared(('inferred', inference), lambda: inference(self))
+
+    def mask(self, predicate):
+        """
+        Summary: Gets the records failing a predicate.
+
+        Returns: numpy boolean array
+        """
+
+        return self.shared(('mask', predicate), lambda: predicate_masks[predicate[0]](self, *predicate[1:]))
+
+
+def parses_as_mask(shared, column, dtype):
+    converted = getattr(shared, dtype)(column)
+
+    return (shared.seattle_data[column].notna() & converted.isna()).to_numpy()
+
+
+def in_range_mask(shared, column, low, high):
+    return (~shared.numeric(column).between(low, high)).to_numpy()
+
+
+def matches_mask(shared, column, pattern):
+    return (~shared.seattle_data[column].str.contains(pat=pattern, regex=True, na=False)).to_numpy()
+
+
+def in_reference_mask(shared, column, reference, reference_column):
+    values = shared.seattle_data[column]
+
+    return (~values.isin(shared.reference(reference)[reference_column]) & values.notna()).to_numpy()
+
+
+def compares_mask(shared, left, comparison, right, dtype):
+    left_values = getattr(shared, dtype)(left)
+    right_values = getattr(shared, dtype)(right)
+
+    return (
+            left_values.notna()
+            & right_values.notna()
+            & ~comparison_operators[comparison](left_values, right_values)
+            ).to_numpy()
+
+
+def agrees_with_mask(shared, column, inference):
+    inferred_values = shared.inferred(inference)[column]
+
+    # Only the records a value was inferred for are compared
+    positions = shared.seattle_data.index.get_indexer(inferred_values.index)
+    values = shared.seattle_data[column].to_numpy(dtype='O')[positions]
+
+    flagged = np.zeros(len(shared.seattle_data), dtype=bool)
+    flagged[positions] = inferred_values.notna().to_numpy() & (values != inferred_values.to_numpy(dtype='O'))
+
+    return flagged
+
+
+# Predicate kind -> function computing the records failing it
+predicate_masks = {
+                    'parses_as':        parses_as_mask,
+                    'in_range':         in_range_mask,
+                    'matches':          matches_mask,
+                    'in_reference':     in_reference_mask,
+                    'compares':         compares_mask,
+                    'agrees_with':      agrees_with_mask
+                    }
+
+
+# The rules checked over the raw (retrieved) data, in audit order: when a value is flagged by several rules, the
+# audit table keeps the first rule's reason. Within the pipeline, the report number, mcpp & location code values are
+# first corrected where possible (cleanup_report_number, cleanup_misspelled_mcpp, correct_na_loc_codes) & only nulled
+# if that fails
+datetime_rules = [
+                    Rule([column], parses_as(column, 'datetime'), 'null', invalid_datetime_reason)
+                    for column in datetime_columns
+                    ]
+
+coordinate_rules = [
+                    Rule([column], parses_as(column, 'numeric'), 'null', invalid_coordinate_reason)
+                    for column in ('latitude', 'longitude')
+                    ]
+
+offense_datetime_rule = Rule(
+                            columns     =   ['offense_start_datetime', 'offense_end_datetime'],
+                            predicate   =   compares('offense_start_datetime', '<=', 'offense_end_datetime'),
+                            action      =   'null',
+                            reason      =   offense_datetime_order_reason
+                            )
+
+report_number_rule = Rule(['report_number'], matches('report_number', valid_report_number), 'null', invalid_report_number_reason)
+
+mcpp_rule = Rule(['mcpp'], in_reference('mcpp', 'MCPP'), 'null', invalid_mcpp_reason)
+
+loc_code_rules = [
+                    Rule([loc_code], in_reference(loc_code, 'LOC_CODES'), 'null', invalid_loc_code_reason)
+                    for loc_code in ('beat', 'sector', 'precinct')
+                    ]
+
+longitude_rule = Rule(['longitude'], in_range('longitude', *washington_longitudes), 'null', longitude_range_reason)
+
+latitude_rule = Rule(['latitude'], in_range('latitude', *washington_latitudes), 'null', latitude_range_reason)
+
+data_quality_rules = [
+                        *datetime_rules,
+                        *coordinate_rules,
+                        offense_datetime_rule,
+                        report_number_rule,
+                        mcpp_rule,
+                        *loc_code_rules,
+                        longitude_rule,
+                        latitude_rule
+                        ]
+
+
+def compile_rules(rules):
+    """
+    Summary: Groups a rule set by predicate, so each distinct predicate's mask is computed once, however many rules
+             declare it.
+
+    Returns: dictionary of predicate -> list of its rules, in declaration order
+    """
+
+    compiled = {}
+
+    for rule in rules:
+        compiled.setdefault(rule.predicate, []).append(rule)
+
+    return compiled
+
+
+def run_rules(seattle_data, rules=None, audit_table=None, apply_actions=True):
+    """
+    Summary: Runs a rule set over a batch in one pass: every predicate's mask is computed over the batch as given
+             (sharing parsed columns & reference files across rules, see SharedColumns), the flagged values are
+             audited & then each rule's action is applied. Rules therefore see the same input whatever their order.
+
+    Returns: tuple -> (the cleaned batch, the values audit table, or None if no audit_table was given)
+
+    Params:
+        seattle_data    :   Pandas DataFrame
+        rules           :   list of Rule; defaults to data_quality_rules
+        audit_table     :   values audit table (see audit_functions.create_audit) the flagged values are inserted into
+        apply_actions   :   whether to apply the rules' actions; the raw batch is only audited, as the pipeline's
+                            cleaning functions act on it once it's been prepared (see audit_rules)
+    """
+
+    # Imported here, as audit_functions declares its audits with this module's rules
+    from .audit_functions import audit_values_insert
+
+    rules = data_quality_rules if rules is None else rules
+
+    shared = SharedColumns(seattle_data)
+    masks = {predicate: shared.mask(predicate) for predicate in compile_rules(rules)}
+
+    # Each rule's values are inserted in turn, so a value flagged by several rules keeps the first rule's reason
+    if audit_table is not None:
+        for rule in rules:
+            audited_values = seattle_data.loc[masks[rule.predicate], ['offense_id', *rule.columns]]
+
+            # A corrected value that was missing is audited as an empty value, so values filled in are audited too
+            if rule.action == 'correct':
+                audited_values = audited_values.astype('O').fillna('')
+
+            audit_table = audit_values_insert(
+                                            audit_table     =   audit_table,
+                                            audited_val     =   audited_values,
+                                            audit_reason    =   rule.reason
+                                            )
+
+    if not apply_actions:
+        return seattle_data, audit_table
+
+    dropped = np.zeros(len(seattle_data), dtype=bool)
+
+    for rule in rules:
+        flagged = masks[rule.predicate]
+
+        if not flagged.any():
+            continue
+
+        if rule.action == 'null':
+            seattle_data.loc[flagged, rule.columns] = nan
+
+        elif rule.action == 'correct':
+            seattle_data.loc[flagged, rule.columns] = rule.correction(seattle_data.loc[flagged, rule.columns], shared)
+
+        else:
+            dropped |= flagged
+
+    if dropped.any():
+        seattle_data = seattle_data.drop(index=seattle_data.index[dropped])
+
+    return seattle_data, audit_table
+
+
+def audit_rules(seattle_data, audit_table, rules=None):
+    """
+    Summary: Audits the values a rule set flags over the raw batch, without acting on them (an auditing function, see
+             pipeline.data_auditing_functions).
+
+    Returns: the values audit table
+    """
+
+    _, audit_table = run_rules(
+                                seattle_data    =   seattle_data,
+                                rules           =   rules,
+                                audit_table     =   audit_table,
+                                apply_actions   =   False
+                                )
+
+    return audit_table
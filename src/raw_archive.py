@@ -0,0 +1,215 @@
+import threading
+from os import getenv, listdir, makedirs, remove, replace, stat
+from os.path import exists, join
+
+from dotenv import load_dotenv
+
+from .retention import retention_date_limit
+
+load_dotenv()
+
+
+# Archive day of the raw records without a (parseable) report date
+undated_day = 'undated'
+
+# Held while a day's archive file is read, merged & rewritten, as batches may be retrieved by several threads at once
+archive_lock = threading.Lock()
+
+# Distinct values read from each archive file by archived_distinct, by (path, columns) -> (modification time, values)
+archived_distinct_values = {}
+
+
+def archive_path(day, archive_dir=None):
+    """
+    Summary: Gets the path of a day's archive file.
+
+    Params:
+        day         :   report date, yyyy-mm-dd (or undated_day)
+        archive_dir :   directory holding the raw archive; defaults to the RAW_ARCHIVE env variable
+    """
+
+    return join(archive_dir or getenv('RAW_ARCHIVE'), f'{day}.parquet')
+
+
+def raw_report_days(raw_data):
+    """
+    Summary: Gets the report date of each raw record, as yyyy-mm-dd; records without a parseable one get undated_day.
+
+    Returns: Pandas Series
+    """
+
+    from pandas import to_datetime
+
+    return (
+            to_datetime(raw_data['report_datetime'], errors='coerce')
+            .dt.strftime('%Y-%m-%d')
+            .fillna(undated_day)
+            )
+
+
+def load_archived(day, archive_dir=None):
+    """
+    Summary: Loads a day's archived raw records, as retrieved (every value a string, missing values as None).
+
+    Returns: Pandas DataFrame; empty if the day isn't archived
+    """
+
+    # pyarrow & pandas are imported within the functions, so listing the archived days (the cli's dry run) stays
+    # near instant
+    import pyarrow.parquet as pq
+    from pandas import DataFrame
+
+    path = archive_path(day, archive_dir)
+
+    if not exists(path):
+        return DataFrame()
+
+    return pq.read_table(path).to_pandas()
+
+
+def save_archived(raw_data, day, archive_dir=None):
+    """
+    Summary: Saves a day's raw records as a (zstd-compressed) Parquet file, every column as strings, replacing the
+             previous file only once fully written.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = archive_path(day, archive_dir)
+
+    table = pa.table({
+                    column: pa.array(raw_data[column].astype('string'), type=pa.string())
+                    for column in raw_data.columns
+                    })
+
+    with pa.OSFile(path + '.tmp', 'wb') as file:
+        pq.write_table(table, file, compression='zstd')
+
+    replace(path + '.tmp', path)
+
+
+def archived_distinct(columns, archive_dir=None):
+    """
+    Summary: Gets the distinct combinations of the columns' values across the archived raw records, i.e. the dataset
+             as SPD publishes it over the retention window. Each day's combinations are kept once read, along with its
+             file's modification time, so only the days archived (or re-archived) since are read again.
+
+    Returns: Pandas DataFrame of the columns (as strings, missing values as None); empty if nothing is archived
+
+    Params:
+        columns     :   list of column names
+        archive_dir :   directory holding the raw archive; defaults to the RAW_ARCHIVE env variable
+    """
+
+    import pyarrow.parquet as pq
+    from pandas import DataFrame, concat
+
+    day_values = []
+
+    for day in archived_days(archive_dir):
+        path = archive_path(day, archive_dir)
+        key = (path, tuple(columns))
+
+        try:
+            modified = stat(path).st_mtime_ns
+
+        # Expired (& removed) since it was listed
+        except FileNotFoundError:
+            continue
+
+        if key not in archived_distinct_values or archived_distinct_values[key][0] != modified:
+            archived_columns = [column for column in columns if column in pq.read_schema(path).names]
+
+            values = (
+                    pq.read_table(path, columns=archived_columns)
+                    .to_pandas()
+                    .reindex(columns=columns)
+                    .drop_duplicates()
+                    )
+
+            archived_distinct_values[key] = (modified, values)
+
+        day_values.append(archived_distinct_values[key][1])
+
+    if not day_values:
+        return DataFrame(columns=columns, dtype='O')
+
+    return concat(day_values, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def archive_raw(raw_data, archive_dir=None):
+    """
+    Summary: Adds retrieved raw records to the raw archive, one file per report date, so history can be re-cleaned
+             (see reprocess) without retrieving it again. A day's records already archived are replaced by their
+             version in the batch (i.e. records revised by SPD). The days that have expired are dropped from the
+             archive, following the same retention rule as the database (see seattle_loading.remove_data).
+
+    Returns: the raw_data, unchanged
+
+    Params:
+        raw_data    :   the raw (retrieved) records, before any cleaning
+        archive_dir :   directory holding the raw archive; defaults to the RAW_ARCHIVE env variable
+    """
+
+    from pandas import concat
+
+    if archive_dir is None:
+        archive_dir = getenv('RAW_ARCHIVE')
+
+    if raw_data.empty:
+        return raw_data
+
+    makedirs(archive_dir, exist_ok=True)
+
+    with archive_lock:
+
+        for day, day_data in raw_data.groupby(raw_report_days(raw_data), sort=False):
+
+            archived = load_archived(day, archive_dir)
+
+            if not archived.empty:
+                day_data = concat(
+                                [archived[~archived['offense_id'].isin(day_data['offense_id'])], day_data],
+                                ignore_index=True
+                                )
+
+            save_archived(day_data, day, archive_dir)
+
+        date_limit = retention_date_limit()
+
+        for day in archived_days(archive_dir):
+
+            if day != undated_day and day < date_limit:
+                remove(archive_path(day, archive_dir))
+
+    return raw_data
+
+
+def archived_days(archive_dir=None, start=None, end=None):
+    """
+    Summary: Lists the archived days, optionally within a range of report dates (the undated records are only listed
+             when no range is given).
+
+    Returns: list of yyyy-mm-dd strings (and undated_day), sorted
+
+    Params:
+        archive_dir :   directory holding the raw archive; defaults to the RAW_ARCHIVE env variable
+        start       :   first report date, yyyy-mm-dd
+        end         :   last report date, yyyy-mm-dd
+    """
+
+    archive_dir = archive_dir or getenv('RAW_ARCHIVE')
+
+    if not exists(archive_dir):
+        return []
+
+    days = sorted(name[:-len('.parquet')] for name in listdir(archive_dir) if name.endswith('.parquet'))
+
+    if start is None and end is None:
+        return days
+
+    return [
+            day for day in days
+            if day != undated_day and (start is None or day >= start) and (end is None or day <= end)
+            ]
@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+
+from .checkpoint import clean_stage, clear_checkpoints, completed_stages, load_checkpoint, save_checkpoint
+from .export_seattle_data import remove_exported_days
+from .raw_archive import load_archived, undated_day
+from .scheduler import run_pipelined
+
+
+def reprocess_batch_id(day):
+    """
+    Summary: Gets the id a reprocessed day's checkpoints are kept under, i.e. 2023-03-08 -> 2023-03-08_reprocess, kept
+             apart from the checkpoints of retrieved batches (see checkpoint.batch_id).
+    """
+
+    return f'{day}_reprocess'
+
+
+def archive_stage(day, archive_dir=None, checkpoint_dir=None):
+    """
+    Summary: Reads an archived day's raw records (see raw_archive.archive_raw) & checkpoints them as the batch's raw
+             data, in place of checkpoint.fetch_stage. Every archived record is reprocessed, whether loaded or not.
+             The day's records are removed from the parquet dataset beforehand (see
+             export_seattle_data.remove_exported_days), so the reprocessed batch's export replaces them.
+
+    Returns: the batch id, or None if the day holds no archived records
+    """
+
+    batch = reprocess_batch_id(day)
+
+    if completed_stages(batch, checkpoint_dir):
+        return batch
+
+    raw_data = load_archived(day, archive_dir)
+
+    if raw_data.empty:
+        return None
+
+    # Before the checkpoint, so a failure in between removes them again when resumed
+    if day != undated_day:
+        remove_exported_days([day])
+
+    save_checkpoint(raw_data, batch, 'raw', checkpoint_dir)
+
+    return batch
+
+
+def replace_stage(batch, checkpoint_dir=None):
+    """
+    Summary: Replaces a reprocessed day's data within the database by the batch's record sets, in place of
+             checkpoint.load_stage: the day's existing records are deleted (see seattle_loading.replace_data),
+             then the batch's checkpoints are deleted. The undated records have no day to delete, so theirs are
+             deleted by offense_id.
+
+    Returns: the batch id
+    """
+
+    from .pipeline import insert_batch
+
+    day = batch[:-len('_reprocess')]
+
+    raw_data = load_checkpoint(batch, 'raw', checkpoint_dir)
+
+    if day == undated_day:
+        insert_batch(
+                    record_sets             =   load_checkpoint(batch, 'record_sets', checkpoint_dir),
+                    replaced_offense_ids    =   raw_data['offense_id'].dropna().unique().tolist(),
+                    raw_data                =   raw_data
+                    )
+
+    else:
+        insert_batch(
+                    record_sets             =   load_checkpoint(batch, 'record_sets', checkpoint_dir),
+                    replaced_report_dates   =   [day],
+                    raw_data                =   raw_data
+                    )
+
+    clear_checkpoints(batch, checkpoint_dir)
+
+    return batch
+
+
+def run_reprocess(days, clean_workers=1, load_workers=1, queue_size=2, archive_dir=None, checkpoint_dir=None,
+                  stage_cache_dir=None):
+    """
+    Summary: Re-cleans archived days through the current auditing & cleaning functions & bulk-replaces their data
+             within the database, without retrieving anything, i.e. to roll a rule change out over the retention
+             window. The days go through the scheduler's overlapping stages (see scheduler.run_pipelined), reading
+             from the archive in place of retrieving & replacing in place of inserting. Days are checkpointed, so a
+             failed reprocessing resumes each day from its last completed stage when run again.
+
+             With a stage cache, only the cleaning stages affected by the change (and those after them) are
+             recomputed; the rest are loaded from the cache (see stage_cache.run_memoized).
+
+             With clean_workers > 1, the days are cleaned in a process pool, as by backfill --async (see
+             async_pipeline.run_async_batches), so the CPU-bound cleaning isn't serialized by the GIL; the scheduler's
+             clean workers only wait on the pool. The cleaning functions updating shared local files
+             (pipeline.local_output_functions) then run one day at a time, under a lock shared across the processes.
+
+    Returns: dictionary of the wall time, the utilization report, the ids of the replaced batches, the days holding no
+             archived records & the failures (see scheduler.run_pipelined)
+
+    Params:
+        days            :   the archived days to reprocess (see raw_archive.archived_days)
+        clean_workers   :   number of days cleaned at once (cleaning processes, when > 1)
+        load_workers    :   number of concurrent database replacements
+        queue_size      :   number of days queued between two stages
+        archive_dir     :   directory holding the raw archive; defaults to the RAW_ARCHIVE env variable
+        checkpoint_dir  :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+        stage_cache_dir :   directory of the stage cache, if any
+    """
+
+    stages = {
+            'fetch':    lambda day: archive_stage(day, archive_dir, checkpoint_dir),
+            'load':     lambda batch: replace_stage(batch, checkpoint_dir)
+            }
+
+    if clean_workers <= 1:
+        return run_pipelined(
+                            dates           =   days,
+                            fetch_workers   =   1,
+                            clean_workers   =   clean_workers,
+                            load_workers    =   load_workers,
+                            queue_size      =   queue_size,
+                            checkpoint_dir  =   checkpoint_dir,
+                            stage_cache_dir =   stage_cache_dir,
+                            stages          =   stages
+                            )
+
+    with Manager() as manager, ProcessPoolExecutor(max_workers=clean_workers) as clean_pool:
+        output_lock = manager.Lock()
+
+        stages['clean'] = lambda batch: clean_pool.submit(
+                                                        clean_stage, batch, checkpoint_dir, output_lock, stage_cache_dir
+                                                        ).result()
+
+        return run_pipelined(
+                            dates           =   days,
+                            fetch_workers   =   1,
+                            clean_workers   =   clean_workers,
+                            load_workers    =   load_workers,
+                            queue_size      =   queue_size,
+                            checkpoint_dir  =   checkpoint_dir,
+                            stage_cache_dir =   stage_cache_dir,
+                            stages          =   stages
+                            )
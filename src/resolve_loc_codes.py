@@ -0,0 +1,401 @@
+import logging
+from os import getenv, replace
+from os.path import exists
+
+import numpy as np
+from numpy import nan
+from pandas import DataFrame, Series, concat, read_csv, read_parquet
+from dotenv import load_dotenv
+
+from .spatial_index import grid_cells, grid_columns, cell_centres, haversine
+from .quality_rules import Rule, agrees_with, inferred, run_rules, inferred_loc_code_reason
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+# Records in a cell without history only get the beat with the nearest centroid when a cell with history lies within
+# this many cells of theirs (in both directions), so coordinates far outside the city (i.e. in Spokane) get no beat
+fallback_cells = 2
+
+
+def load_beat_observations(observations_path=None):
+    """
+    Summary: Loads the beat observations: the grid cell (see spatial_index) & reported beat of each cleaned record
+             holding both, one row per offense_id:
+
+    +------------+--------+------+
+    | offense_id |  cell  | beat |
+    +------------+--------+------+
+    |  12345678  | 801234 |  B2  |
+    +------------+--------+------+
+
+    Returns: Pandas DataFrame
+
+    Params:
+        observations_path   :   path of the observations parquet file; defaults to the BEAT_OBSERVATIONS env variable
+    """
+
+    if observations_path is None:
+        observations_path = getenv('BEAT_OBSERVATIONS')
+
+    if not exists(observations_path):
+        return DataFrame(
+                        {
+                        'offense_id':   Series(dtype='O'),
+                        'cell':         Series(dtype='int64'),
+                        'beat':         Series(dtype='O')
+                        }
+                        )
+
+    return read_parquet(observations_path)
+
+
+def record_beat_observations(seattle_data, observations, cell_size=250):
+    """
+    Summary: Adds the batch's records holding both a beat & valid coordinates to the beat observations. Records
+             already observed are replaced by their version in the batch (i.e. records revised by SPD, or reprocessed),
+             so re-cleaning a batch never counts its records twice.
+
+    Returns: the updated observations, as a Pandas DataFrame
+    """
+
+    observed = DataFrame(
+                        {
+                        'offense_id':   seattle_data['offense_id'].astype('O'),
+                        'cell':         grid_cells(seattle_data['longitude'], seattle_data['latitude'], cell_size),
+                        'beat':         seattle_data['beat'].astype('O')
+                        }
+                        )
+
+    observed = observed[(observed['cell'] >= 0) & observed['beat'].notna()]
+
+    if observed.empty:
+        return observations
+
+    return concat(
+                [observations[~observations['offense_id'].isin(observed['offense_id'])], observed],
+                ignore_index=True
+                )
+
+
+def beat_grid_from_observations(observations):
+    """
+    Summary: Assigns each grid cell the beat most of its observed records were reported in.
+
+             +--------+------+---------------+
+             |  cell  | beat | offense_count |
+             +--------+------+---------------+
+             | 801234 |  B2  |      154      |
+             +--------+------+---------------+
+
+    Returns: the beat grid as a Pandas DataFrame, sorted by cell
+    """
+
+    return (
+            observations
+            .groupby(['cell', 'beat'])
+            .size()
+            .rename('offense_count')
+            .reset_index()
+            .sort_values(['cell', 'offense_count'], ascending=[True, False], kind='stable')
+            .drop_duplicates(subset='cell')
+            .reset_index(drop=True)
+            )
+
+
+def save_beat_grid(beat_grid, grid_path=None):
+    """
+    Summary: Saves the beat grid as a CSV file; defaults to the BEAT_GRID env variable.
+    """
+
+    if grid_path is None:
+        grid_path = getenv('BEAT_GRID')
+
+    beat_grid.to_csv(grid_path + '.tmp', index=False)
+
+    replace(grid_path + '.tmp', grid_path)
+
+
+def load_beat_grid(grid_path=None):
+    """
+    Summary: Loads the beat grid saved by save_beat_grid; defaults to the BEAT_GRID env variable. Before any batch
+             has been cleaned there's no grid yet, which is treated as an empty grid (inferring no beats).
+
+    Returns: Pandas DataFrame
+    """
+
+    if grid_path is None:
+        grid_path = getenv('BEAT_GRID')
+
+    if not exists(grid_path):
+        return DataFrame(
+                        {
+                        'cell':             Series(dtype='int64'),
+                        'beat':             Series(dtype='O'),
+                        'offense_count':    Series(dtype='int64')
+                        }
+                        )
+
+    return read_csv(
+                    filepath_or_buffer=grid_path,
+                    dtype={'cell': 'int64', 'beat': 'O', 'offense_count': 'int64'}
+                    )
+
+
+def build_beat_grid(observations_path=None, grid_path=None):
+    """
+    Summary: Builds the local beat boundaries file used to infer beats from coordinates. As location_codes.csv carries
+             no geometry, the boundaries are learned from the beat observations (see load_beat_observations): each
+             grid cell is assigned the beat most of its records were reported in (see beat_grid_from_observations).
+             Only reported beats are ever observed, so beats inferred from the grid never feed back into it.
+
+    Returns: the beat grid as a Pandas DataFrame
+
+    Params:
+        observations_path   :   path of the observations parquet file; defaults to the BEAT_OBSERVATIONS env variable
+        grid_path           :   path of the beat grid CSV file; defaults to the BEAT_GRID env variable
+    """
+
+    beat_grid = beat_grid_from_observations(load_beat_observations(observations_path))
+
+    save_beat_grid(beat_grid, grid_path)
+
+    return beat_grid
+
+
+def update_beat_grid(seattle_data, observations_path=None, grid_path=None):
+    """
+    Summary: Adds the batch's reported beats to the locally persisted beat observations & rebuilds the beat grid from
+             them, so the grid follows every batch. Meant to run after correct_na_loc_codes & correct_deci_degrees
+             (so only valid beats & coordinates are observed) & before correct_loc_codes_from_coordinates (so beats
+             inferred from the grid are never observed).
+
+    Returns: Pandas DataFrame
+
+    Params:
+        seattle_data        :   the cleaned batch
+        observations_path   :   path of the observations parquet file; defaults to the BEAT_OBSERVATIONS env variable
+        grid_path           :   path of the beat grid CSV file; defaults to the BEAT_GRID env variable
+    """
+
+    if observations_path is None:
+        observations_path = getenv('BEAT_OBSERVATIONS')
+
+    if grid_path is None:
+        grid_path = getenv('BEAT_GRID')
+
+    observations = load_beat_observations(observations_path)
+
+    updated = record_beat_observations(seattle_data, observations)
+
+    if updated is not observations:
+        updated.to_parquet(
+                        path    =   observations_path + '.tmp',
+                        index   =   False
+                        )
+
+        replace(observations_path + '.tmp', observations_path)
+
+    if updated is not observations or not exists(grid_path):
+        save_beat_grid(beat_grid_from_observations(updated), grid_path)
+
+    return seattle_data
+
+
+def near_known_cells(cells, known_cells, cell_size=250, distance=fallback_cells):
+    """
+    Summary: Flags the grid cells lying within distance cells (in both directions) of one of the known cells.
+
+    Returns: NumPy boolean array
+
+    Params:
+        cells       :   NumPy int64 array of valid grid cell ids
+        known_cells :   NumPy int64 array of the known cell ids, sorted
+        cell_size   :   width of the grid cells, in metres
+        distance    :   number of cells
+    """
+
+    columns = grid_columns(cell_size)
+    offsets = np.arange(-distance, distance + 1)
+
+    row, column = np.divmod(cells, columns)
+
+    # (cells x neighbouring rows x neighbouring columns) cell ids; neighbours past the grid's edges are given -1
+    neighbour_rows = row[:, None, None] + offsets[None, :, None]
+    neighbour_columns = column[:, None, None] + offsets[None, None, :]
+
+    neighbours = np.where(
+                        (neighbour_columns >= 0) & (neighbour_columns < columns),
+                        neighbour_rows * columns + neighbour_columns,
+                        -1
+                        ).reshape(len(cells), len(offsets) ** 2)
+
+    found = np.searchsorted(known_cells, neighbours).clip(max=len(known_cells) - 1)
+
+    return ((neighbours >= 0) & (known_cells[found] == neighbours)).any(axis=1)
+
+
+def infer_beats(longitude, latitude, beat_grid, cell_size=250):
+    """
+    Summary: Infers the beat of each longitude/latitude pair. Pairs falling in a known grid cell get that cell's beat
+             (a sorted-array lookup); the remaining pairs within fallback_cells cells of a known cell get the beat with
+             the nearest centroid, the centroids being the count-weighted centres of each beat's cells. Pairs further
+             from every known cell get no beat.
+
+    Returns: NumPy object array of beats (nan where the coordinates are missing/invalid)
+
+    Params:
+        longitude   :   array-like of longitude values
+        latitude    :   array-like of latitude values
+        beat_grid   :   the beat grid, as built by build_beat_grid
+        cell_size   :   width of the grid cells, in metres; must match the beat grid's
+    """
+
+    cells = grid_cells(longitude, latitude, cell_size)
+    beats = np.full(cells.shape, nan, dtype='O')
+
+    if beat_grid.empty:
+        return beats
+
+    grid_cells_sorted = beat_grid['cell'].to_numpy(dtype='int64')
+    grid_beats = beat_grid['beat'].to_numpy(dtype='O')
+
+    # Grid lookup
+    found = np.searchsorted(grid_cells_sorted, cells).clip(max=len(grid_cells_sorted) - 1)
+    in_grid = (cells >= 0) & (grid_cells_sorted[found] == cells)
+
+    beats[in_grid] = grid_beats[found[in_grid]]
+
+    # Nearest centroid, for the valid coordinates in cells without history, but near cells with history
+    unresolved = (cells >= 0) & ~in_grid
+    unresolved[unresolved] = near_known_cells(cells[unresolved], grid_cells_sorted, cell_size)
+
+    if unresolved.any():
+        centre_lon, centre_lat = cell_centres(beat_grid['cell'], cell_size)
+
+        centroids = (
+                    DataFrame(
+                            {
+                            'beat':         grid_beats,
+                            'longitude':    centre_lon * beat_grid['offense_count'].to_numpy(),
+                            'latitude':     centre_lat * beat_grid['offense_count'].to_numpy(),
+                            'weight':       beat_grid['offense_count'].to_numpy()
+                            }
+                            )
+                    .groupby('beat')
+                    .sum()
+                    )
+
+        centroid_lon = (centroids['longitude'] / centroids['weight']).to_numpy()
+        centroid_lat = (centroids['latitude'] / centroids['weight']).to_numpy()
+
+        # (unresolved points x centroids) distance matrix; there are only ~50 beats
+        distance = haversine(
+                            np.asarray(longitude, dtype='float64')[unresolved][:, None],
+                            np.asarray(latitude, dtype='float64')[unresolved][:, None],
+                            centroid_lon[None, :],
+                            centroid_lat[None, :]
+                            )
+
+        beats[unresolved] = centroids.index.to_numpy(dtype='O')[distance.argmin(axis=1)]
+
+    return beats
+
+
+def infer_loc_codes(seattle_data, grid_path=None):
+    """
+    Summary: For records with a missing beat but valid coordinates, infers the beat (and, through it, the sector &
+             precinct) from the coordinates, against the beat grid (see load_beat_grid). An inferred beat is only kept
+             if it agrees with the record's sector & precinct, wherever those are present.
+
+    Returns: Pandas DataFrame of the inferred beat/sector/precinct, indexed like the records they were inferred for
+    """
+
+    loc_codes = read_csv(
+                        filepath_or_buffer=getenv('LOC_CODES'),
+                        dtype='O'
+                        )
+
+    beat_grid = load_beat_grid(grid_path)
+
+    candidates = seattle_data.loc[
+                                    seattle_data['beat'].isna()
+                                    & seattle_data['longitude'].between(-125.0, -116.5)
+                                    & seattle_data['latitude'].between(45.5, 49.0),
+
+                                    ['longitude', 'latitude', 'sector', 'precinct']
+                                ]
+
+    inferred = DataFrame(
+                        data    =   {'beat': infer_beats(candidates['longitude'], candidates['latitude'], beat_grid)},
+                        index   =   candidates.index
+                        )
+
+    inferred = inferred.join(loc_codes.set_index('beat'), on='beat')
+
+    agrees = (
+                (candidates['sector'].isna() | (candidates['sector'] == inferred['sector']))
+                &
+                (candidates['precinct'].isna() | (candidates['precinct'] == inferred['precinct']))
+                & inferred['beat'].notna()
+            )
+
+    return inferred[agrees][['beat', 'sector', 'precinct']]
+
+
+def coordinate_loc_codes(shared):
+    """
+    Summary: Infers the location codes of the batch's records missing their beat from their coordinates (see
+             infer_loc_codes), logging the number of beats, sectors & precincts filled in (the inferred codes of the
+             records missing them; the codes present agree with those inferred).
+
+    Returns: Pandas DataFrame of the inferred beat/sector/precinct, indexed like the records they were inferred for
+
+    Params:
+        shared  :   the batch's shared columns (see quality_rules.SharedColumns)
+    """
+
+    inferred_codes = infer_loc_codes(shared.seattle_data)
+
+    filled = shared.seattle_data.loc[inferred_codes.index, ['beat', 'sector', 'precinct']].isna().sum()
+
+    logger.info(
+                'Location codes filled in from coordinates: %d beats, %d sectors, %d precincts',
+                filled['beat'], filled['sector'], filled['precinct']
+                )
+
+    return inferred_codes
+
+
+# Missing location codes are filled in from the record's coordinates; the codes present agree with those inferred
+loc_code_inference_rules = [
+                            Rule(
+                                columns     =   [loc_code],
+                                predicate   =   agrees_with(loc_code, coordinate_loc_codes),
+                                action      =   'correct',
+                                reason      =   inferred_loc_code_reason,
+                                correction  =   inferred(coordinate_loc_codes)
+                                )
+                            for loc_code in ('beat', 'sector', 'precinct')
+                            ]
+
+
+def correct_loc_codes_from_coordinates(seattle_data):
+    """
+    Summary: Fills in missing beat (and, through it, sector & precinct) location codes from the record's coordinates
+             (see loc_code_inference_rules), for the records correct_na_loc_codes couldn't resolve from a lower-level
+             location code. Meant to run after correct_na_loc_codes, correct_deci_degrees & update_beat_grid, so the
+             codes & coordinates have been validated & the grid holds the batch's reported beats.
+
+    Returns: Pandas DataFrame
+    """
+
+    seattle_data, _ = run_rules(seattle_data, loc_code_inference_rules)
+
+    return seattle_data
+
+
+if __name__ == '__main__':
+    build_beat_grid()
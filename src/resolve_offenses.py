@@ -0,0 +1,134 @@
+import numpy as np
+from pandas import DataFrame, Index, MultiIndex, concat, factorize
+
+from .quality_rules import Rule, agrees_with, inferred, offense_descriptor_reason, run_rules
+
+
+# The offense descriptors determined by the offense code, as given by the NIBRS offense codes (OFFENSE_CODES)
+offense_descriptor_columns = ['offense', 'offense_parent_group', 'crime_against_category', 'group_a_b']
+
+
+def validated_offense_codes(shared):
+    """
+    Summary: Gets the NIBRS offense codes whose descriptors the dataset itself reports them with: the rows of
+             OFFENSE_CODES whose (offense_code, descriptors) tuple is found among the archived raw records' (see
+             raw_archive.archived_distinct) or the batch's. nibrs_offenses.csv is kept by hand, so a code whose
+             descriptors are spelled differently there than in SPD's data is left out rather than rewriting every
+             one of its records, as is a code missing from it (i.e. 26H).
+
+    Returns: Pandas DataFrame of the validated rows of OFFENSE_CODES
+
+    Params:
+        shared  :   the batch's shared columns (see quality_rules.SharedColumns)
+    """
+
+    from .raw_archive import archived_distinct
+
+    reference = shared.reference('OFFENSE_CODES')
+    tuple_columns = ['offense_code'] + offense_descriptor_columns
+
+    observed = concat(
+                    [
+                    archived_distinct(tuple_columns),
+                    shared.seattle_data[tuple_columns].astype('O').drop_duplicates()
+                    ],
+                    ignore_index=True
+                    )
+
+    # Archived records are raw, so they're compared as cleanup_whitespace & cleanup_column_casing would leave them
+    observed = observed.astype('O').apply(lambda values: values.str.strip().str.upper())
+
+    validated = MultiIndex.from_frame(reference[tuple_columns]).isin(MultiIndex.from_frame(observed))
+
+    return reference[validated].reset_index(drop=True)
+
+
+def offense_code_positions(offense_codes, reference):
+    """
+    Summary: Looks each record's offense code up in the offense reference table; each distinct code is looked up
+             once & the positions are mapped back onto the records by their factorized codes.
+
+    Returns: NumPy int64 array of each record's position within the reference table (-1 for missing/unknown codes)
+
+    Params:
+        offense_codes   :   Pandas Series of offense codes
+        reference       :   the NIBRS offense codes, as read from OFFENSE_CODES
+    """
+
+    codes, uniques = factorize(offense_codes)
+
+    unique_positions = Index(reference['offense_code']).get_indexer(np.asarray(uniques, dtype='O'))
+
+    # Missing codes are given a code of -1, which picks the appended -1
+    return np.append(unique_positions, -1)[codes]
+
+
+def offense_descriptors(shared):
+    """
+    Summary: Gets the offense descriptors of each record's offense code from the NIBRS offense codes validated
+             against the dataset (see validated_offense_codes; a code -> descriptor map, through array positions
+             rather than merges; see offense_code_positions). Records whose offense code is missing, unknown or not
+             validated are left out, so they keep their descriptors.
+
+             +--------------+-------------------+----------------------+
+             | offense_code |      offense      | offense_parent_group |       (batch)
+             +--------------+-------------------+----------------------+
+             |     13B      |  SIMPLE ASSAULT   |    LARCENY-THEFT     |
+             |     23H      |       NaN         |    LARCENY-THEFT     |
+             +--------------+-------------------+----------------------+
+                                                      |
+                                                      v
+             +--------------+-------------------+----------------------+
+             | offense_code |      offense      | offense_parent_group |       (inferred)
+             +--------------+-------------------+----------------------+
+             |     13B      |  SIMPLE ASSAULT   |   ASSAULT OFFENSES   |
+             |     23H      | ALL OTHER LARCENY |    LARCENY-THEFT     |
+             +--------------+-------------------+----------------------+
+
+    Returns: Pandas DataFrame of the offense_descriptor_columns, indexed like the records with a known offense code
+
+    Params:
+        shared  :   the batch's shared columns (see quality_rules.SharedColumns)
+    """
+
+    reference = shared.shared(('validated_offense_codes',), lambda: validated_offense_codes(shared))
+
+    positions = offense_code_positions(shared.seattle_data['offense_code'], reference)
+    known = positions >= 0
+
+    return DataFrame(
+                    data    =   {
+                                column: reference[column].to_numpy(dtype='O')[positions[known]]
+                                for column in offense_descriptor_columns
+                                },
+                    index   =   shared.seattle_data.index[known]
+                    )
+
+
+# Missing descriptors & those inconsistent with the record's offense code (i.e. an offense_parent_group not matching
+# the offense) are replaced by the offense code's descriptors
+offense_descriptor_rules = [
+                            Rule(
+                                columns     =   [column],
+                                predicate   =   agrees_with(column, offense_descriptors),
+                                action      =   'correct',
+                                reason      =   offense_descriptor_reason,
+                                correction  =   inferred(offense_descriptors)
+                                )
+                            for column in offense_descriptor_columns
+                            ]
+
+
+def resolve_offense_descriptors(seattle_data):
+    """
+    Summary: Fills in missing offense descriptors & replaces those inconsistent with the record's offense code with
+             the offense code's descriptors (see offense_descriptor_rules). Meant to run after apply_schema, so the
+             descriptors are written straight into their Categoricals' codes, & before clear_non_crimes, so a
+             non-crime is recognized by its code.
+
+    Returns: Pandas DataFrame
+    """
+
+    seattle_data, _ = run_rules(seattle_data, offense_descriptor_rules)
+
+    return seattle_data
@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta
+
+
+# Number of days of data kept, with respect to the report date/time. For the purpose and scope of this
+# project, I am focused on only timely (within a year) data.
+retention_days = 366
+
+
+def retention_date_limit():
+    """
+    Summary: Gets the date before which data is considered expired & is removed (from the database and any
+             local copies of the data).
+
+    Returns: the date limit as a yyyy-mm-dd string value
+    """
+
+    return datetime.strftime(datetime.today().date() - timedelta(days=retention_days), '%Y-%m-%d')
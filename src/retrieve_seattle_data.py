@@ -9,8 +9,23 @@ from requests import get
 from requests.exceptions import HTTPError, RequestException 
 from pandas import DataFrame, json_normalize, read_csv
 
+from .retention import retention_date_limit
+
 load_dotenv()
 
+def socrata_query(date, how):
+    """
+    Summary: Gets the SoQL query retrieving the crime data reported with respect to date (see socrata_api).
+    """
+
+    return f'''
+            SELECT * 
+            WHERE DATE_TRUNC_YMD(report_datetime) {how} '{date}'
+            ORDER BY report_datetime desc 
+            LIMIT 100000000
+            '''
+
+
 def socrata_api(date=None, how='>='):
         """
         Summary: Retrieves crime data from SPD website via the site's Socrata API. The preferred method of retrieving
@@ -43,12 +58,7 @@ def socrata_api(date=None, how='>='):
                                      ) 
 
         # SQL query used to extract the data, filtered by the date
-        query = f'''
-                SELECT * 
-                WHERE DATE_TRUNC_YMD(report_datetime) {how} '{date}'
-                ORDER BY report_datetime desc 
-                LIMIT 100000000
-                '''
+        query = socrata_query(date, how)
 
            
         # Connect with the Socrata API
@@ -113,7 +123,127 @@ def odata_endpoint(date=None, how='>='):
 
     return dataset
 
-        
+
+def socrata_changes(date=None, how='>'):
+    """
+    Summary: Retrieves the crime data changed (added or revised) with respect to a point in time via the Socrata
+             API, using the dataset's :updated_at system field, which SPD's revisions of historical records bump.
+             Only records within the retention window are retrieved. Used by the change data capture mode (see
+             change_capture.run_cdc_batch), which passes its watermark as the date.
+
+    Returns: Pandas DataFrame, with the records' :updated_at value as an extra column
+
+    Params:
+        date    :   the point in time, as a yyyy-mm-ddThh:mm:ss.fff value (any prefix of it, i.e. a date, also works)
+        how     :   allows you to specify how data sould be scraped with respect to date: >, <, >=, <=, or =
+    """
+
+    client = Socrata(
+                domain='data.seattle.gov',
+                app_token=getenv('APP_TOKEN'),
+                username=getenv('EMAIL_U'),
+                password=getenv('EMAIL_P')
+                )
+
+    response = client.get(
+                        dataset_identifier=getenv('DATASET_ID'),
+                        query=f'''
+                                SELECT *, :updated_at
+                                WHERE :updated_at {how} '{date}'
+                                    AND DATE_TRUNC_YMD(report_datetime) >= '{retention_date_limit()}'
+                                ORDER BY :updated_at
+                                LIMIT 100000000
+                                '''
+                        )
+
+    return DataFrame.from_records(response)
+
+
+async def socrata_api_async(session, date, how='>='):
+    """
+    Summary: Retrieves crime data via the Socrata API like socrata_api, but over an asynchronous (aiohttp) HTTP
+             session, so many dates can be retrieved at once within one event loop. Requests are authenticated by
+             the Application Token alone.
+
+    Returns: Pandas DataFrame
+
+    Params:
+        session :   an aiohttp.ClientSession
+        date    :   represents date from which to scrape data by; must be in yyyy-mm-dd format
+        how     :   allows you to specify how data sould be scraped with respect to date: >, <, >=, <=, or =
+    """
+
+    async with session.get(
+                        url     =   f"https://data.seattle.gov/resource/{getenv('DATASET_ID')}.json",
+                        params  =   {'$query': socrata_query(date, how)},
+                        headers =   {'X-App-Token': getenv('APP_TOKEN') or ''}
+                        ) as response:
+
+        response.raise_for_status()
+
+        return DataFrame.from_records(await response.json())
+
+
+# List of data retrieval functions, ordered in terms of retrieval preference
+data_retrieval_functions = [
+                            socrata_api,        # retrieve data via the Socrata API
+                            odata_endpoint      # retrieve data via the Odata endpoint
+                            ]
+
+
+def retrieve_data(date=None, how='>=', retrieval_functions=None):
+    """
+        Summary: Retrieves crime data using one of the data retrieval functions, in order of preference; if a function
+                 fails, the next function is used. Requests timing out (408 status code) are retried up to 5 times
+                 before moving on to the next function.
+
+        Returns: Pandas DataFrame, or None if every function failed
+
+        Params:
+            date                :   represents date from which to scrape data by; must be in yyyy-mm-dd format
+            how                 :   allows you to specify how data sould be scraped with respect to date: >, <, >=,
+                                    <=, or =
+            retrieval_functions :   the functions to use, in order of preference; defaults to data_retrieval_functions
+    """
+
+    dataset = None
+
+    for function in retrieval_functions or data_retrieval_functions:
+
+        # Retry the request (5 additional times) if the server times out waiting for request (408 status code)
+        for retry in range(5):
+            # Attempt to get data using function & if successful, break retry loop
+            try:
+                dataset = function(date=date, how=how)
+                break
+
+
+            # Otherwise, catch 408 HTTPError & continue 'retry' loop
+            # If not 408 HTTPError, break 'retry' loop & attempt next function
+            except HTTPError as error:
+                if error.response.status_code == 408:
+                    continue
+
+                break   # HAVE TO ADD METHOD OF LOGGING OTHER ERRORS
+
+
+            # Catch any other request exceptions and attempt next function
+            except RequestException as error:
+                break
+
+
+            except:
+                break
+
+        # If there's no data then try next function, otherwise we have data & can break loop
+        if dataset is None:
+            continue
+
+        break
+
+    return dataset
+
+
 if __name__ == '__main__':
     dataset = socrata_api()
     dataset.to_csv('seattle_data.csv', index=False)
@@ -0,0 +1,224 @@
+from os import getenv, replace
+from os.path import exists, join
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas import DataFrame, Timestamp, concat, read_parquet
+from dotenv import load_dotenv
+
+from .retention import retention_date_limit
+from .cache_seattle_data import load_cache
+
+load_dotenv()
+
+
+# Location dimensions of each rollup cube; every cube is further broken down by report date & the offense dimensions
+rollup_dimensions = {
+                    'precinct':     ['precinct'],
+                    'sector':       ['precinct', 'sector'],
+                    'beat':         ['precinct', 'sector', 'beat'],
+                    'mcpp':         ['precinct', 'mcpp']
+                    }
+
+offense_dimensions = ['offense_parent_group', 'crime_against_category']
+
+
+def rollup_path(rollup, rollup_dir=None):
+    """
+    Summary: Gets the path of a rollup cube's parquet file.
+
+    Params:
+        rollup      :   name of the rollup cube (a key of rollup_dimensions)
+        rollup_dir  :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+    """
+
+    if rollup_dir is None:
+        rollup_dir = getenv('ROLLUP_DIR')
+
+    return join(rollup_dir, f'{rollup}_rollup.parquet')
+
+
+def load_rollup(rollup, rollup_dir=None):
+    """
+    Summary: Loads a rollup cube: one row per report date & combination of location/offense dimensions, with the
+             number of offenses for that combination.
+
+    Returns: Pandas DataFrame
+
+    Params:
+        rollup      :   name of the rollup cube (a key of rollup_dimensions)
+        rollup_dir  :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+    """
+
+    path = rollup_path(rollup, rollup_dir)
+
+    if not exists(path):
+        return DataFrame(columns=['report_date'] + rollup_dimensions[rollup] + offense_dimensions + ['offense_count'])
+
+    return read_parquet(path)
+
+
+def save_rollup(rollup_data, rollup, rollup_dir=None):
+    """
+    Summary: Writes a rollup cube to its parquet file, replacing the file only once fully written.
+    """
+
+    path = rollup_path(rollup, rollup_dir)
+
+    rollup_data.to_parquet(
+                            path    =   path + '.tmp',
+                            index   =   False
+                            )
+
+    replace(path + '.tmp', path)
+
+
+def update_rollups(seattle_data, rollup_dir=None):
+    """
+    Summary: Updates every rollup cube with the batch's offense counts & drops any expired days from the cubes. As a
+             batch holds every record of the report dates it covers (data is retrieved by whole report dates),
+             the counts of those dates are replaced rather than added to, so re-pulled records aren't counted twice.
+             Records without a report date can't be placed on a day & aren't counted.
+
+    Returns: the seattle_data, unchanged
+
+    Params:
+        seattle_data    :   the cleaned batch, in the column order given by cleanup_column_order
+        rollup_dir      :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+    """
+
+    date_limit = Timestamp(retention_date_limit())
+
+    batch = seattle_data.assign(
+                                report_date=seattle_data['report_datetime'].dt.normalize()
+                                )
+
+    batch = batch[batch['report_date'] >= date_limit]
+
+    for rollup, location_dimensions in rollup_dimensions.items():
+
+        dimensions = ['report_date'] + location_dimensions + offense_dimensions
+
+        batch_rollup = (
+                        batch
+                        .groupby(
+                                by          =   dimensions,
+                                dropna      =   False,
+                                observed    =   True
+                                )
+                        .size()
+                        .rename('offense_count')
+                        .reset_index()
+                        )
+
+        rollup_data = load_rollup(rollup, rollup_dir)
+
+        # Keep the cube's rows for the days not covered by the batch that haven't expired
+        rollup_data = rollup_data[
+                                    ~rollup_data['report_date'].isin(batch_rollup['report_date'])
+                                    &
+                                    (rollup_data['report_date'] >= date_limit)
+                                ]
+
+        rollup_data = (
+                        concat([rollup_data, batch_rollup], ignore_index=True)
+                        .sort_values(dimensions, ignore_index=True)
+                        )
+
+        save_rollup(rollup_data, rollup, rollup_dir)
+
+    return seattle_data
+
+
+def update_rollups_from_cache(seattle_data, rollup_dir=None, cache_path=None):
+    """
+    Summary: Updates every rollup cube like update_rollups, but recounts the batch's report dates from the cache,
+             which holds every record of those dates, rather than from the batch itself. Batches may only hold some of
+             the records of their report dates (records already loaded are dropped right after retrieval, & change
+             data capture only retrieves revised records), so their own counts would undercount those dates. Meant
+             to run right after update_cache.
+
+    Returns: the seattle_data, unchanged
+
+    Params:
+        seattle_data    :   the cleaned batch, in the column order given by cleanup_column_order
+        rollup_dir      :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+        cache_path      :   path of the Arrow IPC file; defaults to the ARROW_CACHE env variable
+    """
+
+    report_dates = pa.array(seattle_data['report_datetime'].dt.normalize().dropna().unique(), type=pa.timestamp('ns'))
+
+    cache = load_cache(cache_path=cache_path)
+
+    # Only the cached records of the batch's report dates are converted into a frame
+    cache = cache.filter(
+                        pc.fill_null(
+                                    pc.is_in(pc.floor_temporal(cache['report_datetime'], unit='day'), value_set=report_dates),
+                                    False
+                                    )
+                        )
+
+    update_rollups(
+                    seattle_data    =   cache.to_pandas(),
+                    rollup_dir      =   rollup_dir
+                    )
+
+    return seattle_data
+
+
+def purge_rollups(rollup_dir=None):
+    """
+    Summary: Drops expired days from every rollup cube, the rollup counterpart to seattle_loading.remove_data.
+
+    Params:
+        rollup_dir  :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+    """
+
+    date_limit = Timestamp(retention_date_limit())
+
+    for rollup in rollup_dimensions:
+
+        rollup_data = load_rollup(rollup, rollup_dir)
+
+        save_rollup(
+                    rollup_data[rollup_data['report_date'] >= date_limit],
+                    rollup,
+                    rollup_dir
+                    )
+
+
+def query_rollup(rollup, by, start_date=None, end_date=None, rollup_dir=None):
+    """
+    Summary: Answers a count query from a rollup cube, aggregating its rows to the requested dimensions, i.e. offense
+             counts per precinct & crime_against_category for the past month:
+
+                query_rollup('precinct', by=['precinct', 'crime_against_category'], start_date='2023-03-08')
+
+    Returns: Pandas DataFrame
+
+    Params:
+        rollup      :   name of the rollup cube (a key of rollup_dimensions)
+        by          :   the dimensions to count by; any of the cube's dimensions, including report_date
+        start_date  :   earliest report date to count (inclusive); yyyy-mm-dd format
+        end_date    :   latest report date to count (inclusive); yyyy-mm-dd format
+        rollup_dir  :   directory holding the rollup cubes; defaults to the ROLLUP_DIR env variable
+    """
+
+    rollup_data = load_rollup(rollup, rollup_dir)
+
+    if start_date is not None:
+        rollup_data = rollup_data[rollup_data['report_date'] >= Timestamp(start_date)]
+
+    if end_date is not None:
+        rollup_data = rollup_data[rollup_data['report_date'] <= Timestamp(end_date)]
+
+    return (
+            rollup_data
+            .groupby(
+                    by      =   by,
+                    dropna  =   False
+                    )
+            ['offense_count']
+            .sum()
+            .reset_index()
+            )
@@ -0,0 +1,218 @@
+import threading
+from queue import Queue
+from time import perf_counter
+
+from .checkpoint import clean_stage, fetch_stage, load_stage
+
+
+# Marks the end of a stage's input, passed through each queue once per worker reading from it
+end_of_batches = None
+
+
+class StageStats:
+    """
+    Summary: Collects a pipelined stage's counters across its workers: the time spent working on batches (busy),
+             waiting for a batch from the previous stage (starved) & waiting for room in the next stage's queue
+             (blocked).
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.starved_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, counter, seconds):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + seconds)
+
+    def report(self, wall_seconds):
+        """
+        Summary: Gets the stage's row of the utilization report, its utilization being the share of its workers'
+                 time (wall time x workers) spent working on batches.
+        """
+
+        capacity = wall_seconds * self.workers or 1
+
+        return {
+                'stage':            self.name,
+                'workers':          self.workers,
+                'batches':          self.batches,
+                'busy_seconds':     round(self.busy_seconds, 3),
+                'starved_seconds':  round(self.starved_seconds, 3),
+                'blocked_seconds':  round(self.blocked_seconds, 3),
+                'utilization':      round(self.busy_seconds / capacity, 3)
+                }
+
+
+def run_pipelined(dates, how='=', fetch_workers=2, clean_workers=1, load_workers=1, queue_size=2, checkpoint_dir=None,
+                  stages=None, stage_cache_dir=None):
+    """
+    Summary: Retrieves, cleans & loads a batch per date, overlapping the stages across batches: while one day is
+             being loaded the next is being cleaned & the one after fetched. Each stage runs on its own worker
+             threads, handing batches to the next stage through a bounded queue (so a fast stage never runs more than
+             queue_size batches ahead of a slow one). Once the pipeline fills, the wall time approaches the slowest
+             stage's total rather than the sum of every stage's.
+
+             Batches are checkpointed as by checkpoint.run_checkpointed_batch, so only batch ids go through the
+             queues & a failed run is resumed by running it again. The first failure stops the scheduler from
+             starting new batches; those already fetched or cleaned keep their checkpoints.
+
+             Cleaning runs in threads, so clean_workers > 1 mostly helps when the cleaning waits on I/O; the cleaning
+             functions updating shared local files (pipeline.local_output_functions) run one batch at a time. Each
+             load worker holds its own database connection.
+
+    +-------+---------+---------+--------------+-----------------+-----------------+-------------+
+    | stage | workers | batches | busy_seconds | starved_seconds | blocked_seconds | utilization |
+    +-------+---------+---------+--------------+-----------------+-----------------+-------------+
+    | fetch |    2    |    7    |    12.704    |      0.000      |      9.112      |    0.550    |
+    +-------+---------+---------+--------------+-----------------+-----------------+-------------+
+
+    Returns: dictionary of the wall time, the utilization report (list of rows, as above, in stage order), the ids of
+             the loaded batches, the dates no data could be retrieved for & the failures (list of (date or batch id,
+             stage, exception))
+
+    Params:
+        dates           :   report dates to retrieve, yyyy-mm-dd
+        how             :   how each batch is retrieved with respect to its date (see retrieve_data)
+        fetch_workers   :   number of concurrent retrievals
+        clean_workers   :   number of batches cleaned at once
+        load_workers    :   number of concurrent database inserts
+        queue_size      :   number of batches each queue holds before the stage feeding it waits
+        checkpoint_dir  :   directory holding the checkpoints; defaults to the CHECKPOINT_DIR env variable
+        stages          :   dictionary of stage name -> function overriding the fetch, clean or load stage (i.e. to
+                            time the scheduler with stand-in stages); each takes & returns a date or batch id, as
+                            checkpoint.fetch_stage, clean_stage & load_stage do
+        stage_cache_dir :   directory of the stage cache the cleaning uses, if any (see pipeline.clean_batch)
+    """
+
+    output_lock = threading.Lock()
+
+    stage_functions = {
+                    'fetch':    lambda date: fetch_stage(date, how, checkpoint_dir),
+                    'clean':    lambda batch: clean_stage(batch, checkpoint_dir, output_lock, stage_cache_dir),
+                    'load':     lambda batch: load_stage(batch, checkpoint_dir)
+                    }
+
+    stage_functions.update(stages or {})
+
+    worker_counts = {'fetch': fetch_workers, 'clean': clean_workers, 'load': load_workers}
+    stats = {name: StageStats(name, workers) for name, workers in worker_counts.items()}
+
+    # Queue feeding each stage; the dates are all known upfront, so only the later queues are bounded
+    queues = {
+            'fetch':    Queue(),
+            'clean':    Queue(maxsize=queue_size),
+            'load':     Queue(maxsize=queue_size)
+            }
+
+    next_stage = {'fetch': 'clean', 'clean': 'load', 'load': None}
+
+    for date in dates:
+        queues['fetch'].put(date)
+
+    for _ in range(fetch_workers):
+        queues['fetch'].put(end_of_batches)
+
+    loaded, empty_dates, failures = [], [], []
+    stopping = threading.Event()
+    results_lock = threading.Lock()
+    remaining_workers = dict(worker_counts)
+
+    def work(name):
+        stage_stats = stats[name]
+        next_queue = queues[next_stage[name]] if next_stage[name] else None
+
+        while True:
+            started = perf_counter()
+            item = queues[name].get()
+            stage_stats.add('starved_seconds', perf_counter() - started)
+
+            if item is end_of_batches:
+                break
+
+            # After a failure the remaining batches are drained, not run; their checkpoints are left for a resume
+            if stopping.is_set():
+                continue
+
+            started = perf_counter()
+
+            try:
+                result = stage_functions[name](item)
+
+            # insert_data exits on failure, which would otherwise only end this thread
+            except BaseException as exception:
+                with results_lock:
+                    failures.append((item, name, exception))
+
+                stopping.set()
+                continue
+
+            finally:
+                stage_stats.add('busy_seconds', perf_counter() - started)
+
+            stage_stats.add('batches', 1)
+
+            if result is None:
+                with results_lock:
+                    empty_dates.append(item)
+
+            elif next_queue is None:
+                with results_lock:
+                    loaded.append(result)
+
+            else:
+                started = perf_counter()
+                next_queue.put(result)
+                stage_stats.add('blocked_seconds', perf_counter() - started)
+
+        # The stage's last worker to finish ends the next stage's input
+        with results_lock:
+            remaining_workers[name] -= 1
+            last_worker = remaining_workers[name] == 0
+
+        if last_worker and next_queue is not None:
+            for _ in range(worker_counts[next_stage[name]]):
+                next_queue.put(end_of_batches)
+
+    started = perf_counter()
+
+    workers = [
+                threading.Thread(target=work, args=(name,), name=f'{name}-{worker}', daemon=True)
+                for name, workers in worker_counts.items()
+                for worker in range(workers)
+                ]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    wall_seconds = perf_counter() - started
+
+    return {
+            'wall_seconds':     wall_seconds,
+            'utilization':      [stats[name].report(wall_seconds) for name in worker_counts],
+            'loaded':           loaded,
+            'empty_dates':      empty_dates,
+            'failures':         failures
+            }
+
+
+def format_utilization(utilization):
+    """
+    Summary: Formats the utilization report of run_pipelined as a text table.
+    """
+
+    columns = list(utilization[0])
+    rows = [[str(row[column]) for column in columns] for row in utilization]
+    widths = [max(len(value) for value in [column] + [row[index] for row in rows]) for index, column in enumerate(columns)]
+
+    return '\n'.join(
+                    '  '.join(value.rjust(width) for value, width in zip(row, widths))
+                    for row in [columns] + rows
+                    )
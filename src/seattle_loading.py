@@ -1,18 +1,11 @@
-import pyodbc
 import sys
 import os
 
 from dotenv import load_dotenv
-from datetime import timedelta
-from datetime import datetime
+from .retention import retention_date_limit
 
 load_dotenv()
 
-# Database connection credentials
-db_username = os.getenv('DB_U')
-db_password = os.getenv('DB_P')
-database = os.getenv('DB_NAME')
-
 # SQL insert statement for the clean data
 insert_into_tblCrime = '''
     INSERT INTO [SeattleCrimeDataDB].[dbo].[tblCrime] 
@@ -33,7 +26,7 @@ insert_into_tblCrime = '''
         [mcpp],
         [longitude],
         [latitude],
-        [_100_block_address]
+        [address_id]
     )
 
     VALUES 
@@ -42,6 +35,48 @@ insert_into_tblCrime = '''
     )
 '''
 
+# SQL merge statement for the address dimension; addresses already in the table are skipped. The table allocates the
+# address_id (an identity column), so the ids never depend on the local address dimension file. HOLDLOCK keeps the
+# key range locked between the match & the insert, so concurrent loads (i.e. several load workers) inserting the same
+# new address can't both insert it; the table's unique constraint on the address backs this up
+insert_into_tblAddress = '''
+    MERGE [SeattleCrimeDataDB].[dbo].[tblAddress] WITH (HOLDLOCK) AS [target]
+
+    USING (
+            VALUES
+            (
+            ?, ?, ?
+            )
+            ) AS [source] ([_100_block_address], [block_number], [street])
+
+    ON [target].[_100_block_address] = [source].[_100_block_address]
+
+    WHEN NOT MATCHED THEN
+        INSERT
+        (
+            [_100_block_address],
+            [block_number],
+            [street]
+        )
+
+        VALUES
+        (
+            [source].[_100_block_address],
+            [source].[block_number],
+            [source].[street]
+        );
+'''
+
+# SQL select statement for the database's address_id of a chunk of addresses (see database_address_ids)
+select_from_tblAddress = '''
+    SELECT [_100_block_address], [address_id]
+    FROM [SeattleCrimeDataDB].[dbo].[tblAddress]
+    WHERE [_100_block_address] IN ({})
+'''
+
+# Number of addresses looked up per select; SQL Server takes at most 2100 parameters per statement
+address_select_chunk_size = 2000
+
 # SQL insert statement for the audit data
 insert_into_tblAudit = '''
     INSERT INTO [SeattleCrimeDataDB].[dbo].[tblAudit]
@@ -58,6 +93,33 @@ insert_into_tblAudit = '''
     )
 '''
 
+# SQL delete statements for the existing versions of revised records (see insert_data's replaced_offense_ids)
+delete_from_tblAudit = '''
+    DELETE FROM [SeattleCrimeDataDB].[dbo].[tblAudit]
+    WHERE [offense_id] = ?
+'''
+
+delete_from_tblCrime = '''
+    DELETE FROM [SeattleCrimeDataDB].[dbo].[tblCrime]
+    WHERE [offense_id] = ?
+'''
+
+
+# SQL delete statements for the records of a reprocessed report date (see replace_data)
+delete_day_from_tblAudit = '''
+    DELETE FROM [SeattleCrimeDataDB].[dbo].[tblAudit]
+    WHERE [offense_id] IN (
+                            SELECT [offense_id]
+                            FROM [SeattleCrimeDataDB].[dbo].[tblCrime]
+                            WHERE CAST([report_datetime] AS DATE) = ?
+                            )
+'''
+
+delete_day_from_tblCrime = '''
+    DELETE FROM [SeattleCrimeDataDB].[dbo].[tblCrime]
+    WHERE CAST([report_datetime] AS DATE) = ?
+'''
+
 
 def convert_into_record_sets(clean_data, audit_data):
     """
@@ -75,6 +137,74 @@ def convert_into_record_sets(clean_data, audit_data):
     return clean_data, audit_data
 
 
+def convert_address_dimension_into_record_set(address_data):
+    """
+    Summary: Transforms the address dimension rows into a record set, each record holding the address_id (the local
+            address dimension's id, which the clean data references), the address & its parsed components
+
+    Returns: returns the address data in record set format
+    """
+
+    address_data = address_data.astype(dtype='O')
+    address_data = address_data.where(address_data.notnull(), None)
+
+    return address_data.values.tolist()
+
+
+def database_address_ids(cursor_object, addresses):
+    """
+    Summary: Looks the database's address_id of each address up in tblAddress, a chunk of addresses at a time
+
+    Returns: dictionary of address -> address_id
+    """
+
+    address_ids = {}
+
+    for start in range(0, len(addresses), address_select_chunk_size):
+        chunk = addresses[start:start + address_select_chunk_size]
+
+        cursor_object.execute(select_from_tblAddress.format(', '.join('?' * len(chunk))), chunk)
+
+        address_ids.update((address, address_id) for address, address_id in cursor_object.fetchall())
+
+    return address_ids
+
+
+def insert_addresses(cursor_object, clean_data, address_data):
+    """
+    Summary: Inserts the batch's addresses missing from tblAddress, matching them on the address itself, then points
+            the clean data's address_id at the database's id of each address. The local address dimension's ids are
+            therefore only ever used to tie a batch's records to its addresses, so a lost or regenerated dimension
+            file can never point records at the wrong address. Raises a ValueError (failing the insert) if an
+            address can't be found once inserted, i.e. when the select's collation doesn't match it.
+
+    Returns: returns the clean data, with the database's address_id
+    """
+
+    cursor_object.executemany(
+                            insert_into_tblAddress,
+                            [record[1:] for record in address_data]
+                            )
+
+    address_ids = database_address_ids(cursor_object, [record[1] for record in address_data])
+
+    # Local address_id -> the database's address_id; address_id is the last column of the clean data
+    local_address_ids = {record[0]: address_ids.get(record[1]) for record in address_data}
+
+    missing_addresses = [record[1] for record in address_data if local_address_ids[record[0]] is None]
+
+    if missing_addresses:
+        raise ValueError(
+                        f'{len(missing_addresses)} address(es) not found in tblAddress after their insert, i.e. '
+                        f'{missing_addresses[0]!r}; the batch would reference no address'
+                        )
+
+    return [
+            record[:-1] + [local_address_ids.get(record[-1])]
+            for record in clean_data
+            ]
+
+
 def establish_connection():
     """
     Summary: Attempt to connect to SQL Server database and if successful, return cursor
@@ -83,6 +213,14 @@ def establish_connection():
     Returns: returns cursor object used to connect to database and execute queries
     """
 
+    # Imported here, as the ODBC driver manager it needs is only required once actually connecting
+    import pyodbc
+
+    # Database connection credentials
+    db_username = os.getenv('DB_U')
+    db_password = os.getenv('DB_P')
+    database = os.getenv('DB_NAME')
+
     try:
         conn = pyodbc.connect(f'''DSN={database};UID={db_username};PWD={db_password}''')
 
@@ -102,7 +240,7 @@ def remove_data(cursor_object):
     """
 
     # Get the date from 366 days ago
-    date_limit = datetime.strftime(datetime.today().date() - timedelta(days=366), '%Y-%m-%d')
+    date_limit = retention_date_limit()
 
     delete_statement_tblcrime = f'''
                                     DELETE FROM [SeattleCrimeDataDB].[dbo].[tblAudit]
@@ -129,14 +267,27 @@ def remove_data(cursor_object):
         cursor_object.commit()
 
 
-def insert_data(cursor_object, clean_data, audit_data):
+def insert_data(cursor_object, clean_data, audit_data, address_data=None, replaced_offense_ids=None):
     """
     Summary: Attempt to insert the data into the SQL Server database and, if successful, commit
             the transaction. Otherwise, if unsuccessful, rollback the transaction and close the
-            connection.
+            connection. The addresses referenced by the clean data are inserted first (see
+            insert_addresses). Any existing records (and their audited values) of the replaced_offense_ids
+            are deleted within the same transaction, so revised records are upserted rather than duplicated.
     """
 
     try:
+        # Delete the existing versions of the replaced records, if any
+        if replaced_offense_ids:
+            replaced_offense_ids = [[offense_id] for offense_id in replaced_offense_ids]
+
+            cursor_object.executemany(delete_from_tblAudit, replaced_offense_ids)
+            cursor_object.executemany(delete_from_tblCrime, replaced_offense_ids)
+
+        # Insert the batch's addresses as long as there are any, otherwise pass
+        if address_data:
+            clean_data = insert_addresses(cursor_object, clean_data, address_data)
+
         # Insert the clean data as long as it's not empty, otherwise pass
         if clean_data:
             cursor_object.executemany(insert_into_tblCrime, clean_data)
@@ -156,3 +307,26 @@ def insert_data(cursor_object, clean_data, audit_data):
     else:
         cursor_object.commit()
         cursor_object.close()
+
+
+def replace_data(cursor_object, clean_data, audit_data, address_data=None, report_dates=None, replaced_offense_ids=None):
+    """
+    Summary: Attempt to replace the data of reprocessed report dates: every record (and audited value) reported on
+            the report_dates, along with the records of the replaced_offense_ids, is deleted & the reprocessed data
+            inserted (see insert_data), all within one transaction. Records the reprocessing no longer keeps (i.e.
+            dropped by a new rule) are therefore removed as well.
+    """
+
+    try:
+        if report_dates:
+            report_dates = [[report_date] for report_date in report_dates]
+
+            cursor_object.executemany(delete_day_from_tblAudit, report_dates)
+            cursor_object.executemany(delete_day_from_tblCrime, report_dates)
+
+    except Exception as e:
+        print(e)
+        cursor_object.close()
+        sys.exit()
+
+    insert_data(cursor_object, clean_data, audit_data, address_data, replaced_offense_ids)
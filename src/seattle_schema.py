@@ -0,0 +1,107 @@
+from os import getenv
+
+import numpy as np
+from pandas import Categorical, Index, Series, factorize, read_csv
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Low-cardinality columns held as pandas Categoricals, along with where their (valid) categories come from
+categorical_columns = {
+                        'group_a_b':                ('OFFENSE_CODES', 'group_a_b'),
+                        'crime_against_category':   ('OFFENSE_CODES', 'crime_against_category'),
+                        'offense_parent_group':     ('OFFENSE_CODES', 'offense_parent_group'),
+                        'offense':                  ('OFFENSE_CODES', 'offense'),
+                        'offense_code':             ('OFFENSE_CODES', 'offense_code'),
+                        'precinct':                 ('LOC_CODES', 'precinct'),
+                        'sector':                   ('LOC_CODES', 'sector'),
+                        'beat':                     ('LOC_CODES', 'beat'),
+                        'mcpp':                     ('MCPP', 'mcpp')
+                        }
+
+
+def category_sets():
+    """
+    Summary: Gets the fixed set of valid categories for each categorical column, taken from the reference files:
+             location_codes.csv (LOC_CODES), mcpp.csv (MCPP) & the NIBRS offense codes in nibrs_offenses.csv
+             (OFFENSE_CODES).
+
+    Returns: dictionary of column name -> sorted list of categories
+    """
+
+    reference_data = {}
+    categories = {}
+
+    for column, (env_variable, reference_column) in categorical_columns.items():
+
+        if env_variable not in reference_data:
+            reference_data[env_variable] = read_csv(
+                                                    filepath_or_buffer=getenv(env_variable),
+                                                    dtype='O'
+                                                    )
+
+        categories[column] = sorted(reference_data[env_variable][reference_column].dropna().unique())
+
+    return categories
+
+
+def map_unique(column, function):
+    """
+    Summary: Applies a (vectorized) string function to a column's distinct values only, rather than to every row,
+             and maps the results back onto the rows. Low-cardinality columns repeat the same few values across the
+             whole batch, so this does a fraction of the work:
+                ['a', 'b', 'a', 'a'] -> distinct ['a', 'b'] -> ['A', 'B'] -> ['A', 'B', 'A', 'A']
+
+    Returns: Pandas Series
+
+    Params:
+        column      :   Pandas Series
+        function    :   function taking & returning a Pandas Series of strings, i.e. lambda values: values.str.upper()
+    """
+
+    codes, uniques = factorize(column)
+
+    mapped = function(Series(uniques, dtype='O')).to_numpy(dtype='O')
+
+    # Missing values are given a code of -1; those rows keep their original (missing) value
+    return Series(
+                    data    =   np.where(codes < 0, column.to_numpy(dtype='O'), mapped[codes]),
+                    index   =   column.index,
+                    name    =   column.name,
+                    dtype   =   'O'
+                    )
+
+
+def apply_schema(seattle_data):
+    """
+    Summary: Converts the low-cardinality location & offense columns into pandas Categoricals, using the fixed,
+             valid category sets (see category_sets). Values are then stored once per category plus a small
+             integer code per row, cutting the batch's memory & turning comparisons and .isin() checks into
+             integer comparisons on the codes.
+
+             Values outside of a column's valid set (i.e. a not-yet-corrected, misspelled mcpp) are kept as extra
+             categories rather than lost, so the validity checks of the later cleaning stages still see them;
+             running apply_schema again once they've been corrected/nulled drops those extra categories.
+
+    Returns: Pandas DataFrame
+    """
+
+    for column, categories in category_sets().items():
+
+        if column not in seattle_data:
+            continue
+
+        values = seattle_data[column].astype('O')
+
+        extra_categories = (
+                            Index(values.dropna().unique(), dtype='O')
+                            .difference(categories)
+                            )
+
+        seattle_data[column] = Categorical(
+                                            values      =   values,
+                                            categories  =   list(categories) + sorted(extra_categories)
+                                            )
+
+    return seattle_data
@@ -0,0 +1,310 @@
+from os import getenv, replace
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .cache_seattle_data import load_cache
+
+load_dotenv()
+
+
+# The grid spans Washington's longitude/latitude range, the same range correct_deci_degrees validates against
+min_longitude, max_longitude = -125.0, -116.5
+min_latitude, max_latitude = 45.5, 49.0
+
+# Metres per degree of latitude, and of longitude at Seattle's latitude (the grid is an equirectangular
+# projection around Seattle, which is accurate to well under a percent within the city)
+metres_per_lat_degree = 111_132.0
+metres_per_lon_degree = 111_320.0 * np.cos(np.radians(47.6))
+
+earth_radius = 6_371_008.8
+
+
+def project(longitude, latitude):
+    """
+    Summary: Projects longitude/latitude values onto the grid's plane, in metres from its south-west corner.
+
+    Returns: tuple of NumPy arrays -> (x, y)
+    """
+
+    x = (np.asarray(longitude, dtype='float64') - min_longitude) * metres_per_lon_degree
+    y = (np.asarray(latitude, dtype='float64') - min_latitude) * metres_per_lat_degree
+
+    return x, y
+
+
+def grid_cells(longitude, latitude, cell_size=250):
+    """
+    Summary: Assigns each longitude/latitude pair the id of the square grid cell (cell_size metres wide) it falls in.
+             Pairs that are missing, or outside of Washington's range, are given a cell id of -1.
+
+    Returns: NumPy int64 array
+
+    Params:
+        longitude   :   array-like of longitude values
+        latitude    :   array-like of latitude values
+        cell_size   :   width of the grid cells, in metres
+    """
+
+    x, y = project(longitude, latitude)
+
+    columns = grid_columns(cell_size)
+    rows = int(np.ceil((max_latitude - min_latitude) * metres_per_lat_degree / cell_size))
+
+    with np.errstate(invalid='ignore'):
+        column = np.floor(x / cell_size)
+        row = np.floor(y / cell_size)
+
+        valid = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+
+    cells = np.full(x.shape, -1, dtype='int64')
+    cells[valid] = row[valid].astype('int64') * columns + column[valid].astype('int64')
+
+    return cells
+
+
+def grid_columns(cell_size):
+    """
+    Summary: Gets the number of grid cells spanning the grid's longitude range.
+    """
+
+    return int(np.ceil((max_longitude - min_longitude) * metres_per_lon_degree / cell_size))
+
+
+def cell_centres(cells, cell_size=250):
+    """
+    Summary: Gets the longitude/latitude of the centre of each grid cell.
+
+    Returns: tuple of NumPy arrays -> (longitude, latitude)
+    """
+
+    row, column = np.divmod(np.asarray(cells, dtype='int64'), grid_columns(cell_size))
+
+    longitude = min_longitude + (column + 0.5) * cell_size / metres_per_lon_degree
+    latitude = min_latitude + (row + 0.5) * cell_size / metres_per_lat_degree
+
+    return longitude, latitude
+
+
+def haversine(longitude_1, latitude_1, longitude_2, latitude_2):
+    """
+    Summary: Great-circle distance between longitude/latitude points, in metres.
+
+    Returns: NumPy float64 array
+    """
+
+    longitude_1, latitude_1, longitude_2, latitude_2 = map(
+                                                            np.radians,
+                                                            (longitude_1, latitude_1, longitude_2, latitude_2)
+                                                            )
+
+    a = (
+        np.sin((latitude_2 - latitude_1) / 2) ** 2
+        + np.cos(latitude_1) * np.cos(latitude_2) * np.sin((longitude_2 - longitude_1) / 2) ** 2
+        )
+
+    return 2 * earth_radius * np.arcsin(np.sqrt(a))
+
+
+class SpatialIndex():
+    """
+    Summary: Grid index over the longitude/latitude of a set of records (i.e. the cached rolling year). The record
+             positions are sorted by grid cell, so each cell maps to one contiguous range of positions; bounding-box
+             & radius queries only look at the records in the cells they overlap, instead of scanning every record.
+             Queries return positions of the indexed records (i.e. rows of the table given to from_coordinates).
+    """
+
+    def __init__(self, longitude, latitude, order, cells, starts, cell_size=250):
+        self.longitude = longitude
+        self.latitude = latitude
+        self.order = order              # record positions, sorted by grid cell
+        self.cells = cells              # the distinct grid cells, sorted
+        self.starts = starts            # start of each cell's range within order; has one extra, closing entry
+        self.cell_size = cell_size
+
+
+    @classmethod
+    def from_coordinates(cls, longitude, latitude, cell_size=250):
+        """
+        Summary: Builds the index over the given longitude/latitude values; records without valid coordinates
+                 aren't indexed.
+        """
+
+        longitude = np.asarray(longitude, dtype='float64')
+        latitude = np.asarray(latitude, dtype='float64')
+
+        record_cells = grid_cells(longitude, latitude, cell_size)
+
+        order = np.argsort(record_cells, kind='stable')
+        order = order[record_cells[order] >= 0]
+
+        cells, starts = np.unique(record_cells[order], return_index=True)
+        starts = np.append(starts, len(order))
+
+        return cls(longitude, latitude, order, cells, starts, cell_size)
+
+
+    @classmethod
+    def load(cls, index_path=None):
+        """
+        Summary: Loads an index saved by .save(); defaults to the SPATIAL_INDEX env variable.
+        """
+
+        if index_path is None:
+            index_path = getenv('SPATIAL_INDEX')
+
+        with np.load(index_path) as saved:
+            return cls(
+                        longitude   =   saved['longitude'],
+                        latitude    =   saved['latitude'],
+                        order       =   saved['order'],
+                        cells       =   saved['cells'],
+                        starts      =   saved['starts'],
+                        cell_size   =   int(saved['cell_size'])
+                        )
+
+
+    def save(self, index_path=None):
+        """
+        Summary: Saves the index as a NumPy .npz file; defaults to the SPATIAL_INDEX env variable.
+        """
+
+        if index_path is None:
+            index_path = getenv('SPATIAL_INDEX')
+
+        # np.savez appends .npz to paths lacking it, so write through a file object instead
+        with open(index_path + '.tmp', 'wb') as file:
+            np.savez(
+                    file,
+                    longitude   =   self.longitude,
+                    latitude    =   self.latitude,
+                    order       =   self.order,
+                    cells       =   self.cells,
+                    starts      =   self.starts,
+                    cell_size   =   self.cell_size
+                    )
+
+        replace(index_path + '.tmp', index_path)
+
+
+    def cell_records(self, cells):
+        """
+        Summary: Gets the positions of the records falling in any of the given grid cells.
+
+        Returns: NumPy int64 array
+        """
+
+        cells = np.unique(np.asarray(cells, dtype='int64'))
+
+        # Locate the (indexed) cells & their ranges of record positions
+        found = np.searchsorted(self.cells, cells)
+
+        matched = found < len(self.cells)
+        matched[matched] = self.cells[found[matched]] == cells[matched]
+
+        found = found[matched]
+
+        starts = self.starts[found]
+        lengths = self.starts[found + 1] - starts
+
+        # Expand the ranges into the positions they cover, i.e. (start=4, length=3) -> 4, 5, 6
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        return self.order[np.repeat(starts, lengths) + offsets]
+
+
+    def bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Summary: Gets the positions of the records within a bounding box.
+
+        Returns: NumPy int64 array
+        """
+
+        columns = grid_columns(self.cell_size)
+
+        (x_min, x_max), (y_min, y_max) = project([min_lon, max_lon], [min_lat, max_lat])
+
+        column_range = np.arange(
+                                max(int(x_min // self.cell_size), 0),
+                                min(int(x_max // self.cell_size), columns - 1) + 1
+                                )
+
+        row_range = np.arange(
+                            max(int(y_min // self.cell_size), 0),
+                            int(y_max // self.cell_size) + 1
+                            )
+
+        cells = (row_range[:, None] * columns + column_range[None, :]).ravel()
+
+        records = self.cell_records(cells)
+
+        # The edge cells only partially overlap the box, so check the candidates' actual coordinates
+        longitude = self.longitude[records]
+        latitude = self.latitude[records]
+
+        return records[
+                        (longitude >= min_lon) & (longitude <= max_lon)
+                        & (latitude >= min_lat) & (latitude <= max_lat)
+                        ]
+
+
+    def radius(self, longitude, latitude, metres):
+        """
+        Summary: Gets the positions of the records within the given distance (in metres) of a point, i.e. the crimes
+                 within 500 m of a given address.
+
+        Returns: NumPy int64 array
+        """
+
+        # Box around the circle (with a 1% margin), narrowed down to the circle by the exact distance below
+        lat_offset = np.degrees(1.01 * metres / earth_radius)
+        lon_offset = lat_offset / np.cos(np.radians(latitude))
+
+        records = self.bbox(
+                            longitude - lon_offset,
+                            latitude - lat_offset,
+                            longitude + lon_offset,
+                            latitude + lat_offset
+                            )
+
+        distance = haversine(longitude, latitude, self.longitude[records], self.latitude[records])
+
+        return records[distance <= metres]
+
+
+    def cell_counts(self):
+        """
+        Summary: Counts the records per grid cell, i.e. to find crime hot-spots, without touching the records.
+
+        Returns: tuple of NumPy arrays -> (cells, counts)
+        """
+
+        return self.cells, np.diff(self.starts)
+
+
+def update_spatial_index(seattle_data, cache_path=None, index_path=None, cell_size=250):
+    """
+    Summary: Rebuilds the spatial index over the cached rolling year, so it stays aligned with the cache's rows.
+             Meant to run right after cache_seattle_data.update_cache; queries then return positions that can be
+             taken from load_cache(), i.e. load_cache().take(index.radius(-122.335, 47.608, 500)).
+
+    Returns: the seattle_data, unchanged
+
+    Params:
+        seattle_data    :   the cleaned batch
+        cache_path      :   path of the Arrow IPC file; defaults to the ARROW_CACHE env variable
+        index_path      :   path of the saved index; defaults to the SPATIAL_INDEX env variable
+        cell_size       :   width of the grid cells, in metres
+    """
+
+    cache = load_cache(cache_path=cache_path)
+
+    index = SpatialIndex.from_coordinates(
+                                        longitude   =   cache['longitude'].to_numpy(zero_copy_only=False),
+                                        latitude    =   cache['latitude'].to_numpy(zero_copy_only=False),
+                                        cell_size   =   cell_size
+                                        )
+
+    index.save(index_path=index_path)
+
+    return seattle_data
@@ -0,0 +1,278 @@
+import hashlib
+import inspect
+from functools import lru_cache
+from os import getenv, listdir, makedirs, remove, replace, stat, utime
+from os.path import exists, join
+
+import pyarrow as pa
+from pyarrow import ipc
+from pandas.util import hash_pandas_object
+from dotenv import load_dotenv
+
+from .quality_rules import Rule
+
+load_dotenv()
+
+
+# The reference files the cleaning stages read, as env variables; a change to any of them invalidates every cached
+# stage output
+reference_files = ['MCPP', 'LOC_CODES', 'OFFENSE_CODES']
+
+# Size the stage cache is kept under; the least recently used outputs are evicted first
+stage_cache_max_bytes = 2 * 1024 ** 3
+
+# Schema metadata key holding the fingerprint of a cached output
+fingerprint_key = b'fingerprint'
+
+
+def frame_fingerprint(seattle_data):
+    """
+    Summary: Fingerprints a batch's content: its columns, dtypes, index & every value (hashed row by row with
+             hash_pandas_object, which is stable across runs).
+
+    Returns: hex string
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    digest.update(repr([(column, str(dtype)) for column, dtype in seattle_data.dtypes.items()]).encode())
+    digest.update(hash_pandas_object(seattle_data, index=True).to_numpy().tobytes())
+
+    return digest.hexdigest()
+
+
+def describe(value, seen):
+    """
+    Summary: Describes what a stage's output depends on within a value it references: the source of the package's
+             functions & classes (followed into the names they reference & the values they close over), each rule's
+             declaration & the value of constants. Anything else (i.e. modules, library functions) is left out.
+
+    Returns: list of strings
+    """
+
+    if id(value) in seen:
+        return []
+
+    seen.add(id(value))
+
+    if isinstance(value, Rule):
+        return (
+                [repr((value.columns, value.action, value.reason))]
+                + describe(value.predicate, seen)
+                + describe(value.correction, seen)
+                )
+
+    if inspect.isfunction(value) or inspect.isclass(value):
+
+        if not (value.__module__ or '').startswith(__package__):
+            return []
+
+        parts = [inspect.getsource(value)]
+
+        for name in referenced_names(value):
+            parts += describe(getattr(inspect.getmodule(value), name, None), seen)
+
+        # The values a nested function closes over (i.e. the inference of a quality_rules.inferred correction)
+        for cell in getattr(value, '__closure__', None) or ():
+            parts += describe(cell.cell_contents, seen)
+
+        return parts
+
+    if isinstance(value, dict):
+        return [repr(sorted(map(repr, value)))] + [part for item in value.values() for part in describe(item, seen)]
+
+    if isinstance(value, (list, tuple)) and not all(isinstance(item, (str, int, float, bool)) for item in value):
+        return [part for item in value for part in describe(item, seen)]
+
+    if isinstance(value, (frozenset, set)):
+        return [repr(sorted(map(repr, value)))]
+
+    if isinstance(value, (str, bytes, int, float, bool, list, tuple)):
+        return [repr(value)]
+
+    return []
+
+
+def referenced_names(function):
+    """
+    Summary: Gets the global names a function (or each method of a class) references, including within its nested
+             functions & lambdas.
+
+    Returns: list of names
+    """
+
+    if inspect.isclass(function):
+        return [name for _, method in inspect.getmembers(function, inspect.isfunction) for name in referenced_names(method)]
+
+    names = []
+    code_objects = [function.__code__]
+
+    while code_objects:
+        code = code_objects.pop()
+        names += code.co_names
+        code_objects += [constant for constant in code.co_consts if inspect.iscode(constant)]
+
+    return names
+
+
+@lru_cache(maxsize=None)
+def stage_version(cleaning_function):
+    """
+    Summary: Gets a cleaning function's code/rule version: a hash of its source, along with the source of the package
+             functions, the rules & the constants it references by name (see describe). Editing a stage, or a rule or
+             constant it uses (i.e. the longitude range of correct_deci_degrees), gives it a new version.
+
+    Returns: hex string
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    for part in describe(cleaning_function, set()):
+        digest.update(part.encode())
+
+    return digest.hexdigest()
+
+
+def reference_version():
+    """
+    Summary: Gets the version of the reference data: a hash of the reference files' content (see reference_files).
+
+    Returns: hex string
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    for reference in reference_files:
+        path = getenv(reference)
+
+        digest.update(reference.encode())
+
+        if path is not None and exists(path):
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+
+    return digest.hexdigest()
+
+
+def stage_key(input_fingerprint, cleaning_function, reference):
+    """
+    Summary: Gets the key a stage's output is cached under: its input's fingerprint, its code/rule version & the
+             reference data version.
+
+    Returns: hex string
+    """
+
+    return hashlib.blake2b(
+                            f'{cleaning_function.__name__}:{input_fingerprint}:{stage_version(cleaning_function)}:{reference}'.encode(),
+                            digest_size=16
+                            ).hexdigest()
+
+
+def load_stage_output(key, cache_dir):
+    """
+    Summary: Loads a cached stage output, marking it as the most recently used.
+
+    Returns: tuple -> (Pandas DataFrame, its fingerprint), or None if the output isn't cached
+    """
+
+    path = join(cache_dir, f'{key}.arrow')
+
+    if not exists(path):
+        return None
+
+    with pa.OSFile(path, 'rb') as file:
+        table = ipc.open_file(file).read_all()
+
+    utime(path)
+
+    # Copied, as the arrays Arrow hands over are read-only & the next stage may update the batch in place
+    return table.to_pandas().copy(), table.schema.metadata[fingerprint_key].decode()
+
+
+def save_stage_output(stage_output, fingerprint, key, cache_dir, max_bytes=stage_cache_max_bytes):
+    """
+    Summary: Caches a stage output as an (lz4-compressed) Arrow IPC file, replacing any previous file only once fully
+             written, then evicts the least recently used outputs beyond max_bytes. Outputs Arrow can't hold (i.e. a
+             column mixing strings & numbers, or one that wouldn't be read back with the same dtype) aren't cached.
+    """
+
+    try:
+        table = pa.Table.from_pandas(stage_output, preserve_index=True)
+
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return
+
+    # Object columns of timestamps or numbers (i.e. as left by config_na_values) come back typed, so they aren't cached
+    restored = table.slice(0, 0).to_pandas()
+
+    if not (restored.dtypes.equals(stage_output.dtypes) and restored.index.dtype == stage_output.index.dtype):
+        return
+
+    table = table.replace_schema_metadata({**table.schema.metadata, fingerprint_key: fingerprint.encode()})
+
+    makedirs(cache_dir, exist_ok=True)
+
+    path = join(cache_dir, f'{key}.arrow')
+
+    with pa.OSFile(path + '.tmp', 'wb') as file:
+        with ipc.new_file(file, table.schema, options=ipc.IpcWriteOptions(compression='lz4')) as writer:
+            writer.write_table(table)
+
+    replace(path + '.tmp', path)
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes=stage_cache_max_bytes):
+    """
+    Summary: Deletes the least recently used (loaded or saved) stage outputs until the cache is within max_bytes.
+    """
+
+    files = [(stat(join(cache_dir, name)), name) for name in listdir(cache_dir) if name.endswith('.arrow')]
+    files.sort(key=lambda file: file[0].st_mtime)
+
+    cache_bytes = sum(file_stat.st_size for file_stat, _ in files)
+
+    for file_stat, name in files:
+
+        if cache_bytes <= max_bytes:
+            break
+
+        remove(join(cache_dir, name))
+        cache_bytes -= file_stat.st_size
+
+
+def run_memoized(cleaning_function, seattle_data, cache_dir, reference, input_fingerprint=None,
+                 max_bytes=stage_cache_max_bytes):
+    """
+    Summary: Runs a cleaning function, unless its output for this input, code/rule version & reference data is cached
+             (see stage_key), in which case the cached output is loaded instead. Outputs are fingerprinted by content,
+             so a stage whose output didn't change leaves the stages after it cached too.
+
+    Returns: tuple -> (the stage's output, its fingerprint)
+
+    Params:
+        cleaning_function   :   the stage; it must only depend on its input & the reference data
+        seattle_data        :   the stage's input
+        cache_dir           :   directory holding the cached outputs
+        reference           :   the reference data version (see reference_version)
+        input_fingerprint   :   the input's fingerprint, if known (i.e. the previous stage's output fingerprint)
+        max_bytes           :   size the cache is kept under
+    """
+
+    if input_fingerprint is None:
+        input_fingerprint = frame_fingerprint(seattle_data)
+
+    key = stage_key(input_fingerprint, cleaning_function, reference)
+
+    cached = load_stage_output(key, cache_dir)
+
+    if cached is not None:
+        return cached
+
+    stage_output = cleaning_function(seattle_data)
+    fingerprint = frame_fingerprint(stage_output)
+
+    save_stage_output(stage_output, fingerprint, key, cache_dir, max_bytes)
+
+    return stage_output, fingerprint
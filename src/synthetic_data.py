@@ -0,0 +1,299 @@
+from os import getenv
+from datetime import datetime, timedelta
+
+import numpy as np
+from pandas import DataFrame, Timestamp, read_csv, to_timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Approximate number of offenses SPD reports per day; a scale of 1 generates one day's worth of records
+daily_volume = 250
+
+# Seattle's longitude/latitude range, within which each beat is given a (made up) centre
+seattle_bounds = {
+                'longitude':    (-122.42, -122.25),
+                'latitude':     (47.50, 47.73)
+                }
+
+raw_columns = [
+                'report_number', 'offense_id', 'offense_start_datetime', 'report_datetime', 'group_a_b',
+                'crime_against_category', 'offense_parent_group', 'offense', 'offense_code', 'precinct', 'sector',
+                'beat', 'mcpp', '_100_block_address', 'longitude', 'latitude', 'offense_end_datetime'
+                ]
+
+street_names = [
+                'PIKE ST', 'PINE ST', 'AURORA AVE N', 'RAINIER AVE S', 'MADISON ST', 'NE 45TH ST', 'NW MARKET ST',
+                'CALIFORNIA AVE SW', 'BEACON AVE S', 'LAKE CITY WAY NE', 'UNIVERSITY WAY NE', 'DENNY WAY',
+                'JACKSON ST', 'DELRIDGE WAY SW', 'GREENWOOD AVE N', 'MLK JR WAY S', 'BROADWAY E', 'ALASKAN WAY'
+                ]
+
+avenue_suffixes = ['AVE', 'AVE N', 'AVE NE', 'AVE S', 'AVE SW', 'AVE W', 'AVE NW']
+
+# Missing value indicators, as removed by cleanup_na_values
+na_tokens = ['UNKNOWN', '99', 'OOJ', '<NULL>', 'NULL', 'null', 'nil', 'empty', '-', 'NA', 'n/a']
+
+
+def reference_data():
+    """
+    Summary: Loads the reference files the synthetic records are drawn from: location_codes.csv (LOC_CODES),
+             mcpp.csv (MCPP) & nibrs_offenses.csv (OFFENSE_CODES).
+
+    Returns: tuple of Pandas DataFrames -> (loc_codes, mcpp, offense_codes)
+    """
+
+    return tuple(
+                read_csv(
+                        filepath_or_buffer=getenv(env_variable),
+                        dtype='O'
+                        )
+                for env_variable in ['LOC_CODES', 'MCPP', 'OFFENSE_CODES']
+                )
+
+
+def street_addresses(rng, size):
+    """
+    Summary: Generates clean block addresses, with roughly a fifth being intersections:
+                > 3200 BLOCK OF 23RD AVE W
+                > 26TH AVE NE/PIKE ST
+
+    Returns: NumPy object array
+    """
+
+    avenues = np.array(
+                        [f'{ordinal(number)} {suffix}'
+                         for number, suffix in zip(rng.integers(1, 60, size), rng.choice(avenue_suffixes, size))],
+                        dtype='O'
+                        )
+
+    streets = np.where(rng.random(size) < 0.5, avenues, rng.choice(street_names, size).astype('O'))
+
+    blocks = (rng.integers(1, 130, size) * 100).astype(str).astype('O') + ' BLOCK OF ' + streets
+
+    intersections = avenues + '/' + rng.choice(street_names, size).astype('O')
+
+    return np.where(rng.random(size) < 0.2, intersections, blocks)
+
+
+def ordinal(number):
+    """
+    Summary: Gets the ordinal of a number, as used in street names, i.e. 1 -> 1ST, 12 -> 12TH, 23 -> 23RD.
+    """
+
+    if number % 100 in (11, 12, 13):
+        return f'{number}TH'
+
+    return f'{number}' + {1: 'ST', 2: 'ND', 3: 'RD'}.get(number % 10, 'TH')
+
+
+def misspell(rng, values):
+    """
+    Summary: Misspells each value by swapping two neighbouring characters, i.e. MAGNOLIA -> MAGNOLAI.
+
+    Returns: NumPy object array
+    """
+
+    misspelled = []
+
+    for value in values:
+        position = rng.integers(1, len(value) - 1)
+        misspelled.append(value[:position - 1] + value[position] + value[position - 1] + value[position + 1:])
+
+    return np.array(misspelled, dtype='O')
+
+
+def generate_batch(rows=daily_volume, date=None, dirty_rate=0.05, seed=0):
+    """
+    Summary: Generates a synthetic batch of SPD crime data, shaped like the data returned by the retrieval functions
+             (every column a string, as retrieved). Records are drawn from the reference files, so their location
+             codes, mcpps & offenses are consistent with one another, and their coordinates lie around their beat.
+
+             A dirty_rate share of the values in each column is made dirty with the issues the cleaning stages fix:
+                > Whitespace & casing issues                    -i.e.  Magnolia , 23RD AVE  W
+                > NA tokens                                     -i.e. UNKNOWN, OOJ, 99, <NULL>
+                > X'd block numbers & AV road labels            -i.e. 32XX BLOCK OF 23RD AV W
+                > Invalid report numbers                        -i.e. 2023=012345, 2O23-O12345, 23-012345
+                > Misspelled mcpps                              -i.e. MAGNOLAI
+                > Missing & out-of-range coordinates            -i.e. 0E-9, -12.23
+                > Offense start datetimes after the end datetime
+                > Missing (higher-level) location codes
+                > Offense descriptors inconsistent with the offense code
+                > Justifiable homicides (NOT_A_CRIME)
+
+    Returns: Pandas DataFrame
+
+    Params:
+        rows        :   number of records to generate
+        date        :   report date of the records; must be in yyyy-mm-dd format. Defaults to yesterday, like the
+                        retrieval functions
+        dirty_rate  :   share (0 to 1) of each column's values to make dirty
+        seed        :   seed of the random generator; the same arguments always generate the same batch
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if date is None:
+        date = datetime.strftime(
+                                datetime.today().date() - timedelta(days=1),
+                                '%Y-%m-%d'
+                                )
+
+    loc_codes, mcpp, offense_codes = reference_data()
+
+    # Each beat is given a centre within Seattle; its records are scattered ~400 m around it
+    centre_rng = np.random.default_rng(0)
+    beat_centres = DataFrame(
+                            {
+                            'longitude':    centre_rng.uniform(*seattle_bounds['longitude'], len(loc_codes)),
+                            'latitude':     centre_rng.uniform(*seattle_bounds['latitude'], len(loc_codes))
+                            }
+                            )
+
+    # Location codes
+    beat_positions = rng.integers(0, len(loc_codes), rows)
+    location = loc_codes.iloc[beat_positions].reset_index(drop=True)
+
+    # An mcpp of the record's precinct
+    mcpp_by_precinct = mcpp.groupby('precinct')['mcpp'].apply(list)
+    record_mcpp = np.array(
+                            [mcpp_by_precinct[precinct][rng.integers(0, len(mcpp_by_precinct[precinct]))]
+                             for precinct in location['precinct']],
+                            dtype='O'
+                            )
+
+    # Offenses; a handful of justifiable homicides (NOT_A_CRIME) are kept, as cleaning removes them
+    offense_weights = np.where(offense_codes['crime_against_category'] == 'NOT_A_CRIME', 0.1, 1.0)
+    offenses = offense_codes.iloc[
+                                    rng.choice(len(offense_codes), rows, p=offense_weights / offense_weights.sum())
+                                ].reset_index(drop=True)
+
+    # Datetimes; offenses start up to a week before being reported, & last up to 12 hours
+    report_datetime = Timestamp(date) + to_timedelta(rng.integers(0, 86_400, rows), unit='s')
+    offense_start = report_datetime - to_timedelta(rng.integers(0, 7 * 86_400, rows), unit='s')
+    offense_end = offense_start + to_timedelta(rng.integers(0, 12 * 3_600, rows), unit='s')
+
+    datetime_format = '%Y-%m-%dT%H:%M:%S.000'
+
+    # Report numbers; some reports hold several offenses
+    report_sequence = np.sort(rng.integers(0, max(rows // 2, 1), rows))
+    year = date[:4]
+
+    seattle_data = DataFrame(
+                            {
+                            'report_number':            [f'{year}-{number:06d}' for number in report_sequence],
+                            'offense_id':               (rng.choice(10**10, rows, replace=False) + 10**10).astype(str),
+                            'offense_start_datetime':   offense_start.strftime(datetime_format),
+                            'report_datetime':          report_datetime.strftime(datetime_format),
+                            'group_a_b':                offenses['group_a_b'],
+                            'crime_against_category':   offenses['crime_against_category'],
+                            'offense_parent_group':     offenses['offense_parent_group'],
+                            'offense':                  offenses['offense'].str.title(),
+                            'offense_code':             offenses['offense_code'],
+                            'precinct':                 location['precinct'],
+                            'sector':                   location['sector'],
+                            'beat':                     location['beat'],
+                            'mcpp':                     record_mcpp,
+                            '_100_block_address':       street_addresses(rng, rows),
+                            'longitude':                (beat_centres['longitude'].to_numpy()[beat_positions]
+                                                            + rng.normal(0, 0.005, rows)).round(7).astype(str),
+                            'latitude':                 (beat_centres['latitude'].to_numpy()[beat_positions]
+                                                            + rng.normal(0, 0.004, rows)).round(8).astype(str),
+                            'offense_end_datetime':     offense_end.strftime(datetime_format)
+                            },
+                            dtype='O'
+                            )[raw_columns]
+
+    # Offense end datetimes are often missing
+    seattle_data.loc[rng.random(rows) < 0.4, 'offense_end_datetime'] = np.nan
+
+    if dirty_rate > 0:
+        seattle_data = make_dirty(seattle_data, rng, dirty_rate)
+
+    return seattle_data
+
+
+def make_dirty(seattle_data, rng, dirty_rate):
+    """
+    Summary: Makes a dirty_rate share of the values of each column dirty (see generate_batch).
+
+    Returns: Pandas DataFrame
+    """
+
+    rows = len(seattle_data)
+
+    def dirty_rows(rate=dirty_rate):
+        return rng.random(rows) < rate
+
+    # Whitespace & casing issues
+    for column in ['offense_parent_group', 'mcpp', '_100_block_address']:
+        selected = dirty_rows()
+        seattle_data.loc[selected, column] = '  ' + seattle_data.loc[selected, column].str.replace(' ', '  ') + ' '
+
+    for column in ['mcpp', 'sector', 'beat']:
+        selected = dirty_rows()
+        seattle_data.loc[selected, column] = seattle_data.loc[selected, column].str.lower()
+
+    # X'd block numbers & AV road labels
+    selected = dirty_rows() & seattle_data['_100_block_address'].str.contains(r'\d00 BLOCK', regex=True)
+    seattle_data.loc[selected, '_100_block_address'] = (
+                                                        seattle_data.loc[selected, '_100_block_address']
+                                                        .str.replace(r'(\d)00 BLOCK', r'\1XX BLOCK', regex=True)
+                                                        )
+
+    selected = dirty_rows() & seattle_data['_100_block_address'].str.contains(' AVE ', regex=False)
+    seattle_data.loc[selected, '_100_block_address'] = (
+                                                        seattle_data.loc[selected, '_100_block_address']
+                                                        .str.replace(' AVE ', ' AV ', regex=False)
+                                                        )
+
+    # Placeholder (non-existent street) addresses
+    seattle_data.loc[dirty_rows(dirty_rate / 5), '_100_block_address'] = 'OFTH BLOCK OF OFRD'
+
+    # Invalid report numbers, one kind of issue per selected record
+    selected = np.flatnonzero(dirty_rows())
+    report_numbers = seattle_data['report_number'].to_numpy(dtype='O')
+
+    for position, issue in zip(selected, rng.integers(0, 6, len(selected))):
+        year, number = report_numbers[position].split('-')
+
+        report_numbers[position] = [
+                                    f'{year}={number}',                         # bad delimiter
+                                    f'{year}_{number}',                         # bad delimiter
+                                    f'{year}-{number}'.replace('0', 'O'),       # letter O's
+                                    f'{year}{number}',                          # no delimiter
+                                    f'{year}-000{number}',                      # long back digits
+                                    f'{year[2:]}-{number}'                      # short front digits
+                                    ][issue]
+
+    seattle_data['report_number'] = report_numbers
+
+    # Misspelled mcpps
+    selected = dirty_rows()
+    seattle_data.loc[selected, 'mcpp'] = misspell(rng, seattle_data.loc[selected, 'mcpp'].str.strip().str.upper())
+
+    # Missing (0E-9) & out-of-range coordinates
+    for column in ['longitude', 'latitude']:
+        seattle_data.loc[dirty_rows(dirty_rate / 2), column] = '0E-9'
+
+        selected = dirty_rows(dirty_rate / 2)
+        seattle_data.loc[selected, column] = seattle_data.loc[selected, column].str.replace('.', '', n=1).str[:9]
+
+    # Offense start datetimes after the end datetime
+    selected = dirty_rows() & seattle_data['offense_end_datetime'].notna()
+    seattle_data.loc[selected, ['offense_start_datetime', 'offense_end_datetime']] = (
+                                                    seattle_data.loc[selected, ['offense_end_datetime', 'offense_start_datetime']]
+                                                    .to_numpy()
+                                                    )
+
+    # NA tokens; missing higher-level location codes are then recoverable from the beat/mcpp
+    for column in ['precinct', 'sector', 'beat', 'mcpp', 'group_a_b', 'crime_against_category', 'offense']:
+        selected = dirty_rows()
+        seattle_data.loc[selected, column] = rng.choice(na_tokens, selected.sum())
+
+    # Offense descriptors inconsistent with the offense code, taken from other records
+    for column in ['offense_parent_group', 'crime_against_category']:
+        selected = dirty_rows(dirty_rate / 5)
+        seattle_data.loc[selected, column] = rng.choice(seattle_data[column].to_numpy(dtype='O'), selected.sum())
+
+    return seattle_data
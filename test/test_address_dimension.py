@@ -0,0 +1,87 @@
+import pandas.testing as pdt
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import DataFrame, read_csv
+
+from ..src.address_dimension import address_columns, batch_address_dimension, intern_addresses, load_address_dimension, parse_addresses
+
+
+class AddressDimensionUnitTesting(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.dimension_path = join(self.directory.name, 'address_dimension.parquet')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_parse_addresses(self):
+
+        # setup
+        addresses = read_csv('SeattleCrimeData/test/address_dimension_testing_files/01_parse_addresses_input.csv', dtype='O')['_100_block_address']
+
+        expected_output = read_csv(
+                                    'SeattleCrimeData/test/address_dimension_testing_files/01_parse_addresses_output.csv',
+                                    dtype={'block_number': 'Int64'}
+                                    )
+
+        # test
+        test_output = parse_addresses(addresses)
+
+        pdt.assert_frame_equal(test_output, expected_output)
+
+
+    def test_intern_addresses(self):
+
+        # setup; the second batch repeats an address of the first & adds a new one
+        first_batch = DataFrame({'offense_id': ['1', '2', '3'], '_100_block_address': ['26TH AVE NE', '3200 BLOCK OF 23RD AVE W', None]})
+        second_batch = DataFrame({'offense_id': ['4', '5'], '_100_block_address': ['PIKE ST', '26TH AVE NE']})
+
+        # test; an address keeps its id across batches & missing addresses get none
+        first_batch = intern_addresses(first_batch, self.dimension_path)
+        second_batch = intern_addresses(second_batch, self.dimension_path)
+
+        self.assertEqual(first_batch['address_id'].tolist()[:2], [1, 2])
+        self.assertTrue(first_batch['address_id'].isna().iloc[2])
+        self.assertEqual(second_batch['address_id'].tolist(), [3, 1])
+        self.assertNotIn('_100_block_address', second_batch.columns)
+
+
+    def test_batch_address_dimension(self):
+
+        # setup
+        intern_addresses(DataFrame({'_100_block_address': ['26TH AVE NE', '3200 BLOCK OF 23RD AVE W']}), self.dimension_path)
+        batch = intern_addresses(DataFrame({'_100_block_address': ['3200 BLOCK OF 23RD AVE W']}), self.dimension_path)
+
+        # test; only the batch's addresses are inserted along with it
+        test_output = batch_address_dimension(batch, self.dimension_path)
+
+        self.assertEqual(test_output['address_id'].tolist(), [2])
+        self.assertEqual(test_output.iloc[0, 1:].tolist(), ['3200 BLOCK OF 23RD AVE W', 3200, '23RD AVE W'])
+
+
+    def test_load_legacy_address_dimension(self):
+
+        # setup; a dimension saved with the street_1 & street_2 columns
+        DataFrame(
+                {
+                'address_id':           [1],
+                '_100_block_address':   ['26TH AVE NE'],
+                'block_number':         [None],
+                'street_1':             ['26TH AVE NE'],
+                'street_2':             [None]
+                }
+                ).to_parquet(self.dimension_path, index=False)
+
+        # test
+        test_output = load_address_dimension(self.dimension_path)
+
+        self.assertEqual(test_output.columns.tolist(), address_columns)
+        self.assertEqual(test_output['street'].tolist(), ['26TH AVE NE'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import DataFrame
+
+from ..src.audit_functions import create_audit
+from ..src.benchmark import restore_environment, scratch_environment
+from ..src.canonical_addresses import street_correction_rules
+from ..src.quality_rules import run_rules
+
+
+class CanonicalAddressesUnitTesting(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        # Canonical streets taken from a scratch cache, seeded with synthetic history
+        cls.scratch = TemporaryDirectory()
+        cls.previous_environment = scratch_environment(cls.scratch.name)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        restore_environment(cls.previous_environment)
+        cls.scratch.cleanup()
+
+
+    def test_audit_street_corrections(self):
+
+        # setup
+        input_df = DataFrame(
+                            {
+                            'offense_id':           ['1', '2', '3'],
+                            '_100_block_address':   ['100 BLOCK OF PIKKE ST', '100 BLOCK OF PIKE ST', None]
+                            }
+                            )
+
+        # test; the misspelled street is corrected & the address audited as it was
+        test_output, test_audit_table = run_rules(
+                                                seattle_data    =   input_df,
+                                                rules           =   street_correction_rules,
+                                                audit_table     =   create_audit(audit_type='values')
+                                                )
+
+        self.assertEqual(test_output['_100_block_address'].tolist(), ['100 BLOCK OF PIKE ST', '100 BLOCK OF PIKE ST', None])
+        self.assertEqual(test_audit_table.index.tolist(), [('_100_block_address', '1')])
+        self.assertEqual(test_audit_table.iloc[0, :2].tolist(), ['100 BLOCK OF PIKKE ST', '15'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import read_csv
+
+from ..src.benchmark import restore_environment, scratch_environment
+from ..src.change_capture import changed_rows, row_hashes, update_row_hashes, updated_at_column
+from ..src.pipeline import audit_batch, clean_batch, convert_batch, record_loaded_batch
+from ..src.synthetic_data import generate_batch
+
+
+# Report date within the retention window, as the row hash store drops the expired records
+recent_day = (date.today() - timedelta(days=3)).isoformat()
+
+
+class ChangeCaptureUnitTesting(TestCase):
+
+    def setUp(self):
+
+        self.directory = TemporaryDirectory()
+        self.hashes_path = join(self.directory.name, 'row_hashes.npz')
+
+        self.raw_data = read_csv('SeattleCrimeData/test/change_capture_testing_files/01_row_hashes_input.csv', dtype='O')
+        self.raw_data['report_datetime'] = f'{recent_day}T12:34:00.000'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_row_hashes(self):
+
+        # setup; the same records with their columns reordered & a later :updated_at
+        reordered = self.raw_data[self.raw_data.columns[::-1]].copy()
+        reordered[updated_at_column] = '2023-03-10T01:00:00.000'
+
+        revised = self.raw_data.copy()
+        revised.loc[1, 'beat'] = 'K3'
+
+        # test; only a revised value changes a record's hash
+        hashes = row_hashes(self.raw_data)
+
+        self.assertEqual(row_hashes(reordered).tolist(), hashes.tolist())
+        self.assertEqual((row_hashes(revised) != hashes).tolist(), [False, True, False])
+
+
+    def test_changed_rows(self):
+
+        # setup; a later pull holding one unchanged, one revised & one new record
+        update_row_hashes(self.raw_data.iloc[:2].drop(columns=updated_at_column), self.hashes_path)
+
+        later_pull = self.raw_data.drop(columns=updated_at_column)
+        later_pull.loc[1, 'offense_code'] = '13A'
+
+        # test
+        test_output = changed_rows(later_pull, self.hashes_path)
+
+        self.assertEqual(test_output['offense_id'].tolist(), ['4002', '4003'])
+        self.assertEqual(test_output.index.tolist(), [0, 1])
+
+
+    def test_changed_rows_without_store(self):
+
+        # test; nothing has been loaded yet, so every record is new
+        test_output = changed_rows(self.raw_data, self.hashes_path)
+
+        self.assertEqual(test_output['offense_id'].tolist(), ['4001', '4002', '4003'])
+
+
+    def test_loaded_batch_unchanged(self):
+
+        # setup; a batch cleaned & recorded as loaded the way pipeline.run_batch does, against scratch outputs
+        previous_environment = scratch_environment(self.directory.name)
+
+        try:
+            raw_data = generate_batch(rows=200, date=recent_day, seed=5)
+
+            clean_data, _, audit_table = clean_batch(raw_data.copy(), audit_table=audit_batch(raw_data))
+
+            record_loaded_batch(
+                                clean_data_record_set   =   convert_batch(clean_data, audit_table)[0],
+                                raw_data                =   raw_data,
+                                index_path              =   join(self.directory.name, 'loaded_index.npz'),
+                                hashes_path             =   self.hashes_path
+                                )
+
+        finally:
+            restore_environment(previous_environment)
+
+        # test; a change data capture pull of the same records has nothing to upsert
+        cdc_pull = raw_data.assign(**{updated_at_column: '2023-03-10T01:00:00.000'})
+
+        test_output = changed_rows(cdc_pull.drop(columns=updated_at_column), self.hashes_path)
+
+        self.assertTrue(test_output.empty)
+
+
+if __name__ == '__main__':
+    main()
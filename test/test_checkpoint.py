@@ -0,0 +1,118 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from ..src.benchmark import restore_environment, scratch_environment
+from ..src.checkpoint import (
+                            batch_id,
+                            checkpoint_stages,
+                            clean_stage,
+                            clear_checkpoints,
+                            completed_stages,
+                            fetch_stage,
+                            load_checkpoint,
+                            save_checkpoint
+                            )
+from ..src.pipeline import audit_batch, clean_batch
+from ..src.synthetic_data import generate_batch
+
+
+class CheckpointUnitTesting(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        # Cleaned against scratch outputs, seeded as a running pipeline's would be
+        cls.scratch = TemporaryDirectory()
+        cls.previous_environment = scratch_environment(cls.scratch.name)
+
+        cls.raw_data = generate_batch(rows=200, date='2023-03-08', seed=3)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        restore_environment(cls.previous_environment)
+        cls.scratch.cleanup()
+
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.checkpoint_dir = self.directory.name
+        self.batch = batch_id('2023-03-08', '=')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_completed_stages(self):
+
+        # setup
+        save_checkpoint(self.raw_data, self.batch, 'raw', self.checkpoint_dir)
+        save_checkpoint(audit_batch(self.raw_data), self.batch, 'audited', self.checkpoint_dir)
+
+        # test
+        self.assertEqual(completed_stages(self.batch, self.checkpoint_dir), ['raw', 'audited'])
+        self.assertTrue(load_checkpoint(self.batch, 'raw', self.checkpoint_dir).equals(self.raw_data))
+
+        clear_checkpoints(self.batch, self.checkpoint_dir)
+
+        self.assertEqual(completed_stages(self.batch, self.checkpoint_dir), [])
+
+
+    def test_fetch_stage_resume(self):
+
+        # setup
+        save_checkpoint(self.raw_data, self.batch, 'raw', self.checkpoint_dir)
+
+        # test; a checkpointed batch isn't retrieved again
+        self.assertEqual(fetch_stage('2023-03-08', '=', self.checkpoint_dir), self.batch)
+        self.assertTrue(load_checkpoint(self.batch, 'raw', self.checkpoint_dir).equals(self.raw_data))
+
+
+    def test_clean_stage_resume_from_audited(self):
+
+        # setup; a marker row tells the checkpointed audit table apart from a new audit of the raw data
+        audit_table = audit_batch(self.raw_data)
+        audit_table.loc[('beat', 'checkpointed'), :] = ['X', '12', '2023-03-08']
+
+        save_checkpoint(self.raw_data, self.batch, 'raw', self.checkpoint_dir)
+        save_checkpoint(audit_table, self.batch, 'audited', self.checkpoint_dir)
+
+        # test; the cleaning resumes from the checkpointed audit table & adds the values it corrects to it
+        clean_stage(self.batch, self.checkpoint_dir)
+
+        audited = load_checkpoint(self.batch, 'audited', self.checkpoint_dir)
+
+        self.assertEqual(completed_stages(self.batch, self.checkpoint_dir), checkpoint_stages)
+        self.assertIn(('beat', 'checkpointed'), audited.index)
+        self.assertGreaterEqual(len(audited), len(audit_table))
+
+
+    def test_clean_stage_resume_from_cleaned(self):
+
+        # setup; the checkpointed cleaned batch is one record short of a new cleaning of the raw data
+        clean_data, _, audit_table = clean_batch(self.raw_data.copy(), audit_table=audit_batch(self.raw_data))
+
+        save_checkpoint(self.raw_data, self.batch, 'raw', self.checkpoint_dir)
+        save_checkpoint(audit_table, self.batch, 'audited', self.checkpoint_dir)
+        save_checkpoint(clean_data.iloc[1:], self.batch, 'cleaned', self.checkpoint_dir)
+
+        # test; the record sets are converted from the checkpointed cleaned batch
+        clean_stage(self.batch, self.checkpoint_dir)
+
+        clean_data_record_set, _, _ = load_checkpoint(self.batch, 'record_sets', self.checkpoint_dir)
+
+        self.assertEqual(len(clean_data_record_set), len(clean_data) - 1)
+
+
+    def test_clean_stage_completed(self):
+
+        # setup; only the record sets are checkpointed, so redoing any stage would fail for want of the raw data
+        save_checkpoint(([], [], []), self.batch, 'record_sets', self.checkpoint_dir)
+
+        # test
+        self.assertEqual(clean_stage(self.batch, self.checkpoint_dir), self.batch)
+        self.assertEqual(completed_stages(self.batch, self.checkpoint_dir), ['record_sets'])
+
+
+if __name__ == '__main__':
+    main()
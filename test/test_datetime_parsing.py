@@ -0,0 +1,29 @@
+import pandas.testing as pdt
+from unittest import TestCase, main
+
+from pandas import read_csv
+
+from ..src.datetime_parsing import datetime_columns, parse_datetimes
+
+
+class DatetimeParsingUnitTesting(TestCase):
+
+    def test_parse_datetimes(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/datetime_parsing_testing_files/01_parse_datetimes_input.csv', dtype='O')
+
+        expected_output = read_csv(
+                                    'SeattleCrimeData/test/datetime_parsing_testing_files/01_parse_datetimes_output.csv',
+                                    parse_dates=datetime_columns
+                                    )
+
+        # test; the values not conforming to the Socrata format are parsed together, those with a UTC offset (or Z)
+        # converted into Seattle local time
+        test_output = parse_datetimes(seattle_data=input_df)
+
+        pdt.assert_frame_equal(test_output, expected_output)
+
+
+if __name__ == '__main__':
+    main()
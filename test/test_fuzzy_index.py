@@ -0,0 +1,52 @@
+from os import getenv
+from unittest import TestCase, main
+
+from fuzzywuzzy.process import extractOne
+from pandas import Series, read_csv
+
+from ..src.fuzzy_index import FuzzyIndex, match_threshold
+
+
+class FuzzyIndexUnitTesting(TestCase):
+
+    def setUp(self):
+
+        self.mcpp = read_csv(getenv('MCPP'), dtype='O')['mcpp']
+
+        self.queries = read_csv(
+                                'SeattleCrimeData/test/fuzzy_index_testing_files/01_extract_input.csv',
+                                dtype='O',
+                                keep_default_na=False
+                                )['mcpp']
+
+
+    def test_extract_matches_extract_one(self):
+
+        # setup; the matches of a full scan of the choices
+        expected_output = [extractOne(query, self.mcpp.tolist()) for query in self.queries]
+
+        # test; the scores are extractOne's, so are the matches replacing a value (scoring >= match_threshold)
+        test_output = FuzzyIndex(self.mcpp).extract(self.queries)
+
+        self.assertEqual(test_output['score'].tolist(), [score for _, score in expected_output])
+
+        for (match, score), (expected_match, _) in zip(test_output.itertuples(index=False), expected_output):
+            if score >= match_threshold:
+                self.assertEqual(match, expected_match)
+
+
+    def test_extract_index(self):
+
+        # setup
+        queries = Series(['NORTHGAT', None, 'NORTHGAT'], index=[7, 3, 5], dtype='O')
+
+        # test; matches keep the queries' index & missing queries score 0
+        test_output = FuzzyIndex(self.mcpp).extract(queries)
+
+        self.assertEqual(test_output.index.tolist(), [7, 3, 5])
+        self.assertEqual(test_output['match'].tolist()[::2], ['NORTHGATE', 'NORTHGATE'])
+        self.assertEqual(test_output['score'].tolist(), [94, 0, 94])
+
+
+if __name__ == '__main__':
+    main()
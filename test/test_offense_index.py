@@ -0,0 +1,92 @@
+import numpy as np
+from datetime import date, timedelta
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import DataFrame
+
+from ..src.offense_index import (
+                                drop_loaded,
+                                load_index,
+                                loaded_index_arrays,
+                                merge_index,
+                                missing_report_date,
+                                record_loaded
+                                )
+from ..src.retention import retention_days
+
+
+# Report dates relative to today, as the index drops the entries outside of the retention window
+recent_day = (date.today() - timedelta(days=3)).isoformat()
+expired_day = (date.today() - timedelta(days=retention_days + 10)).isoformat()
+
+recent_report_date = (date.today() - timedelta(days=3) - date(1970, 1, 1)).days
+expired_report_date = (date.today() - timedelta(days=retention_days + 10) - date(1970, 1, 1)).days
+
+
+class OffenseIndexUnitTesting(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.index_path = join(self.directory.name, 'loaded_index.npz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_merge_index(self):
+
+        # setup
+        index = {
+                'offense_id':   np.array([10, 20, 30], dtype='int64'),
+                'report_date':  np.array([recent_report_date, expired_report_date, missing_report_date], dtype='int64')
+                }
+
+        batch = {
+                'offense_id':   np.array([25, 10, -1, 25], dtype='int64'),
+                'report_date':  np.array([recent_report_date, recent_report_date + 1, recent_report_date, recent_report_date + 2], dtype='int64')
+                }
+
+        # test; 10 is replaced by its batch entry, 20 has expired, 30 (without a report date) is kept, the invalid
+        # offense_id is left out & the last entry of the repeated 25 is kept
+        merge_index(index, batch, self.index_path)
+
+        test_output = load_index(self.index_path, loaded_index_arrays)
+
+        np.testing.assert_array_equal(test_output['offense_id'], [10, 25, 30])
+        np.testing.assert_array_equal(test_output['report_date'], [recent_report_date + 1, recent_report_date + 2, missing_report_date])
+
+
+    def test_drop_loaded(self):
+
+        # setup
+        record_loaded(
+                    offense_id_values   =   ['101', '102', '103'],
+                    report_datetimes    =   [recent_day, recent_day, expired_day],
+                    index_path          =   self.index_path
+                    )
+
+        raw_data = DataFrame({
+                            'offense_id':       ['104', '101', 'X', '103', '102'],
+                            'report_datetime':  [recent_day] * 5
+                            })
+
+        # test; the expired record left the index, so it's kept along with the new & invalid offense_ids
+        test_output = drop_loaded(raw_data, index_path=self.index_path)
+
+        self.assertEqual(test_output['offense_id'].tolist(), ['104', 'X', '103'])
+        self.assertEqual(test_output.index.tolist(), [0, 1, 2])
+
+
+    def test_drop_loaded_without_index(self):
+
+        # setup
+        raw_data = DataFrame({'offense_id': ['101'], 'report_datetime': [recent_day]})
+
+        # test; nothing has been loaded yet
+        self.assertIs(drop_loaded(raw_data, index_path=self.index_path), raw_data)
+
+
+if __name__ == '__main__':
+    main()
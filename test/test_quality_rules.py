@@ -0,0 +1,173 @@
+import pandas.testing as pdt
+from unittest import TestCase, main
+
+from pandas import DataFrame, read_csv, to_datetime
+
+from ..src.audit_functions import create_audit
+from ..src.quality_rules import (
+                                Rule,
+                                agrees_with,
+                                inferred,
+                                matches,
+                                compile_rules,
+                                run_rules,
+                                coordinate_rules,
+                                longitude_rule,
+                                latitude_rule,
+                                report_number_rule,
+                                valid_report_number,
+                                inferred_loc_code_reason,
+                                invalid_report_number_reason
+                                )
+
+
+# Beats inferred for the test records, standing in for an inference such as the beat grid's
+test_beats = {'1002': 'K1', '1003': 'K2', '1005': 'Q1'}
+
+inference_calls = []
+
+
+def infer_test_beats(shared):
+    inference_calls.append(shared)
+
+    records = shared.seattle_data[shared.seattle_data['offense_id'].isin(list(test_beats))]
+
+    return DataFrame({'beat': records['offense_id'].map(test_beats)}, index=records.index)
+
+
+class QualityRulesUnitTesting(TestCase):
+
+    audit_table_dtypes = {
+                            'audited_val':          str,
+                            'audited_reason_id':    str,
+                            'batch':                str
+                            }
+
+
+    def read_audit_output(self, file_name):
+
+        expected_output = read_csv(
+                                    f'SeattleCrimeData/test/quality_rules_testing_files/{file_name}',
+                                    dtype=QualityRulesUnitTesting.audit_table_dtypes,
+                                    keep_default_na=False
+                                    )
+
+        expected_output['offense_id'] = expected_output['offense_id'].astype(str)
+
+        expected_output.set_index(
+                                    keys=['audited_col', 'offense_id'],
+                                    inplace=True
+                                    )
+
+        expected_output['batch'] = to_datetime('today').strftime('%Y-%m-%d')
+
+        return expected_output
+
+
+    def test_compile_rules(self):
+
+        # setup
+        shared_predicate_rules = [
+                                Rule(['beat'], agrees_with('beat', infer_test_beats), 'correct', inferred_loc_code_reason, inferred(infer_test_beats)),
+                                Rule(['beat'], agrees_with('beat', infer_test_beats), 'null', inferred_loc_code_reason)
+                                ]
+
+        # test
+        compiled = compile_rules([*shared_predicate_rules, report_number_rule])
+
+        self.assertEqual(list(compiled), [agrees_with('beat', infer_test_beats), matches('report_number', valid_report_number)])
+        self.assertEqual(compiled[agrees_with('beat', infer_test_beats)], shared_predicate_rules)
+
+
+    def test_run_rules_null(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/quality_rules_testing_files/01_run_rules_input.csv', dtype='O')
+
+        expected_output = read_csv('SeattleCrimeData/test/quality_rules_testing_files/01_run_rules_output.csv', dtype='O')
+        expected_audit_table = self.read_audit_output('01_run_rules_audit_output.csv')
+
+        # test; the non-numeric longitude also fails longitude_rule, but keeps the first (coordinate) rule's reason
+        input_df, test_audit_table = run_rules(
+                                                seattle_data    =   input_df,
+                                                rules           =   [*coordinate_rules, longitude_rule, latitude_rule, report_number_rule],
+                                                audit_table     =   create_audit(audit_type='values')
+                                                )
+
+        pdt.assert_frame_equal(input_df, expected_output)
+        pdt.assert_frame_equal(test_audit_table, expected_audit_table)
+
+
+    def test_run_rules_correct(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/quality_rules_testing_files/01_run_rules_input.csv', dtype='O')
+
+        expected_output = read_csv('SeattleCrimeData/test/quality_rules_testing_files/02_correct_rules_output.csv', dtype='O')
+        expected_audit_table = self.read_audit_output('02_correct_rules_audit_output.csv')
+
+        correct_beat_rule = Rule(
+                                columns     =   ['beat'],
+                                predicate   =   agrees_with('beat', infer_test_beats),
+                                action      =   'correct',
+                                reason      =   inferred_loc_code_reason,
+                                correction  =   inferred(infer_test_beats)
+                                )
+
+        # test; the filled in beat is audited as an empty value & the replaced beat as it was
+        input_df, test_audit_table = run_rules(
+                                                seattle_data    =   input_df,
+                                                rules           =   [correct_beat_rule],
+                                                audit_table     =   create_audit(audit_type='values')
+                                                )
+
+        pdt.assert_frame_equal(input_df, expected_output)
+        pdt.assert_frame_equal(test_audit_table, expected_audit_table)
+
+
+    def test_run_rules_shared_inference(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/quality_rules_testing_files/01_run_rules_input.csv', dtype='O')
+
+        rules = [
+                Rule(['beat'], agrees_with('beat', infer_test_beats), 'correct', inferred_loc_code_reason, inferred(infer_test_beats)),
+                Rule(['beat'], agrees_with('beat', infer_test_beats), 'null', inferred_loc_code_reason)
+                ]
+
+        inference_calls.clear()
+
+        # test; both the mask & the correction come from the one inference
+        run_rules(seattle_data=input_df, rules=rules)
+
+        self.assertEqual(len(inference_calls), 1)
+
+
+    def test_run_rules_drop(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/quality_rules_testing_files/01_run_rules_input.csv', dtype='O')
+
+        expected_output = read_csv('SeattleCrimeData/test/quality_rules_testing_files/03_drop_rules_output.csv', dtype='O')
+        expected_output.index = [0, 2, 3, 4]
+
+        drop_report_number_rule = Rule(
+                                        columns     =   ['report_number'],
+                                        predicate   =   matches('report_number', valid_report_number),
+                                        action      =   'drop',
+                                        reason      =   invalid_report_number_reason
+                                        )
+
+        # test
+        input_df, test_audit_table = run_rules(
+                                                seattle_data    =   input_df,
+                                                rules           =   [drop_report_number_rule],
+                                                audit_table     =   create_audit(audit_type='values')
+                                                )
+
+        pdt.assert_frame_equal(input_df, expected_output)
+        self.assertEqual(test_audit_table.index.tolist(), [('report_number', '1002')])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import numpy as np
+from numpy import nan
+
+from ..src.benchmark import restore_environment, scratch_environment
+from ..src.clean_seattle_data import correct_deci_degrees
+from ..src.resolve_loc_codes import correct_loc_codes_from_coordinates, near_known_cells
+from ..src.seattle_schema import apply_schema
+from ..src.synthetic_data import generate_batch
+
+
+class ResolveLocCodesUnitTesting(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        # Inferred against a scratch beat grid, seeded with synthetic history
+        cls.scratch = TemporaryDirectory()
+        cls.previous_environment = scratch_environment(cls.scratch.name)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        restore_environment(cls.previous_environment)
+        cls.scratch.cleanup()
+
+
+    def test_fill_counts_logged(self):
+
+        # setup; clean records missing their beat, some their sector & precinct as well
+        input_df = generate_batch(rows=200, date='2023-03-08', dirty_rate=0, seed=7)
+        input_df = apply_schema(correct_deci_degrees(input_df.astype({'longitude': float, 'latitude': float})))
+
+        input_df.loc[input_df.index[:40], 'beat'] = nan
+        input_df.loc[input_df.index[:10], ['sector', 'precinct']] = nan
+
+        missing = input_df[['beat', 'sector', 'precinct']].isna()
+
+        # test; the logged counts are the codes filled in
+        with self.assertLogs('SeattleCrimeData.src.resolve_loc_codes', level='INFO') as logs:
+            test_output = correct_loc_codes_from_coordinates(input_df.copy())
+
+        filled = (missing & test_output[['beat', 'sector', 'precinct']].notna()).sum()
+
+        self.assertGreater(filled['beat'], 0)
+        self.assertIn(
+                    f"{filled['beat']} beats, {filled['sector']} sectors, {filled['precinct']} precincts",
+                    logs.output[0]
+                    )
+
+
+    def test_near_known_cells_without_cells(self):
+
+        # test; a batch whose valid coordinates all fall in known cells leaves no cell to look around
+        test_output = near_known_cells(np.array([], dtype='int64'), np.array([5, 9], dtype='int64'))
+
+        self.assertEqual(test_output.tolist(), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import os
+import pandas.testing as pdt
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import DataFrame, read_csv, to_datetime
+
+from ..src.audit_functions import create_audit
+from ..src.quality_rules import run_rules
+from ..src.raw_archive import save_archived
+from ..src.resolve_offenses import offense_descriptor_rules, resolve_offense_descriptors
+
+
+class ResolveOffensesUnitTesting(TestCase):
+
+    audit_table_dtypes = {
+                            'audited_val':          str,
+                            'audited_reason_id':    str,
+                            'batch':                str
+                            }
+
+
+    def setUp(self):
+
+        # An archived raw record (as retrieved, before the whitespace & casing cleanup) validating the 23H descriptors;
+        # 13B is validated by the batch itself & 13C's descriptors are spelled differently in the batch
+        self.directory = TemporaryDirectory()
+        self.previous_archive = os.environ.get('RAW_ARCHIVE')
+        os.environ['RAW_ARCHIVE'] = self.directory.name
+
+        save_archived(
+                    raw_data    =   DataFrame(
+                                            {
+                                            'offense_id':               ['1999'],
+                                            'offense_code':             ['23H'],
+                                            'offense':                  ['All Other Larceny '],
+                                            'offense_parent_group':     ['LARCENY-THEFT'],
+                                            'crime_against_category':   ['PROPERTY'],
+                                            'group_a_b':                ['A']
+                                            }
+                                            ),
+                    day         =   '2023-06-27'
+                    )
+
+    def tearDown(self):
+
+        if self.previous_archive is None:
+            os.environ.pop('RAW_ARCHIVE')
+
+        else:
+            os.environ['RAW_ARCHIVE'] = self.previous_archive
+
+        self.directory.cleanup()
+
+
+    def test_resolve_offense_descriptors(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/resolve_offenses_testing_files/01_resolve_offense_descriptors_input.csv', dtype='O')
+        expected_output = read_csv('SeattleCrimeData/test/resolve_offenses_testing_files/01_resolve_offense_descriptors_output.csv', dtype='O')
+
+        # test; records with an unknown, missing or unvalidated offense code keep their descriptors
+        input_df = resolve_offense_descriptors(seattle_data=input_df)
+
+        pdt.assert_frame_equal(input_df, expected_output)
+
+
+    def test_audit_offense_descriptors(self):
+
+        # setup
+        input_df = read_csv('SeattleCrimeData/test/resolve_offenses_testing_files/01_resolve_offense_descriptors_input.csv', dtype='O')
+
+        expected_output = read_csv(
+                                    'SeattleCrimeData/test/resolve_offenses_testing_files/01_resolve_offense_descriptors_audit_output.csv',
+                                    dtype=ResolveOffensesUnitTesting.audit_table_dtypes,
+                                    keep_default_na=False
+                                    )
+
+        expected_output['offense_id'] = expected_output['offense_id'].astype(str)
+
+        expected_output.set_index(
+                                    keys=['audited_col', 'offense_id'],
+                                    inplace=True
+                                    )
+
+        expected_output['batch'] = to_datetime('today').strftime('%Y-%m-%d')
+
+        # test; the filled in descriptors are audited as empty values & the replaced one as it was
+        _, test_audit_table = run_rules(
+                                        seattle_data    =   input_df,
+                                        rules           =   offense_descriptor_rules,
+                                        audit_table     =   create_audit(audit_type='values')
+                                        )
+
+        pdt.assert_frame_equal(test_audit_table, expected_output)
+
+
+    def test_unvalidated_offense_codes(self):
+
+        # setup; 23H's descriptors are neither archived nor in the batch
+        os.remove(os.path.join(self.directory.name, '2023-06-27.parquet'))
+
+        input_df = read_csv('SeattleCrimeData/test/resolve_offenses_testing_files/01_resolve_offense_descriptors_input.csv', dtype='O')
+
+        # test; only 13B's inconsistent parent group is replaced
+        test_output = resolve_offense_descriptors(seattle_data=input_df.copy())
+
+        self.assertEqual(test_output.loc[1, 'offense_parent_group'], 'ASSAULT OFFENSES')
+        self.assertTrue(test_output.loc[2, ['offense', 'crime_against_category']].isna().all())
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ from ..src.clean_seattle_data import (
                                     cleanup_misspelled_mcpp,
                                     correct_na_loc_codes,
                                     correct_deci_degrees,
+                                    config_addresses,
                                     config_na_values
                                     )   
 
@@ -296,6 +297,27 @@ class CleaningUnitTesting(TestCase):
                         )
 
 
+    def test_config_addresses(self):
+        input_df = read_csv(
+                            filepath_or_buffer='SeattleCrimeData/test/seattle_cleaning_testing_files/13_config_addresses_input.csv',
+                            dtype='O'
+                            )
+
+
+        expected_output = read_csv(
+                                filepath_or_buffer='SeattleCrimeData/test/seattle_cleaning_testing_files/13_config_addresses_output.csv',
+                                dtype='O'
+                                )
+
+        # The index holds each row's position within its split address, which isn't kept in the csv
+        input_df = config_addresses(seattle_data=input_df).reset_index(drop=True)
+
+        assert_frame_equal(
+                        left=input_df,
+                        right=expected_output
+                        )
+
+
     def test_config_na_values(self):
         input_df = read_csv(
                             filepath_or_buffer='SeattleCrimeData/test/seattle_cleaning_testing_files/12_config_na_values_input.csv',
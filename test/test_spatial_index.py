@@ -0,0 +1,73 @@
+import numpy as np
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import read_csv
+
+from ..src.spatial_index import SpatialIndex, haversine
+
+
+class SpatialIndexUnitTesting(TestCase):
+
+    def setUp(self):
+
+        self.records = read_csv(
+                                'SeattleCrimeData/test/spatial_index_testing_files/01_spatial_index_input.csv',
+                                dtype={'offense_id': str}
+                                )
+
+        self.index = SpatialIndex.from_coordinates(self.records['longitude'], self.records['latitude'])
+
+
+    def offense_ids(self, positions):
+        return sorted(self.records['offense_id'].iloc[positions])
+
+
+    def test_bbox(self):
+
+        # test; the box's edges are inclusive (1010 sits on its south-west corner), records without (valid)
+        # coordinates are never returned
+        test_output = self.offense_ids(self.index.bbox(-122.34, 47.604, -122.33, 47.61))
+
+        self.assertEqual(test_output, ['1001', '1002', '1003', '1010'])
+
+
+    def test_bbox_scan(self):
+
+        # setup; the records a full scan finds within the box
+        longitude, latitude = self.records['longitude'], self.records['latitude']
+
+        expected_output = sorted(self.records.loc[longitude.between(-122.36, -122.32) & latitude.between(47.60, 47.62), 'offense_id'])
+
+        # test
+        self.assertEqual(self.offense_ids(self.index.bbox(-122.36, 47.60, -122.32, 47.62)), expected_output)
+
+
+    def test_radius(self):
+
+        # setup; the records a full scan finds within 500 m
+        distance = haversine(-122.335, 47.608, self.records['longitude'], self.records['latitude'])
+
+        expected_output = sorted(self.records.loc[distance <= 500, 'offense_id'])
+
+        # test; 1011 lies just within the radius & 1010 just outside of it, though within the radius' box
+        test_output = self.offense_ids(self.index.radius(-122.335, 47.608, 500))
+
+        self.assertEqual(test_output, expected_output)
+        self.assertEqual(test_output, ['1001', '1002', '1003', '1011'])
+
+
+    def test_save_load(self):
+
+        # test
+        with TemporaryDirectory() as directory:
+            self.index.save(join(directory, 'spatial_index.npz'))
+            loaded_index = SpatialIndex.load(join(directory, 'spatial_index.npz'))
+
+        np.testing.assert_array_equal(loaded_index.radius(-122.335, 47.608, 500), self.index.radius(-122.335, 47.608, 500))
+        np.testing.assert_array_equal(loaded_index.cell_counts()[1], self.index.cell_counts()[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import pandas.testing as pdt
+from os import environ, listdir
+from os.path import join
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pandas import DataFrame, read_csv
+
+from ..src import clean_seattle_data as csd
+from ..src.quality_rules import Rule, in_range, longitude_range_reason
+from ..src.stage_cache import frame_fingerprint, reference_version, run_memoized, stage_version
+
+
+class StageCacheUnitTesting(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.input_df = read_csv(
+                                'SeattleCrimeData/test/stage_cache_testing_files/01_stage_input.csv',
+                                dtype={'offense_id': str, 'sector': 'category', 'beat': 'category'}
+                                )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def cached_outputs(self):
+        return sorted(name for name in listdir(self.directory.name) if name.endswith('.arrow'))
+
+
+    def test_run_memoized(self):
+
+        # setup
+        expected_output = csd.correct_deci_degrees(self.input_df.copy())
+
+        # test; the second run loads the output cached by the first, as a frame the next stage can update in place
+        run_memoized(csd.correct_deci_degrees, self.input_df.copy(), self.directory.name, 'reference')
+        test_output, fingerprint = run_memoized(csd.correct_deci_degrees, self.input_df.copy(), self.directory.name, 'reference')
+
+        pdt.assert_frame_equal(test_output, expected_output)
+        self.assertEqual(fingerprint, frame_fingerprint(expected_output))
+        self.assertEqual(len(self.cached_outputs()), 1)
+
+        corrected = DataFrame({'sector': ['K', 'K'], 'beat': ['K1', 'K2']}, index=[1, 3])
+
+        test_output.loc[corrected.index, ['sector', 'beat']] = corrected
+
+
+    def test_input_invalidation(self):
+
+        # setup
+        changed_df = self.input_df.copy()
+        changed_df.loc[0, 'latitude'] = 47.609
+
+        # test; a changed input value is cached under a new key
+        run_memoized(csd.correct_deci_degrees, self.input_df.copy(), self.directory.name, 'reference')
+        run_memoized(csd.correct_deci_degrees, changed_df, self.directory.name, 'reference')
+
+        self.assertEqual(len(self.cached_outputs()), 2)
+
+
+    def test_reference_invalidation(self):
+
+        # setup
+        mcpp_path = join(self.directory.name, 'mcpp.csv')
+        copyfile(environ['MCPP'], mcpp_path)
+
+        original_mcpp = environ['MCPP']
+        environ['MCPP'] = mcpp_path
+
+        try:
+            reference = reference_version()
+
+            with open(mcpp_path, 'a') as file:
+                file.write('N,NEW MCPP\n')
+
+            edited_reference = reference_version()
+
+        finally:
+            environ['MCPP'] = original_mcpp
+
+        # test; editing a reference file gives the reference data a new version, so cached outputs aren't reused
+        self.assertNotEqual(edited_reference, reference)
+
+        run_memoized(csd.correct_deci_degrees, self.input_df.copy(), self.directory.name, reference)
+        run_memoized(csd.correct_deci_degrees, self.input_df.copy(), self.directory.name, edited_reference)
+
+        self.assertEqual(len(self.cached_outputs()), 2)
+
+
+    def test_rule_invalidation(self):
+
+        # setup
+        version = stage_version(csd.correct_deci_degrees)
+        longitude_rule = csd.longitude_rule
+
+        # test; changing the range of a rule the stage runs gives it a new version
+        csd.longitude_rule = Rule(['longitude'], in_range('longitude', -125.0, -116.0), 'null', longitude_range_reason)
+        stage_version.cache_clear()
+
+        try:
+            self.assertNotEqual(stage_version(csd.correct_deci_degrees), version)
+
+        finally:
+            csd.longitude_rule = longitude_rule
+            stage_version.cache_clear()
+
+        self.assertEqual(stage_version(csd.correct_deci_degrees), version)
+
+
+if __name__ == '__main__':
+    main()